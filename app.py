@@ -1,41 +1,38 @@
-import io
 import os
 import zipfile
 import tempfile
 import shutil
 from pathlib import Path
 import numpy as np
-import pandas as pd
 import warnings
-import base64
 from datetime import datetime
 import time
+import json
 
-from flask import Flask, request, jsonify, send_file
+from flask import (Flask, Response, request, jsonify, send_file, send_from_directory, abort,
+                   stream_with_context)
 from werkzeug.utils import secure_filename
 from flasgger import Swagger, swag_from
 
 # Import database and model loader
-from database import (init_database, generate_task_id, save_task, update_task_success,
-                     update_task_error, save_detections, get_task_by_id, get_all_tasks, get_database_stats)
-from model_loader import ensure_models
+from database import (init_database, generate_task_id, get_task_by_id, get_all_tasks, get_tasks_page,
+                     iter_task_detections, parse_region, encode_cursor, get_database_stats)
+from model_registry import (ENABLED_MODELS, MODEL_PRELOAD, ModelUnavailableError, device, get_model,
+                            get_loaded_model, model_status, model_variant, models_ready, preload_models,
+                            yolo_predictor)
+from precision import MODEL_PRECISION, bf16_supported, effective_precision
+from stitching import HERDNET_STITCHER, open_source, parse_stitcher_mode, predict_yolo_tiled, run_herdnet
+from geotiff import GEOTIFF_EXTENSIONS, is_geotiff, rasterio_available
+from tile_filter import EMPTY_TILE_THRESHOLD, parse_empty_tile_threshold, tile_counts
+from image_encoding import parse_preview_options, default_preview_options, encode_image_base64, preview_mime_type
+from persistence import (persist_task_start, persist_task_success, persist_task_error, persistence_status,
+                         queue_depth)
+from retention import start_retention_worker
+from export_parquet import parquet_available, parse_export_filters, stream_detections_parquet
+from tiles import (TILES_DIR, TILE_VARIANTS, TILE_CACHE_MAX_AGE, generate_image_pyramids, list_task_pyramids)
 
-# PyTorch and image processing imports
-import torch
-import torch.nn as nn
 from PIL import Image
 import PIL
-import albumentations as A
-from torch.utils.data import DataLoader
-
-# HerdNet imports
-from animaloc.models import HerdNet, LossWrapper
-from animaloc.eval import HerdNetStitcher, HerdNetEvaluator
-from animaloc.eval.metrics import PointsMetrics
-from animaloc.datasets import CSVDataset
-from animaloc.data.transforms import DownSample, Rotate90
-from animaloc.vizual import draw_points, draw_text
-from animaloc.utils.useful_funcs import mkdir
 
 # Suppress warnings and increase PIL image size limit
 warnings.filterwarnings('ignore')
@@ -129,7 +126,7 @@ def parse_extensions_env(env_var_name, default_value):
 # Allowed file extensions (from environment variables or defaults)
 ALLOWED_IMAGE_EXTENSIONS = parse_extensions_env(
     'ALLOWED_IMAGE_EXTENSIONS', 
-    'png,jpg,jpeg,JPG,JPEG,gif,webp,bmp'
+    'png,jpg,jpeg,JPG,JPEG,gif,webp,bmp,' + ','.join(GEOTIFF_EXTENSIONS)
 )
 ALLOWED_ZIP_EXTENSIONS = parse_extensions_env(
     'ALLOWED_ZIP_EXTENSIONS', 
@@ -148,48 +145,26 @@ print("="*60)
 print(f"\n📁 File Upload Configuration:")
 print(f"  Allowed Image Extensions: {sorted(ALLOWED_IMAGE_EXTENSIONS)}")
 print(f"  Allowed ZIP Extensions: {sorted(ALLOWED_ZIP_EXTENSIONS)}")
+print(f"  GeoTIFF windowed reading: {'rasterio' if rasterio_available() else 'rasterio not installed (decoded whole with PIL)'}")
 
 # Initialize database
 init_database()
 
-# Ensure models are available (download from Google Drive if needed)
-model_status = ensure_models()
+# Background retention (archive, prune and incremental vacuum), if configured
+start_retention_worker()
 
 # ========================================
-# Load PyTorch Model for Animal Detection
+# Load Detection Models
 # ========================================
-print("\n" + "="*60)
-print("Loading HerdNet PyTorch model...")
-print("="*60)
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {device}")
-
-# Load checkpoint
-MODEL_PATH = os.path.join("./", os.environ.get('HERDNET_MODEL_FILENAME', 'herdnet_baseline_model.pth'))
-print(f"Loading checkpoint from {MODEL_PATH}...")
-
-map_location = torch.device('cpu')
-if torch.cuda.is_available():
-    map_location = torch.device('cuda')
-
-checkpoint = torch.load(MODEL_PATH, map_location=map_location)
-
-# Extract model configuration from checkpoint
-classes_dict = checkpoint.get('classes', {
-    1: 'buffalo', 2: 'elephant', 3: 'kob', 
-    4: 'topi', 5: 'warthog', 6: 'waterbuck'
-})
-num_classes = len(classes_dict) + 1  # +1 for background
-img_mean = checkpoint.get('mean', [0.485, 0.456, 0.406])
-img_std = checkpoint.get('std', [0.229, 0.224, 0.225])
-
-print(f"Model classes: {classes_dict}")
-print(f"Number of classes: {num_classes}")
-print(f"Normalization - Mean: {img_mean}, Std: {img_std}")
-
-# Build ANIMAL_CLASSES dictionary
-ANIMAL_CLASSES = {0: "no_animal"}
-ANIMAL_CLASSES.update(classes_dict)
+# Models are loaded on first use; with MODEL_PRELOAD the enabled models are loaded
+# in the background right away (see /health for per-model readiness)
+print(f"\n🧠 Enabled models: {', '.join(ENABLED_MODELS) or 'none'}")
+print(f"  Device: {device}")
+print(f"  Precision: {effective_precision(device)}"
+      + (" (no native bfloat16 on this hardware)" if MODEL_PRECISION == 'bf16' and not bf16_supported(device) else ""))
+print(f"  HerdNet stitcher: {HERDNET_STITCHER}")
+if MODEL_PRELOAD:
+    preload_models()
 
 # Spanish translations for animal classes with annotation colors
 # Structure: {class_code: {'name': 'Spanish Name', 'color': '#HEX'}}
@@ -266,13 +241,13 @@ def get_species_color(english_name):
     default_colors = ['#FF0000', '#00FF00', '#0000FF', '#FFFF00', '#FF00FF', '#00FFFF', '#FFA500', '#800080']
     return default_colors[hash(english_name) % len(default_colors)]
 
-def translate_yolo_classes_dict():
-    """Translate YOLO_CLASSES dictionary from English to Spanish."""
-    if not YOLO_CLASSES:
+def translate_classes_dict(classes):
+    """Translate a class ID -> class name dictionary from English to Spanish."""
+    if not classes:
         return {}
     
     translated_classes = {}
-    for class_id, class_name in YOLO_CLASSES.items():
+    for class_id, class_name in classes.items():
         translated_classes[class_id] = translate_to_spanish(class_name)
     
     return translated_classes
@@ -309,43 +284,24 @@ def translate_results_to_spanish(results):
     
     return results
 
-# Build the model
-print("Building HerdNet model...")
-model = HerdNet(num_classes=num_classes, pretrained=False)
-model = LossWrapper(model, [])
-model.load_state_dict(checkpoint['model_state_dict'])
-model = model.to(device)
-model.eval()
-
-print(f"✓ Model loaded successfully with {num_classes} classes")
-print(f"  Classes: {list(ANIMAL_CLASSES.values())}")
+def model_unavailable_response(error):
+    """503 response for a model that is disabled on this server or failed to load."""
+    return jsonify({
+        'success': False,
+        'error': f"Model '{error.name}' not available",
+        'message': str(error),
+        'model_status': error.status
+    }), 503
 
 
-# ========================================
-# Load YOLOv11 Model for Animal Detection
-# ========================================
-print("\nLoading YOLOv11 model...")
-try:
-    from ultralytics import YOLO
-    
-    YOLO_MODEL_PATH = os.path.join("./", os.environ.get('YOLO_MODEL_FILENAME', 'best.pt'))
-    yolo_model = YOLO(YOLO_MODEL_PATH)
-    yolo_model.to(device)
-    
-    # Get class names from the model
-    YOLO_CLASSES = yolo_model.names  # Dictionary of class ID to class name
-    
-    print(f"✓ YOLOv11 model loaded successfully")
-    print(f"  Model classes: {YOLO_CLASSES}")
-    print(f"  Number of classes: {len(YOLO_CLASSES)}")
-    yolo_loaded = True
-except Exception as e:
-    print(f"⚠ Warning: Could not load YOLOv11 model: {str(e)}")
-    yolo_model = None
-    YOLO_CLASSES = {}
-    yolo_loaded = False
+def parse_quantized(form):
+    """'quantized' request parameter: True, False or None when not given (deployment default)."""
+    value = form.get('quantized')
+    return None if value is None else value.lower() == 'true'
 
-def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45, img_size=640, include_annotated_images=True):
+def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45, img_size=640, include_annotated_images=True,
+                             preview_options=None, task_id=None, include_tiles=False, quantized=None,
+                             precision=None, empty_tile_threshold=EMPTY_TILE_THRESHOLD):
     """
     Analyze images using YOLOv11 model
     
@@ -355,12 +311,22 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
         iou_threshold: IOU threshold for NMS (default 0.45)
         img_size: Image size for inference (default 640)
         include_annotated_images: Whether to generate annotated images with bboxes (default True)
+        preview_options: Encoding options for annotated images (see image_encoding.parse_preview_options)
+        task_id: Task ID used to store deep zoom tiles (required if include_tiles)
+        include_tiles: Whether to generate deep zoom tile pyramids for annotated images (default False)
+        quantized: Whether to run the INT8 variant (default None: QUANTIZED_DEFAULT)
+        precision: 'fp32', 'bf16' or 'int8' (default None: MODEL_PRECISION)
+        empty_tile_threshold: Texture score below which GeoTIFF tiles are skipped (see tile_filter.py)
     
     Returns:
         Dictionary with detection results, statistics, and annotated images
     """
-    if not yolo_loaded:
-        raise Exception("YOLOv11 model is not loaded. Check that best.pt exists.")
+    yolo = model_variant('yolo', get_model('yolo'), quantized, precision)
+    yolo_model = yolo_predictor(yolo, img_size)
+    yolo_classes = yolo['classes']
+    
+    if preview_options is None:
+        preview_options = default_preview_options()
     
     # Get all image files
     img_names = [i for i in os.listdir(image_dir) 
@@ -376,29 +342,44 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
     images_without_animals = []
     species_counts = {}
     annotated_images = []
+    tile_stats = tile_counts()
     
     for img_name in img_names:
         img_path = os.path.join(image_dir, img_name)
         
         try:
-            # Run inference
-            results = yolo_model.predict(
-                source=img_path,
-                conf=conf_threshold,
-                iou=iou_threshold,
-                imgsz=img_size,
-                verbose=False
-            )
-            
-            # Process results
-            result = results[0]
-            boxes = result.boxes
+            geo = None
+            if is_geotiff(img_path):
+                # Sliced inference on windows at native resolution, decimated image for annotation
+                source = open_source(img_path)
+                try:
+                    boxes = predict_yolo_tiled(yolo_model, source, img_size, conf=conf_threshold, iou=iou_threshold,
+                                               empty_tile_threshold=empty_tile_threshold, tile_stats=tile_stats)
+                    geo = source.geo_coordinates(boxes.xywh[:, 0].tolist(), boxes.xywh[:, 1].tolist())
+                    original_img, scale = source.preview()
+                    original_size = (source.width, source.height)
+                finally:
+                    source.close()
+            else:
+                # Run inference
+                results = yolo_model.predict(
+                    source=img_path,
+                    conf=conf_threshold,
+                    iou=iou_threshold,
+                    imgsz=img_size,
+                    verbose=False
+                )
+                
+                # Process results
+                result = results[0]
+                boxes = result.boxes
+                
+                # Load original image for annotation
+                original_img, scale = Image.open(img_path), 1.0
+                original_size = original_img.size
             
             image_detections = []
             image_has_animals = False
-            
-            # Load original image for annotation
-            original_img = Image.open(img_path)
             annotated_img = original_img.copy()
             
             if len(boxes) > 0:
@@ -417,14 +398,14 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
                 except:
                     font = ImageFont.load_default()
                 
-                for box in boxes:
+                for j, box in enumerate(boxes):
                     # Get detection details
                     class_id = int(box.cls[0])
                     confidence = float(box.conf[0])
                     bbox = box.xyxy[0].tolist()  # [x1, y1, x2, y2]
                     
                     # Get class name in English first
-                    english_class_name = YOLO_CLASSES.get(class_id, f"class_{class_id}")
+                    english_class_name = yolo_classes.get(class_id, f"class_{class_id}")
                     
                     # Get Spanish name
                     class_name = translate_to_spanish(english_class_name)
@@ -449,11 +430,17 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
                         }
                     }
                     
+                    # Map coordinates of georeferenced GeoTIFFs
+                    if geo:
+                        detection['geo'] = geo[j]
+                    
                     image_detections.append(detection)
                     all_detections.append(detection)
                     
                     # Draw bounding box on the image
                     if include_annotated_images:
+                        bbox = [v * scale for v in bbox]  # preview pixels
+                        
                         # Get color for this species
                         color = get_species_color(english_class_name)
                         
@@ -498,42 +485,32 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
                 images_without_animals.append(img_name)
             
             # Convert annotated image to base64 if there were detections
+            # (resized and encoded according to the requested preview options)
             if include_annotated_images and image_has_animals:
-                # Resize images if too large (to avoid huge base64 strings)
-                max_size = 1920
-                original_img_resized = original_img
-                annotated_img_resized = annotated_img
-                
-                if max(annotated_img.width, annotated_img.height) > max_size:
-                    ratio = max_size / max(annotated_img.width, annotated_img.height)
-                    new_size = (int(annotated_img.width * ratio), int(annotated_img.height * ratio))
-                    original_img_resized = original_img.resize(new_size, Image.Resampling.LANCZOS)
-                    annotated_img_resized = annotated_img.resize(new_size, Image.Resampling.LANCZOS)
+                original_base64, _ = encode_image_base64(original_img, preview_options)
+                annotated_base64, annotated_size = encode_image_base64(annotated_img, preview_options)
                 
-                # Convert original image to base64
-                buffered_original = io.BytesIO()
-                original_img_resized.save(buffered_original, format="JPEG", quality=85)
-                original_base64 = base64.b64encode(buffered_original.getvalue()).decode('utf-8')
-                
-                # Convert annotated image to base64
-                buffered_annotated = io.BytesIO()
-                annotated_img_resized.save(buffered_annotated, format="JPEG", quality=85)
-                annotated_base64 = base64.b64encode(buffered_annotated.getvalue()).decode('utf-8')
-                
-                annotated_images.append({
+                annotated_entry = {
                     'image_name': img_name,
                     'detections_count': len(image_detections),
                     'original_image_base64': original_base64,
                     'annotated_image_base64': annotated_base64,
+                    'image_format': preview_mime_type(preview_options),
                     'original_size': {
-                        'width': original_img.width,
-                        'height': original_img.height
+                        'width': original_size[0],
+                        'height': original_size[1]
                     },
                     'annotated_size': {
-                        'width': annotated_img_resized.width,
-                        'height': annotated_img_resized.height
+                        'width': annotated_size[0],
+                        'height': annotated_size[1]
                     }
-                })
+                }
+                
+                # Full-resolution deep zoom tiles for the viewer
+                if include_tiles:
+                    annotated_entry['tiles'] = generate_image_pyramids(task_id, img_name, original_img, annotated_img)
+                
+                annotated_images.append(annotated_entry)
             
             print(f"  ✓ {img_name}: {len(image_detections)} detections")
             
@@ -549,7 +526,8 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
         'total_detections': len(all_detections),
         'species_counts': species_counts,
         'images_with_detections_list': images_with_animals,
-        'images_without_detections_list': images_without_animals
+        'images_without_detections_list': images_without_animals,
+        **tile_stats
     }
     
     results = {
@@ -559,7 +537,10 @@ def analyze_images_with_yolo(image_dir, conf_threshold=0.25, iou_threshold=0.45,
         'processing_params': {
             'conf_threshold': conf_threshold,
             'iou_threshold': iou_threshold,
-            'img_size': img_size
+            'img_size': img_size,
+            'precision': yolo.get('precision', 'fp32'),
+            'empty_tile_threshold': empty_tile_threshold,
+            'preview': preview_options
         }
     }
     
@@ -576,9 +557,11 @@ def allowed_zip(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_ZIP_EXTENSIONS
 
 
-def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotation=0, thumbnail_size=256):
+def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotation=0, thumbnail_size=256,
+                                  preview_options=None, task_id=None, include_tiles=False, quantized=None,
+                                  precision=None, stitcher=None, empty_tile_threshold=EMPTY_TILE_THRESHOLD):
     """
-    Analyze images using HerdNetEvaluator (same as infer.py)
+    Analyze images using HerdNetEvaluator (same as infer.py) or the streaming stitchers
     
     Args:
         image_dir: Directory containing images
@@ -586,17 +569,30 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
         overlap: Overlap for stitching (default 160)
         rotation: Number of 90-degree rotations (default 0)
         thumbnail_size: Size for thumbnails (default 256)
+        preview_options: Encoding options for plots and thumbnails (see image_encoding.parse_preview_options)
+        task_id: Task ID used to store deep zoom tiles (required if include_tiles)
+        include_tiles: Whether to generate deep zoom tile pyramids for plots (default False)
+        quantized: Whether to run the INT8 variant (default None: QUANTIZED_DEFAULT)
+        precision: 'fp32', 'bf16' or 'int8' (default None: MODEL_PRECISION)
+        stitcher: 'auto', 'full', 'streaming' or 'coarse_to_fine' (default None: HERDNET_STITCHER)
+        empty_tile_threshold: Texture score below which patches are skipped (see tile_filter.py)
     
     Returns:
         Dictionary with detection results, thumbnails, and plots
     """
+    from animaloc.vizual import draw_points, draw_text
+    from animaloc.utils.useful_funcs import mkdir
+    
+    stitcher = parse_stitcher_mode(stitcher)
+    herdnet = model_variant('herdnet', get_model('herdnet'), quantized, precision)
+    classes_dict = herdnet['classes']
+    
+    if preview_options is None:
+        preview_options = default_preview_options()
+    
     # Create results directory
     results_dir = os.path.join(image_dir, 'results')
     mkdir(results_dir)
-    plots_dir = os.path.join(results_dir, 'plots')
-    mkdir(plots_dir)
-    thumbs_dir = os.path.join(results_dir, 'thumbnails')
-    mkdir(thumbs_dir)
     
     # Prepare dataset
     img_names = [i for i in os.listdir(image_dir) 
@@ -606,67 +602,13 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
         raise Exception("No images found in the uploaded zip file")
     
     n = len(img_names)
-    df = pd.DataFrame(data={
-        'images': img_names, 
-        'x': [0]*n, 
-        'y': [0]*n, 
-        'labels': [1]*n
-    })
     
-    # Setup transforms
-    end_transforms = []
-    if rotation != 0:
-        end_transforms.append(Rotate90(k=rotation))
-    end_transforms.append(DownSample(down_ratio=2, anno_type='point'))
-    
-    albu_transforms = [A.Normalize(mean=img_mean, std=img_std)]
-    
-    dataset = CSVDataset(
-        csv_file=df,
-        root_dir=image_dir,
-        albu_transforms=albu_transforms,
-        end_transforms=end_transforms
-    )
-    
-    dataloader = DataLoader(
-        dataset, 
-        batch_size=1, 
-        shuffle=False,
-        sampler=torch.utils.data.SequentialSampler(dataset)
-    )
-    
-    # Build the stitcher
-    stitcher = HerdNetStitcher(
-        model=model,
-        size=(patch_size, patch_size),
-        overlap=overlap,
-        down_ratio=2,
-        up=True,
-        reduction='mean',
-        device_name=device
-    )
-    
-    # Build the evaluator
-    metrics = PointsMetrics(5, num_classes=num_classes)
-    evaluator = HerdNetEvaluator(
-        model=model,
-        dataloader=dataloader,
-        metrics=metrics,
-        lmds_kwargs=dict(kernel_size=(3, 3), adapt_ts=0.2, neg_ts=0.1),
-        device_name=device,
-        print_freq=1,
-        stitcher=stitcher,
-        work_dir=results_dir,
-        header='[INFERENCE]'
-    )
-    
-    # Run inference
+    # Run inference (full, streaming or coarse-to-fine stitcher, see stitching.py)
     print(f"Starting inference on {n} images...")
-    evaluator.evaluate(wandb_flag=False, viz=False, log_meters=False)
-    
-    # Get detections
-    detections = evaluator.detections
-    detections.dropna(inplace=True)
+    tile_stats = tile_counts()
+    detections = run_herdnet(herdnet, image_dir, img_names, patch_size, overlap, rotation,
+                             work_dir=results_dir, mode=stitcher, header='[INFERENCE]',
+                             empty_tile_threshold=empty_tile_threshold, tile_stats=tile_stats)
     # Map species names (keep in English during processing)
     detections['species'] = detections['labels'].map(classes_dict)
     
@@ -683,41 +625,35 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
     
     for img_name in img_names_with_detections:
         img_path = os.path.join(image_dir, img_name)
-        img = Image.open(img_path)
-        
-        # Apply rotation if specified
-        if rotation != 0:
-            rot_degrees = rotation * 90
-            img = img.rotate(rot_degrees, expand=True)
-        
-        img_copy = img.copy()
+        # Rotated the same as during inference; GeoTIFFs are read decimated (see geotiff.py)
+        source = open_source(img_path, rotation)
+        img_copy, scale = source.preview()
         
         # Get detection points for this image
         img_detections = detections[detections['images'] == img_name]
         pts = list(img_detections[['y', 'x']].to_records(index=False))
         pts = [(y, x) for y, x in pts]
         
-        # Draw points on image
-        output_plot = draw_points(img, pts, color='red', size=10)
-        plot_path = os.path.join(plots_dir, img_name)
-        output_plot.save(plot_path, quality=95)
+        # Draw points on a copy of the image (in preview pixels)
+        output_plot = draw_points(img_copy.copy(), [(y * scale, x * scale) for y, x in pts], color='red', size=10)
         
-        # Convert original image to base64
-        buffered_original = io.BytesIO()
-        img_copy.save(buffered_original, format="JPEG", quality=85)
-        original_base64 = base64.b64encode(buffered_original.getvalue()).decode('utf-8')
+        # Convert original image and plot to base64 (encoded only, never written to disk)
+        original_base64, _ = encode_image_base64(img_copy, preview_options)
+        plot_base64, _ = encode_image_base64(output_plot, preview_options)
         
-        # Convert plot to base64
-        buffered_plot = io.BytesIO()
-        output_plot.save(buffered_plot, format="JPEG", quality=95)
-        plot_base64 = base64.b64encode(buffered_plot.getvalue()).decode('utf-8')
-        
-        plots_data.append({
+        plot_entry = {
             'image_name': img_name,
             'original_image_base64': original_base64,
             'plot_base64': plot_base64,
+            'image_format': preview_mime_type(preview_options),
             'detections_count': len(pts)
-        })
+        }
+        
+        # Full-resolution deep zoom tiles for the viewer
+        if include_tiles:
+            plot_entry['tiles'] = generate_image_pyramids(task_id, img_name, img_copy, output_plot)
+        
+        plots_data.append(plot_entry)
         
         # Create thumbnails for each detection
         sp_score = list(img_detections[['species', 'scores']].to_records(index=False))
@@ -727,13 +663,13 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
             
             # Ensure coordinates are within image bounds
             coords = (
-                max(0, coords[0]),
-                max(0, coords[1]),
-                min(img_copy.width, coords[2]),
-                min(img_copy.height, coords[3])
+                max(0, int(coords[0])),
+                max(0, int(coords[1])),
+                min(source.width, int(coords[2])),
+                min(source.height, int(coords[3]))
             )
             
-            thumbnail = img_copy.crop(coords)
+            thumbnail = source.crop(coords)
             score_pct = round(score * 100, 0)
             thumbnail = draw_text(
                 thumbnail, 
@@ -742,14 +678,8 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
                 font_size=int(0.08 * thumbnail_size)
             )
             
-            thumb_name = img_name[:-4] + f'_{i}.JPG'
-            thumb_path = os.path.join(thumbs_dir, thumb_name)
-            thumbnail.save(thumb_path)
-            
             # Convert thumbnail to base64
-            buffered = io.BytesIO()
-            thumbnail.save(buffered, format="JPEG")
-            thumb_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+            thumb_base64, _ = encode_image_base64(thumbnail, preview_options)
             
             thumbnails_data.append({
                 'image_name': img_name,
@@ -759,6 +689,8 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
                 'position': {'x': int(x), 'y': int(y)},
                 'thumbnail_base64': thumb_base64
             })
+        
+        source.close()
     
     # Prepare summary statistics
     total_detections = len(detections)
@@ -780,11 +712,16 @@ def analyze_images_with_evaluator(image_dir, patch_size=512, overlap=160, rotati
         'detections': detections_list,
         'thumbnails': thumbnails_data,
         'plots': plots_data,
+        'tile_counts': tile_stats,
         'processing_params': {
             'patch_size': patch_size,
             'overlap': overlap,
             'rotation': rotation,
-            'thumbnail_size': thumbnail_size
+            'thumbnail_size': thumbnail_size,
+            'precision': herdnet.get('precision', 'fp32'),
+            'stitcher': stitcher,
+            'empty_tile_threshold': empty_tile_threshold,
+            'preview': preview_options
         }
     }
 
@@ -825,36 +762,86 @@ def index():
             'herdnet_single': '/analyze-single-image-herdnet',
             'tasks_list': '/tasks',
             'task_by_id': '/tasks/<task_id>',
-            'database_stats': '/database/stats'
+            'task_detections': '/tasks/<task_id>/detections',
+            'task_tiles': '/tasks/<task_id>/tiles',
+            'tile_descriptor': '/tiles/<task_id>/<image_key>/<variant>.dzi',
+            'database_stats': '/database/stats',
+            'export_detections': '/export/detections'
         }
     }), 200
 
 
+def model_info(name):
+    """Readiness and classes of a model (classes only once it is loaded)."""
+    info = model_status(name)
+    bundle = get_loaded_model(name)
+    info.update({
+        'enabled': info['status'] != 'disabled',
+        'loaded': bundle is not None,
+        'device': str(device),
+        'num_classes': bundle['num_classes'] if bundle else 0,
+        'classes': translate_classes_dict(bundle.get('animal_classes', bundle['classes'])) if bundle else {}
+    })
+    return info
+
+
 @app.route("/health", methods=["GET"])
 def health():
     """
     Health Check Endpoint
-    Check if the API is running and models are loaded
+    Check if the API is running and report the readiness of each model
     ---
     tags:
       - Health
     responses:
       200:
-        description: API is healthy and models are loaded
+        description: API is healthy and all enabled models can serve requests
         schema:
           type: object
           properties:
             status:
               type: string
               example: healthy
+            enabled_models:
+              type: array
+              items:
+                type: string
             models:
               type: object
               properties:
                 herdnet:
                   type: object
                   properties:
+                    enabled:
+                      type: boolean
+                    status:
+                      type: string
+                      description: disabled, not_loaded (loaded on first use), loading, warming_up, ready or failed
                     loaded:
                       type: boolean
+                    error:
+                      type: string
+                    load_seconds:
+                      type: number
+                    warmup_seconds:
+                      type: number
+                    backend:
+                      type: string
+                      description: Inference backend (torch or onnx)
+                    compiled:
+                      type: string
+                      description: Compiled variant in use (none, torchscript or compile)
+                    quantized:
+                      type: boolean
+                      description: INT8 variant loaded (QUANTIZED_MODELS)
+                    precision:
+                      type: string
+                      description: Effective default precision of requests (fp32, bf16 or int8)
+                    precisions:
+                      type: array
+                      items:
+                        type: string
+                      description: Precisions available for the precision request parameter
                     device:
                       type: string
                     num_classes:
@@ -864,37 +851,65 @@ def health():
                 yolov11:
                   type: object
                   properties:
+                    enabled:
+                      type: boolean
+                    status:
+                      type: string
                     loaded:
                       type: boolean
+                    error:
+                      type: string
+                    load_seconds:
+                      type: number
+                    warmup_seconds:
+                      type: number
+                    backend:
+                      type: string
+                      description: Inference backend (torch or onnx)
+                    compiled:
+                      type: string
+                      description: Compiled variant in use (none, torchscript or compile)
+                    quantized:
+                      type: boolean
+                      description: INT8 variant loaded (QUANTIZED_MODELS)
+                    precision:
+                      type: string
+                      description: Effective default precision of requests (fp32, bf16 or int8)
+                    precisions:
+                      type: array
+                      items:
+                        type: string
+                      description: Precisions available for the precision request parameter
                     device:
                       type: string
                     num_classes:
                       type: integer
                     classes:
                       type: object
+            persistence_queue:
+              type: integer
+              description: Database writes queued by the write-behind persistence worker
+      503:
+        description: An enabled model is still loading or warming up, or failed to load
     """
-    # Translate ANIMAL_CLASSES to Spanish
-    translated_animal_classes = {}
-    for class_id, class_name in ANIMAL_CLASSES.items():
-        translated_animal_classes[class_id] = translate_to_spanish(class_name)
+    models = {
+        'herdnet': model_info('herdnet'),
+        'yolov11': model_info('yolo')
+    }
+    
+    if models_ready():
+        status, code = 'healthy', 200
+    elif any(m['status'] == 'failed' for m in models.values()):
+        status, code = 'degraded', 503
+    else:
+        status, code = 'loading', 503
     
     return jsonify({
-        'status': 'healthy',
-        'models': {
-            'herdnet': {
-                'loaded': True,
-        'device': str(device),
-        'num_classes': num_classes,
-                'classes': translated_animal_classes
-            },
-            'yolov11': {
-                'loaded': yolo_loaded,
-                'device': str(device),
-                'num_classes': len(YOLO_CLASSES) if yolo_loaded else 0,
-                'classes': translate_yolo_classes_dict() if yolo_loaded else {}
-            }
-        }
-    }), 200
+        'status': status,
+        'enabled_models': list(ENABLED_MODELS),
+        'models': models,
+        'persistence_queue': queue_depth()
+    }), code
 
 @app.route("/analyze-yolo", methods=["POST"])
 def analyze_yolo_endpoint():
@@ -936,6 +951,47 @@ def analyze_yolo_endpoint():
         required: false
         default: "true"
         description: Include annotated images with bounding boxes
+      - name: include_tiles
+        in: formData
+        type: string
+        required: false
+        default: "false"
+        description: Generate deep zoom (DZI) tile pyramids of the original and annotated images
+      - name: quantized
+        in: formData
+        type: string
+        required: false
+        description: Run the INT8 quantized model on CPU ("true"/"false"; default QUANTIZED_DEFAULT). Requires the model in QUANTIZED_MODELS
+      - name: precision
+        in: formData
+        type: string
+        required: false
+        enum: ["fp32", "bf16", "int8"]
+        description: Inference precision (default MODEL_PRECISION). bf16 runs in fp32 on hardware without native bfloat16; int8 is the same as quantized=true
+      - name: empty_tile_threshold
+        in: formData
+        type: number
+        required: false
+        description: Texture score below which GeoTIFF tiles are skipped before the network (default EMPTY_TILE_THRESHOLD, 0 = disabled). Higher values skip more patches at a higher risk of missing low-contrast animals
+      - name: preview_format
+        in: formData
+        type: string
+        required: false
+        default: "jpeg"
+        enum: ["webp", "jpeg", "png"]
+        description: Encoding of returned images (original, annotated/plot and thumbnails)
+      - name: preview_quality
+        in: formData
+        type: integer
+        required: false
+        default: 85
+        description: Encoding quality for webp/jpeg previews (1-100, ignored for png)
+      - name: preview_max_size
+        in: formData
+        type: integer
+        required: false
+        default: 1920
+        description: Maximum width/height of returned images in pixels (0 = full resolution)
     responses:
       200:
         description: Analysis completed successfully
@@ -991,17 +1047,18 @@ def analyze_yolo_endpoint():
         description: Bad request (no file provided or invalid file type)
       500:
         description: Analysis failed
+      503:
+        description: Model not enabled on this server or failed to load
     """
     task_id = None
     start_time = time.time()
     
     try:
-        if not yolo_loaded:
-            return jsonify({
-                'success': False,
-                'error': 'YOLOv11 model not loaded',
-                'message': 'The YOLOv11 model (best.pt) could not be loaded. Please check the model file.'
-            }), 500
+        # Load the YOLOv11 model on first use
+        try:
+            yolo = get_model('yolo')
+        except ModelUnavailableError as e:
+            return model_unavailable_response(e)
         
         # Check if file is present
         if 'file' not in request.files:
@@ -1021,6 +1078,15 @@ def analyze_yolo_endpoint():
         iou_threshold = float(request.form.get('iou_threshold', 0.45))
         img_size = int(request.form.get('img_size', 640))
         include_annotated_images = request.form.get('include_annotated_images', 'true').lower() == 'true'
+        include_tiles = request.form.get('include_tiles', 'false').lower() == 'true'
+        quantized = parse_quantized(request.form)
+        requested_precision = request.form.get('precision')
+        try:
+            preview_options = parse_preview_options(request.form)
+            precision = model_variant('yolo', yolo, quantized, requested_precision).get('precision', 'fp32')
+            empty_tile_threshold = parse_empty_tile_threshold(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Generate task ID
         task_id = generate_task_id()
@@ -1060,7 +1126,13 @@ def analyze_yolo_endpoint():
                 conf_threshold=conf_threshold,
                 iou_threshold=iou_threshold,
                 img_size=img_size,
-                include_annotated_images=include_annotated_images
+                include_annotated_images=include_annotated_images,
+                preview_options=preview_options,
+                task_id=task_id,
+                include_tiles=include_tiles,
+                quantized=quantized,
+                precision=requested_precision,
+                empty_tile_threshold=empty_tile_threshold
             )
             
             # Calculate processing time
@@ -1070,10 +1142,13 @@ def analyze_yolo_endpoint():
             num_images = len([f for f in os.listdir(images_dir) if allowed_image(f)])
             
             # Save task to database
-            save_task(task_id, 'yolo', file.filename, num_images, {
+            persist_task_start(task_id, 'yolo', file.filename, num_images, {
                 'conf_threshold': conf_threshold,
                 'iou_threshold': iou_threshold,
-                'img_size': img_size
+                'img_size': img_size,
+                'precision': precision,
+                'empty_tile_threshold': empty_tile_threshold,
+                'preview': preview_options
             })
             
             response = {
@@ -1081,7 +1156,7 @@ def analyze_yolo_endpoint():
                 'task_id': task_id,
                 'message': 'Images analyzed successfully with YOLOv11',
                 'model': 'YOLOv11',
-                'classes': translate_yolo_classes_dict(),
+                'classes': translate_classes_dict(yolo['classes']),
                 'summary': results['summary'],
                 'detections': results['detections'],
                 'processing_params': results['processing_params'],
@@ -1093,18 +1168,16 @@ def analyze_yolo_endpoint():
                 response['annotated_images'] = results['annotated_images']
                 response['annotated_images_count'] = len(results['annotated_images'])
             
-            # Update task success and save detections
-            update_task_success(
-                task_id, processing_time,
+            # Update task success and save detections (queued: written after the response is sent)
+            response['persistence_status'] = persist_task_success(
+                task_id, 'yolo', processing_time,
                 results['summary']['total_detections'],
                 results['summary']['images_with_animals'],
                 results['summary']['species_counts'],
-                response
+                response,
+                results['detections']
             )
             
-            if results['detections']:
-                save_detections(task_id, results['detections'], 'yolo')
-            
             print(f"\n{'='*60}")
             print(f"✓ YOLOv11 Analysis complete!")
             print(f"  Task ID: {task_id}")
@@ -1127,7 +1200,7 @@ def analyze_yolo_endpoint():
         
         # Update task with error if created
         if task_id:
-            update_task_error(task_id, str(e))
+            persist_task_error(task_id, str(e))
         
         return jsonify({
             'success': False,
@@ -1156,8 +1229,28 @@ def models_info():
                 herdnet:
                   type: object
                   properties:
+                    enabled:
+                      type: boolean
+                    status:
+                      type: string
                     loaded:
                       type: boolean
+                    backend:
+                      type: string
+                      description: Inference backend (torch or onnx), once loaded
+                    quantized:
+                      type: boolean
+                      description: INT8 variant available (quantized request parameter)
+                    precision:
+                      type: string
+                      description: Effective default precision of requests (fp32, bf16 or int8), once loaded
+                    precisions:
+                      type: array
+                      items:
+                        type: string
+                    stitcher:
+                      type: string
+                      description: Default stitcher of requests (auto, full, streaming or coarse_to_fine)
                     endpoint:
                       type: string
                     classes:
@@ -1167,8 +1260,25 @@ def models_info():
                 yolov11:
                   type: object
                   properties:
+                    enabled:
+                      type: boolean
+                    status:
+                      type: string
                     loaded:
                       type: boolean
+                    backend:
+                      type: string
+                      description: Inference backend (torch or onnx), once loaded
+                    quantized:
+                      type: boolean
+                      description: INT8 variant available (quantized request parameter)
+                    precision:
+                      type: string
+                      description: Effective default precision of requests (fp32, bf16 or int8), once loaded
+                    precisions:
+                      type: array
+                      items:
+                        type: string
                     endpoint:
                       type: string
                     classes:
@@ -1176,24 +1286,35 @@ def models_info():
                     num_classes:
                       type: integer
     """
-    # Translate ANIMAL_CLASSES to Spanish
-    translated_animal_classes = {}
-    for class_id, class_name in ANIMAL_CLASSES.items():
-        translated_animal_classes[class_id] = translate_to_spanish(class_name)
+    herdnet = model_info('herdnet')
+    yolo = model_info('yolo')
     
     return jsonify({
         'models': {
             'herdnet': {
-                'loaded': True,
+                'enabled': herdnet['enabled'],
+                'status': herdnet['status'],
+                'loaded': herdnet['loaded'],
+                'backend': herdnet['backend'],
+                'quantized': herdnet['quantized'],
+                'precision': herdnet['precision'],
+                'precisions': herdnet['precisions'],
+                'stitcher': HERDNET_STITCHER,
                 'endpoint': '/analyze-image',
-                'classes': translated_animal_classes,
-                'num_classes': num_classes
+                'classes': herdnet['classes'],
+                'num_classes': herdnet['num_classes']
             },
             'yolov11': {
-                'loaded': yolo_loaded,
+                'enabled': yolo['enabled'],
+                'status': yolo['status'],
+                'loaded': yolo['loaded'],
+                'backend': yolo['backend'],
+                'quantized': yolo['quantized'],
+                'precision': yolo['precision'],
+                'precisions': yolo['precisions'],
                 'endpoint': '/analyze-yolo',
-                'classes': translate_yolo_classes_dict() if yolo_loaded else {},
-                'num_classes': len(YOLO_CLASSES) if yolo_loaded else 0
+                'classes': yolo['classes'],
+                'num_classes': yolo['num_classes']
             }
         }
     }), 200
@@ -1250,6 +1371,53 @@ def analyze_image_endpoint():
         required: false
         default: "false"
         description: Include detection plots with marked points
+      - name: include_tiles
+        in: formData
+        type: string
+        required: false
+        default: "false"
+        description: Generate deep zoom (DZI) tile pyramids of the original and annotated images
+      - name: quantized
+        in: formData
+        type: string
+        required: false
+        description: Run the INT8 quantized model on CPU ("true"/"false"; default QUANTIZED_DEFAULT). Requires the model in QUANTIZED_MODELS
+      - name: precision
+        in: formData
+        type: string
+        required: false
+        enum: ["fp32", "bf16", "int8"]
+        description: Inference precision (default MODEL_PRECISION). bf16 runs in fp32 on hardware without native bfloat16; int8 is the same as quantized=true
+      - name: stitcher
+        in: formData
+        type: string
+        required: false
+        enum: ["auto", "full", "streaming", "coarse_to_fine"]
+        description: HerdNet stitcher (default HERDNET_STITCHER). streaming keeps memory bounded for very large images; auto uses it above STREAMING_MIN_PIXELS; coarse_to_fine runs full-resolution patches only where a downsampled first pass finds animals
+      - name: empty_tile_threshold
+        in: formData
+        type: number
+        required: false
+        description: Texture score below which patches are skipped before the network (default EMPTY_TILE_THRESHOLD, 0 = disabled). Higher values skip more patches at a higher risk of missing low-contrast animals
+      - name: preview_format
+        in: formData
+        type: string
+        required: false
+        default: "jpeg"
+        enum: ["webp", "jpeg", "png"]
+        description: Encoding of returned images (original, annotated/plot and thumbnails)
+      - name: preview_quality
+        in: formData
+        type: integer
+        required: false
+        default: 85
+        description: Encoding quality for webp/jpeg previews (1-100, ignored for png)
+      - name: preview_max_size
+        in: formData
+        type: integer
+        required: false
+        default: 1920
+        description: Maximum width/height of returned images in pixels (0 = full resolution)
     responses:
       200:
         description: Analysis completed successfully
@@ -1302,11 +1470,19 @@ def analyze_image_endpoint():
         description: Bad request
       500:
         description: Analysis failed
+      503:
+        description: Model not enabled on this server or failed to load
     """
     task_id = None
     start_time = time.time()
     
     try:
+        # Load the HerdNet model on first use
+        try:
+            herdnet = get_model('herdnet')
+        except ModelUnavailableError as e:
+            return model_unavailable_response(e)
+        
         # Check if file is present
         if 'file' not in request.files:
             return jsonify({'error': 'No file provided'}), 400
@@ -1327,6 +1503,16 @@ def analyze_image_endpoint():
         thumbnail_size = int(request.form.get('thumbnail_size', 256))
         include_thumbnails = request.form.get('include_thumbnails', 'true').lower() == 'true'
         include_plots = request.form.get('include_plots', 'false').lower() == 'true'
+        include_tiles = request.form.get('include_tiles', 'false').lower() == 'true'
+        quantized = parse_quantized(request.form)
+        requested_precision = request.form.get('precision')
+        try:
+            preview_options = parse_preview_options(request.form)
+            precision = model_variant('herdnet', herdnet, quantized, requested_precision).get('precision', 'fp32')
+            stitcher = parse_stitcher_mode(request.form.get('stitcher'))
+            empty_tile_threshold = parse_empty_tile_threshold(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Generate task ID
         task_id = generate_task_id()
@@ -1365,7 +1551,14 @@ def analyze_image_endpoint():
                 patch_size=patch_size,
                 overlap=overlap,
                 rotation=rotation,
-                thumbnail_size=thumbnail_size
+                thumbnail_size=thumbnail_size,
+                preview_options=preview_options,
+                task_id=task_id,
+                include_tiles=include_tiles and include_plots,
+                quantized=quantized,
+                precision=requested_precision,
+                stitcher=stitcher,
+                empty_tile_threshold=empty_tile_threshold
             )
             
             # Calculate processing time
@@ -1375,11 +1568,15 @@ def analyze_image_endpoint():
             num_images = len([f for f in os.listdir(images_dir) if allowed_image(f)])
             
             # Save task to database
-            save_task(task_id, 'herdnet', file.filename, num_images, {
+            persist_task_start(task_id, 'herdnet', file.filename, num_images, {
                 'patch_size': patch_size,
                 'overlap': overlap,
                 'rotation': rotation,
-                'thumbnail_size': thumbnail_size
+                'thumbnail_size': thumbnail_size,
+                'precision': precision,
+                'stitcher': stitcher,
+                'empty_tile_threshold': empty_tile_threshold,
+                'preview': preview_options
             })
             
             # Filter response based on parameters
@@ -1393,7 +1590,8 @@ def analyze_image_endpoint():
                     'images_with_detections': results['images_with_detections'],
                     'images_without_detections': results['images_without_detections'],
                     'total_detections': results['total_detections'],
-                    'species_counts': results['species_counts']
+                    'species_counts': results['species_counts'],
+                    **results['tile_counts']
                 },
                 'detections': results['detections'],
                 'processing_params': results['processing_params'],
@@ -1406,18 +1604,16 @@ def analyze_image_endpoint():
             if include_plots:
                 response['plots'] = results['plots']
             
-            # Update task success and save detections
-            update_task_success(
-                task_id, processing_time,
+            # Update task success and save detections (queued: written after the response is sent)
+            response['persistence_status'] = persist_task_success(
+                task_id, 'herdnet', processing_time,
                 results['total_detections'],
                 results['images_with_detections'],
                 results['species_counts'],
-                response
+                response,
+                results['detections']
             )
             
-            if results['detections']:
-                save_detections(task_id, results['detections'], 'herdnet')
-            
             print(f"\n{'='*60}")
             print(f"✓ HerdNet Analysis complete!")
             print(f"  Task ID: {task_id}")
@@ -1439,7 +1635,7 @@ def analyze_image_endpoint():
         
         # Update task with error if created
         if task_id:
-            update_task_error(task_id, str(e))
+            persist_task_error(task_id, str(e))
         
         return jsonify({
             'success': False,
@@ -1464,7 +1660,7 @@ def analyze_single_image_yolo_endpoint():
         in: formData
         type: file
         required: true
-        description: Single wildlife image (PNG, JPG, JPEG, GIF, WebP, BMP, TIFF)
+        description: Single wildlife image (PNG, JPG, JPEG, GIF, WebP, BMP, TIFF; GeoTIFF orthomosaics are read window by window)
       - name: conf_threshold
         in: formData
         type: number
@@ -1486,6 +1682,47 @@ def analyze_single_image_yolo_endpoint():
         required: false
         default: "true"
         description: Include annotated images with bounding boxes
+      - name: include_tiles
+        in: formData
+        type: string
+        required: false
+        default: "false"
+        description: Generate deep zoom (DZI) tile pyramids of the original and annotated images
+      - name: quantized
+        in: formData
+        type: string
+        required: false
+        description: Run the INT8 quantized model on CPU ("true"/"false"; default QUANTIZED_DEFAULT). Requires the model in QUANTIZED_MODELS
+      - name: precision
+        in: formData
+        type: string
+        required: false
+        enum: ["fp32", "bf16", "int8"]
+        description: Inference precision (default MODEL_PRECISION). bf16 runs in fp32 on hardware without native bfloat16; int8 is the same as quantized=true
+      - name: empty_tile_threshold
+        in: formData
+        type: number
+        required: false
+        description: Texture score below which GeoTIFF tiles are skipped before the network (default EMPTY_TILE_THRESHOLD, 0 = disabled). Higher values skip more patches at a higher risk of missing low-contrast animals
+      - name: preview_format
+        in: formData
+        type: string
+        required: false
+        default: "jpeg"
+        enum: ["webp", "jpeg", "png"]
+        description: Encoding of returned images (original, annotated/plot and thumbnails)
+      - name: preview_quality
+        in: formData
+        type: integer
+        required: false
+        default: 85
+        description: Encoding quality for webp/jpeg previews (1-100, ignored for png)
+      - name: preview_max_size
+        in: formData
+        type: integer
+        required: false
+        default: 1920
+        description: Maximum width/height of returned images in pixels (0 = full resolution)
     responses:
       200:
         description: Analysis completed successfully
@@ -1525,14 +1762,18 @@ def analyze_single_image_yolo_endpoint():
         description: Bad request
       500:
         description: Analysis failed
+      503:
+        description: Model not enabled on this server or failed to load
     """
     task_id = None
     start_time = time.time()
     
     try:
-        # Check if YOLO model is loaded
-        if yolo_model is None:
-            return jsonify({'error': 'YOLOv11 model not available'}), 503
+        # Load the YOLOv11 model on first use
+        try:
+            yolo = get_model('yolo')
+        except ModelUnavailableError as e:
+            return model_unavailable_response(e)
         
         # Check if file is present
         if 'file' not in request.files:
@@ -1545,13 +1786,21 @@ def analyze_single_image_yolo_endpoint():
         
         # Check if file is an image
         if not allowed_image(file.filename):
-            return jsonify({'error': 'File must be an image (png, jpg, jpeg, gif, webp, bmp)'}), 400
+            return jsonify({'error': 'File must be an image (png, jpg, jpeg, gif, webp, bmp, tif, tiff)'}), 400
         
         # Get optional parameters
         conf_threshold = float(request.form.get('conf_threshold', 0.25))
         iou_threshold = float(request.form.get('iou_threshold', 0.45))
         img_size = int(request.form.get('img_size', 640))
         include_annotated = request.form.get('include_annotated_images', 'true').lower() == 'true'
+        include_tiles = request.form.get('include_tiles', 'false').lower() == 'true'
+        try:
+            preview_options = parse_preview_options(request.form)
+            yolo = model_variant('yolo', yolo, parse_quantized(request.form), request.form.get('precision'))
+            empty_tile_threshold = parse_empty_tile_threshold(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        yolo_model = yolo_predictor(yolo, img_size)
         
         # Generate task ID
         task_id = generate_task_id()
@@ -1564,7 +1813,7 @@ def analyze_single_image_yolo_endpoint():
         print(f"{'='*60}\n")
         
         # Save task to database (status: processing)
-        save_task(
+        persist_task_start(
             task_id=task_id,
             model_type='yolo',
             filename=file.filename,
@@ -1573,7 +1822,10 @@ def analyze_single_image_yolo_endpoint():
                 'conf_threshold': conf_threshold,
                 'iou_threshold': iou_threshold,
                 'img_size': img_size,
-                'include_annotated_images': include_annotated
+                'include_annotated_images': include_annotated,
+                'precision': yolo.get('precision', 'fp32'),
+                'empty_tile_threshold': empty_tile_threshold,
+                'preview': preview_options
             }
         )
         
@@ -1589,31 +1841,43 @@ def analyze_single_image_yolo_endpoint():
             # Process the image
             print(f"Processing image: {image_filename}")
             
-            # Run YOLO inference
-            results = yolo_model.predict(
-                source=image_path,
-                conf=conf_threshold,
-                iou=iou_threshold,
-                imgsz=img_size,
-                save=False,
-                verbose=False
-            )
-            
-            # Process results
-            result = results[0]
-            boxes = result.boxes
+            tiled = is_geotiff(image_path)
+            geo = None
+            tile_stats = tile_counts()
+            if tiled:
+                # Sliced inference on windows at native resolution (see stitching.predict_yolo_tiled)
+                source = open_source(image_path)
+                boxes = predict_yolo_tiled(yolo_model, source, img_size, conf=conf_threshold, iou=iou_threshold,
+                                           empty_tile_threshold=empty_tile_threshold, tile_stats=tile_stats)
+                geo = source.geo_coordinates(boxes.xywh[:, 0].tolist(), boxes.xywh[:, 1].tolist())
+                names = yolo['classes']
+            else:
+                # Run YOLO inference
+                results = yolo_model.predict(
+                    source=image_path,
+                    conf=conf_threshold,
+                    iou=iou_threshold,
+                    imgsz=img_size,
+                    save=False,
+                    verbose=False
+                )
+                
+                # Process results
+                result = results[0]
+                boxes = result.boxes
+                names = result.names
             
             # Extract detections
             detections = []
             species_counts = {}
             
-            for box in boxes:
+            for j, box in enumerate(boxes):
                 cls_id = int(box.cls[0].item())
                 conf = float(box.conf[0].item())
                 xyxy = box.xyxy[0].tolist()
                 
                 # Get class name (keep in English during processing)
-                class_name = result.names[cls_id]
+                class_name = names[cls_id]
                 
                 # Count species
                 species_counts[class_name] = species_counts.get(class_name, 0) + 1
@@ -1646,6 +1910,10 @@ def analyze_single_image_yolo_endpoint():
                     }
                 }
                 
+                # Map coordinates of georeferenced GeoTIFFs
+                if geo:
+                    detection['geo'] = geo[j]
+                
                 detections.append(detection)
             
             # Prepare response
@@ -1658,14 +1926,18 @@ def analyze_single_image_yolo_endpoint():
                     'total_detections': len(detections),
                     'images_with_detections': 1 if len(detections) > 0 else 0,
                     'images_without_detections': 0 if len(detections) > 0 else 1,
-                    'species_counts': species_counts
+                    'species_counts': species_counts,
+                    **tile_stats
                 },
                 'detections': detections,
                 'processing_params': {
                     'conf_threshold': conf_threshold,
                     'iou_threshold': iou_threshold,
                     'img_size': img_size,
-                    'include_annotated_images': include_annotated
+                    'include_annotated_images': include_annotated,
+                    'precision': yolo.get('precision', 'fp32'),
+                    'empty_tile_threshold': empty_tile_threshold,
+                    'preview': preview_options
                 }
             }
             
@@ -1673,56 +1945,70 @@ def analyze_single_image_yolo_endpoint():
             if include_annotated:
                 annotated_images = []
                 
+                if tiled:
+                    # Boxes drawn on the decimated image of the GeoTIFF
+                    from ultralytics.engine.results import Results
+                    orig_img, scale = source.preview()
+                    orig_width, orig_height = source.width, source.height
+                    data = boxes.data.clone()
+                    data[:, :4] *= scale
+                    result = Results(np.array(orig_img)[..., ::-1], path=image_path, names=names, boxes=data)
+                else:
+                    # Get original image
+                    orig_img = Image.open(image_path)
+                    orig_width, orig_height = orig_img.size
+                
                 # Get annotated image
                 annotated_img = result.plot()
                 
                 # Convert to PIL Image
                 annotated_pil = Image.fromarray(annotated_img[..., ::-1])  # BGR to RGB
                 
-                # Get original image
-                orig_img = Image.open(image_path)
-                orig_width, orig_height = orig_img.size
-                
-                # Convert original image to base64
-                buffered_original = io.BytesIO()
-                orig_img.save(buffered_original, format="JPEG", quality=85)
-                original_base64 = base64.b64encode(buffered_original.getvalue()).decode('utf-8')
-                
-                # Convert annotated image to base64
-                buffered_annotated = io.BytesIO()
-                annotated_pil.save(buffered_annotated, format="PNG")
-                annotated_base64 = base64.b64encode(buffered_annotated.getvalue()).decode('utf-8')
+                # Convert original and annotated images to base64 (resized and encoded per preview options)
+                original_base64, _ = encode_image_base64(orig_img, preview_options)
+                annotated_base64, annotated_size = encode_image_base64(annotated_pil, preview_options)
                 
                 annotated_images.append({
                     'image_name': image_filename,
                     'detections_count': len(detections),
                     'original_image_base64': original_base64,
                     'annotated_image_base64': annotated_base64,
+                    'image_format': preview_mime_type(preview_options),
                     'original_size': {
                         'width': orig_width,
                         'height': orig_height
+                    },
+                    'annotated_size': {
+                        'width': annotated_size[0],
+                        'height': annotated_size[1]
                     }
                 })
                 
+                # Full-resolution deep zoom tiles for the viewer
+                if include_tiles:
+                    annotated_images[-1]['tiles'] = generate_image_pyramids(task_id, image_filename, orig_img, annotated_pil)
+                
                 response_data['annotated_images'] = annotated_images
             
+            if tiled:
+                source.close()
+            
             # Calculate processing time
             processing_time = time.time() - start_time
             response_data['processing_time_seconds'] = round(processing_time, 2)
             
-            # Update task in database with success
-            update_task_success(
+            # Update task in database with success and save detections (queued: written after the response is sent)
+            response_data['persistence_status'] = persist_task_success(
                 task_id=task_id,
+                model_type='yolo',
                 processing_time=processing_time,
                 total_detections=len(detections),
                 images_with_detections=1 if len(detections) > 0 else 0,
                 species_counts=species_counts,
-                result_data=response_data
+                result_data=response_data,
+                detections=detections
             )
             
-            # Save detections to database
-            save_detections(task_id, detections, 'yolo')
-            
             print(f"\n✅ Single image analysis complete! Task ID: {task_id}")
             print(f"   - Detections: {len(detections)}")
             print(f"   - Processing time: {processing_time:.2f}s\n")
@@ -1744,7 +2030,7 @@ def analyze_single_image_yolo_endpoint():
         
         # Update task with error if task_id exists
         if task_id:
-            update_task_error(task_id, str(e))
+            persist_task_error(task_id, str(e))
         
         return jsonify({
             'success': False,
@@ -1769,7 +2055,7 @@ def analyze_single_image_herdnet_endpoint():
         in: formData
         type: file
         required: true
-        description: Single wildlife image (PNG, JPG, JPEG, GIF, WebP, BMP, TIFF)
+        description: Single wildlife image (PNG, JPG, JPEG, GIF, WebP, BMP, TIFF; GeoTIFF orthomosaics are read window by window)
       - name: patch_size
         in: formData
         type: integer
@@ -1801,6 +2087,53 @@ def analyze_single_image_herdnet_endpoint():
         required: false
         default: "false"
         description: Include detection plots with marked points
+      - name: include_tiles
+        in: formData
+        type: string
+        required: false
+        default: "false"
+        description: Generate deep zoom (DZI) tile pyramids of the original and annotated images
+      - name: quantized
+        in: formData
+        type: string
+        required: false
+        description: Run the INT8 quantized model on CPU ("true"/"false"; default QUANTIZED_DEFAULT). Requires the model in QUANTIZED_MODELS
+      - name: precision
+        in: formData
+        type: string
+        required: false
+        enum: ["fp32", "bf16", "int8"]
+        description: Inference precision (default MODEL_PRECISION). bf16 runs in fp32 on hardware without native bfloat16; int8 is the same as quantized=true
+      - name: stitcher
+        in: formData
+        type: string
+        required: false
+        enum: ["auto", "full", "streaming", "coarse_to_fine"]
+        description: HerdNet stitcher (default HERDNET_STITCHER). streaming keeps memory bounded for very large images; auto uses it above STREAMING_MIN_PIXELS; coarse_to_fine runs full-resolution patches only where a downsampled first pass finds animals
+      - name: empty_tile_threshold
+        in: formData
+        type: number
+        required: false
+        description: Texture score below which patches are skipped before the network (default EMPTY_TILE_THRESHOLD, 0 = disabled). Higher values skip more patches at a higher risk of missing low-contrast animals
+      - name: preview_format
+        in: formData
+        type: string
+        required: false
+        default: "jpeg"
+        enum: ["webp", "jpeg", "png"]
+        description: Encoding of returned images (original, annotated/plot and thumbnails)
+      - name: preview_quality
+        in: formData
+        type: integer
+        required: false
+        default: 85
+        description: Encoding quality for webp/jpeg previews (1-100, ignored for png)
+      - name: preview_max_size
+        in: formData
+        type: integer
+        required: false
+        default: 1920
+        description: Maximum width/height of returned images in pixels (0 = full resolution)
     responses:
       200:
         description: Analysis completed successfully
@@ -1840,14 +2173,21 @@ def analyze_single_image_herdnet_endpoint():
         description: Bad request
       500:
         description: Analysis failed
+      503:
+        description: Model not enabled on this server or failed to load
     """
     task_id = None
     start_time = time.time()
     
     try:
-        # Check if HerdNet model is loaded
-        if model is None:
-            return jsonify({'error': 'HerdNet model not available'}), 503
+        # Load the HerdNet model on first use
+        try:
+            herdnet = get_model('herdnet')
+        except ModelUnavailableError as e:
+            return model_unavailable_response(e)
+        
+        from animaloc.vizual import draw_points, draw_text
+        from animaloc.utils.useful_funcs import mkdir
         
         # Check if file is present
         if 'file' not in request.files:
@@ -1860,7 +2200,7 @@ def analyze_single_image_herdnet_endpoint():
         
         # Check if file is an image
         if not allowed_image(file.filename):
-            return jsonify({'error': 'File must be an image (png, jpg, jpeg, gif, webp, bmp)'}), 400
+            return jsonify({'error': 'File must be an image (png, jpg, jpeg, gif, webp, bmp, tif, tiff)'}), 400
         
         # Get optional parameters
         patch_size = int(request.form.get('patch_size', 512))
@@ -1869,6 +2209,14 @@ def analyze_single_image_herdnet_endpoint():
         thumbnail_size = int(request.form.get('thumbnail_size', 256))
         include_thumbnails = request.form.get('include_thumbnails', 'true').lower() == 'true'
         include_plots = request.form.get('include_plots', 'false').lower() == 'true'
+        include_tiles = request.form.get('include_tiles', 'false').lower() == 'true'
+        try:
+            preview_options = parse_preview_options(request.form)
+            herdnet = model_variant('herdnet', herdnet, parse_quantized(request.form), request.form.get('precision'))
+            stitcher = parse_stitcher_mode(request.form.get('stitcher'))
+            empty_tile_threshold = parse_empty_tile_threshold(request.form)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Generate task ID
         task_id = generate_task_id()
@@ -1881,7 +2229,7 @@ def analyze_single_image_herdnet_endpoint():
         print(f"{'='*60}\n")
         
         # Save task to database (status: processing)
-        save_task(
+        persist_task_start(
             task_id=task_id,
             model_type='herdnet',
             filename=file.filename,
@@ -1892,7 +2240,11 @@ def analyze_single_image_herdnet_endpoint():
                 'rotation': rotation,
                 'thumbnail_size': thumbnail_size,
                 'include_thumbnails': include_thumbnails,
-                'include_plots': include_plots
+                'include_plots': include_plots,
+                'precision': herdnet.get('precision', 'fp32'),
+                'stitcher': stitcher,
+                'empty_tile_threshold': empty_tile_threshold,
+                'preview': preview_options
             }
         )
         
@@ -1912,71 +2264,13 @@ def analyze_single_image_herdnet_endpoint():
             results_dir = os.path.join(temp_dir, 'results')
             mkdir(results_dir)
             
-            # Create a DataFrame with just this one image (same as batch processing)
-            df = pd.DataFrame(data={
-                'images': [image_filename], 
-                'x': [0], 
-                'y': [0], 
-                'labels': [1]
-            })
-            
-            # Setup transforms (same as batch processing)
-            end_transforms = []
-            if rotation != 0:
-                end_transforms.append(Rotate90(k=rotation))
-            end_transforms.append(DownSample(down_ratio=2, anno_type='point'))
-            
-            albu_transforms = [A.Normalize(mean=img_mean, std=img_std)]
-            
-            # Create dataset
-            dataset = CSVDataset(
-                csv_file=df,
-                root_dir=temp_dir,
-                albu_transforms=albu_transforms,
-                end_transforms=end_transforms
-            )
-            
-            # Create dataloader
-            dataloader = DataLoader(
-                dataset, 
-                batch_size=1, 
-                shuffle=False,
-                sampler=torch.utils.data.SequentialSampler(dataset)
-            )
-            
-            # Build the stitcher
-            stitcher = HerdNetStitcher(
-                model=model,
-                size=(patch_size, patch_size),
-                overlap=overlap,
-                down_ratio=2,
-                up=True,
-                reduction='mean',
-                device_name=device
-            )
-            
-            # Build the evaluator
-            metrics = PointsMetrics(5, num_classes=num_classes)
-            evaluator = HerdNetEvaluator(
-                model=model,
-                dataloader=dataloader,
-                metrics=metrics,
-                lmds_kwargs=dict(kernel_size=(3, 3), adapt_ts=0.2, neg_ts=0.1),
-                device_name=device,
-                print_freq=1,
-                stitcher=stitcher,
-                work_dir=results_dir,
-                header='[SINGLE IMAGE INFERENCE]'
-            )
-            
-            # Run inference
+            # Run inference (full, streaming or coarse-to-fine stitcher, see stitching.py)
             print(f"Running inference on single image...")
-            evaluator.evaluate(wandb_flag=False, viz=False, log_meters=False)
-            
-            # Get detections from evaluator
-            detections_df = evaluator.detections
-            detections_df.dropna(inplace=True)
-            detections_df['species'] = detections_df['labels'].map(classes_dict)
+            tile_stats = tile_counts()
+            detections_df = run_herdnet(herdnet, temp_dir, [image_filename], patch_size, overlap, rotation,
+                                        work_dir=results_dir, mode=stitcher, header='[SINGLE IMAGE INFERENCE]',
+                                        empty_tile_threshold=empty_tile_threshold, tile_stats=tile_stats)
+            detections_df['species'] = detections_df['labels'].map(herdnet['classes'])
             
             # Process detections
             detections = []
@@ -1996,6 +2290,10 @@ def analyze_single_image_herdnet_endpoint():
                     'y': float(row['y'])
                 }
                 
+                # Map coordinates of georeferenced GeoTIFFs
+                if row.get('geo'):
+                    detection['geo'] = row['geo']
+                
                 detections.append(detection)
             
             # Prepare response
@@ -2007,7 +2305,8 @@ def analyze_single_image_herdnet_endpoint():
                     'total_images': 1,
                     'total_detections': len(detections),
                     'images_with_animals': 1 if len(detections) > 0 else 0,
-                    'species_counts': species_counts
+                    'species_counts': species_counts,
+                    **tile_stats
                 },
                 'detections': detections,
                 'processing_params': {
@@ -2016,23 +2315,23 @@ def analyze_single_image_herdnet_endpoint():
                     'rotation': rotation,
                     'thumbnail_size': thumbnail_size,
                     'include_thumbnails': include_thumbnails,
-                    'include_plots': include_plots
+                    'include_plots': include_plots,
+                    'precision': herdnet.get('precision', 'fp32'),
+                    'stitcher': stitcher,
+                    'empty_tile_threshold': empty_tile_threshold,
+                    'preview': preview_options
                 }
             }
             
             # Load original image for thumbnails and plots
             if (include_thumbnails or include_plots) and len(detections) > 0:
-                image = Image.open(image_path)
+                # Rotated the same as during inference; GeoTIFFs are read decimated (see geotiff.py)
+                source = open_source(image_path, rotation)
+                preview, scale = source.preview()
+                image_np = np.array(preview)
                 
-                # Apply rotation if specified (same as during inference)
-                if rotation > 0:
-                    rot_degrees = rotation * 90
-                    image = image.rotate(rot_degrees, expand=True)
-                
-                image_np = np.array(image)
-                
-                # Extract point and class lists from detections
-                point_list = [(int(det['y']), int(det['x'])) for det in detections]
+                # Extract point and class lists from detections (in preview pixels)
+                point_list = [(int(det['y'] * scale), int(det['x'] * scale)) for det in detections]
                 class_list = [detections_df.iloc[i]['labels'] for i in range(len(detections))]
             
             # Generate thumbnails if requested
@@ -2046,16 +2345,13 @@ def analyze_single_image_herdnet_endpoint():
                     # Extract thumbnail
                     x1 = max(0, x - half_size)
                     y1 = max(0, y - half_size)
-                    x2 = min(image_np.shape[1], x + half_size)
-                    y2 = min(image_np.shape[0], y + half_size)
+                    x2 = min(source.width, x + half_size)
+                    y2 = min(source.height, y + half_size)
                     
-                    thumbnail = image_np[y1:y2, x1:x2]
-                    thumbnail_pil = Image.fromarray(thumbnail)
+                    thumbnail = source.crop((x1, y1, x2, y2))
                     
                     # Convert to base64
-                    buffered = io.BytesIO()
-                    thumbnail_pil.save(buffered, format="PNG")
-                    thumb_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+                    thumb_base64, _ = encode_image_base64(thumbnail, preview_options)
                     
                     thumbnails.append({
                         'species': det['species'],
@@ -2072,14 +2368,12 @@ def analyze_single_image_herdnet_endpoint():
                 plots = []
                 
                 # Convert original image to base64
-                original_pil = Image.fromarray(image_np)
-                buffered_original = io.BytesIO()
-                original_pil.save(buffered_original, format="JPEG", quality=85)
-                original_base64 = base64.b64encode(buffered_original.getvalue()).decode('utf-8')
+                original_base64, _ = encode_image_base64(image_np, preview_options)
                 
                 # Create plot with Spanish labels
-                class_labels_spanish = [translate_to_spanish(ANIMAL_CLASSES.get(i, f"class_{i}")) 
-                                       for i in range(len(ANIMAL_CLASSES))]
+                animal_classes = herdnet['animal_classes']
+                class_labels_spanish = [translate_to_spanish(animal_classes.get(i, f"class_{i}")) 
+                                       for i in range(len(animal_classes))]
                 plot_img = draw_points(
                     image=image_np.copy(),
                     points=point_list,
@@ -2088,38 +2382,42 @@ def analyze_single_image_herdnet_endpoint():
                     radius=10
                 )
                 
-                # Convert plot to PIL and base64
-                plot_pil = Image.fromarray(plot_img)
-                buffered_plot = io.BytesIO()
-                plot_pil.save(buffered_plot, format="PNG")
-                plot_base64 = base64.b64encode(buffered_plot.getvalue()).decode('utf-8')
+                # Convert plot to base64
+                plot_base64, _ = encode_image_base64(plot_img, preview_options)
                 
                 plots.append({
                     'image_name': image_filename,
                     'detections_count': len(detections),
                     'original_image_base64': original_base64,
-                    'plot_base64': plot_base64
+                    'plot_base64': plot_base64,
+                    'image_format': preview_mime_type(preview_options)
                 })
                 
+                # Full-resolution deep zoom tiles for the viewer
+                if include_tiles:
+                    plots[-1]['tiles'] = generate_image_pyramids(task_id, image_filename, image_np, plot_img)
+                
                 response_data['plots'] = plots
             
+            if (include_thumbnails or include_plots) and len(detections) > 0:
+                source.close()
+            
             # Calculate processing time
             processing_time = time.time() - start_time
             response_data['processing_time_seconds'] = round(processing_time, 2)
             
-            # Update task in database with success
-            update_task_success(
+            # Update task in database with success and save detections (queued: written after the response is sent)
+            response_data['persistence_status'] = persist_task_success(
                 task_id=task_id,
+                model_type='herdnet',
                 processing_time=processing_time,
                 total_detections=len(detections),
                 images_with_detections=1 if len(detections) > 0 else 0,
                 species_counts=species_counts,
-                result_data=response_data
+                result_data=response_data,
+                detections=detections
             )
             
-            # Save detections to database
-            save_detections(task_id, detections, 'herdnet')
-            
             print(f"\n✅ Single image HerdNet analysis complete! Task ID: {task_id}")
             print(f"   - Detections: {len(detections)}")
             print(f"   - Processing time: {processing_time:.2f}s\n")
@@ -2141,7 +2439,7 @@ def analyze_single_image_herdnet_endpoint():
         
         # Update task with error if task_id exists
         if task_id:
-            update_task_error(task_id, str(e))
+            persist_task_error(task_id, str(e))
         
         return jsonify({
             'success': False,
@@ -2155,7 +2453,9 @@ def analyze_single_image_herdnet_endpoint():
 def get_tasks_endpoint():
     """
     Get All Tasks
-    Retrieve a list of all analysis tasks with optional filtering
+    Retrieve a list of all analysis tasks with optional filtering.
+    Tasks are returned newest first and paginated with an opaque cursor: pass the
+    next_cursor of a response to get the following page (null on the last page).
     ---
     tags:
       - Tasks
@@ -2176,12 +2476,21 @@ def get_tasks_endpoint():
         required: false
         default: 100
         description: Maximum number of tasks to return
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: fields
+        in: query
+        type: string
+        required: false
+        description: Comma-separated list of task fields to return (e.g. task_id,status,created_at). All fields if omitted
       - name: offset
         in: query
         type: integer
         required: false
-        default: 0
-        description: Pagination offset
+        description: Legacy offset pagination (deprecated, use cursor). Cannot be combined with cursor
     responses:
       200:
         description: Tasks retrieved successfully
@@ -2190,6 +2499,11 @@ def get_tasks_endpoint():
           properties:
             success:
               type: boolean
+            count:
+              type: integer
+            next_cursor:
+              type: string
+              description: Cursor of the next page (null if there are no more tasks)
             tasks:
               type: array
               items:
@@ -2209,20 +2523,38 @@ def get_tasks_endpoint():
                     type: integer
                   created_at:
                     type: string
+      400:
+        description: Invalid cursor, fields or pagination parameters
       500:
         description: Server error
     """
     try:
         model_type = request.args.get('model_type')
         status = request.args.get('status')
-        limit = int(request.args.get('limit', 100))
-        offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor')
+        fields = request.args.get('fields')
         
-        tasks = get_all_tasks(model_type, status, limit, offset)
+        try:
+            limit = int(request.args.get('limit', 100))
+            if limit < 1:
+                raise ValueError("limit must be a positive integer")
+            
+            if 'offset' in request.args:
+                if cursor:
+                    raise ValueError("cursor and offset cannot be combined")
+                offset = int(request.args['offset'])
+                tasks = get_all_tasks(model_type, status, limit, offset, fields=fields)
+                next_cursor = None
+            else:
+                page = get_tasks_page(model_type, status, limit, cursor=cursor, fields=fields)
+                tasks, next_cursor = page['tasks'], page['next_cursor']
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
         return jsonify({
             'success': True,
             'count': len(tasks),
+            'next_cursor': next_cursor,
             'tasks': tasks
         }), 200
     except Exception as e:
@@ -2243,6 +2575,12 @@ def get_task_endpoint(task_id):
         type: string
         required: true
         description: Unique task identifier (UUID)
+      - name: include_result
+        in: query
+        type: boolean
+        required: false
+        default: true
+        description: Include result_data (the complete analysis response). Set to false to skip loading and decompressing it
     responses:
       200:
         description: Task retrieved successfully
@@ -2272,23 +2610,310 @@ def get_task_endpoint(task_id):
                   type: string
                 processing_time_seconds:
                   type: number
+                result_size:
+                  type: integer
+                  description: Size in bytes of the uncompressed result_data JSON
+                persistence_status:
+                  type: string
+                  description: "'saved' when all writes of the task are committed (its detections are queryable), 'queued' while they are pending. Only writes queued by the worker process answering the request are seen"
                 result_data:
                   type: object
                   description: Complete JSON response from the analysis
+      202:
+        description: Task results are queued for persistence and not yet stored
       404:
         description: Task not found
       500:
         description: Server error
     """
     try:
-        task = get_task_by_id(task_id)
+        include_result = request.args.get('include_result', 'true').lower() == 'true'
+        task = get_task_by_id(task_id, include_result=include_result)
+        status = persistence_status(task_id)
         if not task:
+            if status == 'queued':
+                return jsonify({'success': True, 'task': {'task_id': task_id, 'persistence_status': status}}), 202
             return jsonify({'success': False, 'error': 'Task not found'}), 404
+        task['persistence_status'] = status
         return jsonify({'success': True, 'task': task}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Page size limits for /tasks/<task_id>/detections
+DETECTIONS_PAGE_SIZE = int(os.environ.get('DETECTIONS_PAGE_SIZE', 1000))
+DETECTIONS_MAX_PAGE_SIZE = int(os.environ.get('DETECTIONS_MAX_PAGE_SIZE', 10000))
+
+
+@app.route("/tasks/<task_id>/detections", methods=["GET"])
+def get_task_detections_endpoint(task_id):
+    """
+    Get Task Detections
+    Page through the detections of a task, with optional filtering.
+    Served from the detections table (the task's result_data is never loaded) and streamed,
+    so large pages are not built in memory. Pass next_cursor to get the following page.
+    With image and region, only detections inside that pixel window are returned, looked up
+    in the spatial index (e.g. the detections in the current view of the deep zoom viewer).
+    ---
+    tags:
+      - Tasks
+    parameters:
+      - name: task_id
+        in: path
+        type: string
+        required: true
+        description: Unique task identifier (UUID)
+      - name: species
+        in: query
+        type: string
+        required: false
+        description: Only detections of this species
+      - name: min_confidence
+        in: query
+        type: number
+        required: false
+        description: Only detections with confidence >= this value
+      - name: image
+        in: query
+        type: string
+        required: false
+        description: Only detections of this image
+      - name: region
+        in: query
+        type: string
+        required: false
+        description: Pixel window x1,y1,x2,y2 of the image; only detections whose box or point intersects it (requires image)
+      - name: cursor
+        in: query
+        type: string
+        required: false
+        description: next_cursor from the previous page
+      - name: limit
+        in: query
+        type: integer
+        required: false
+        default: 1000
+        description: Maximum number of detections to return (up to DETECTIONS_MAX_PAGE_SIZE, default 10000)
+    responses:
+      200:
+        description: Detections retrieved successfully
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            task_id:
+              type: string
+            detections:
+              type: array
+              items:
+                type: object
+                properties:
+                  id:
+                    type: integer
+                  image_name:
+                    type: string
+                  species:
+                    type: string
+                  confidence:
+                    type: number
+                  x:
+                    type: number
+                  y:
+                    type: number
+                  bbox_x1:
+                    type: number
+                  bbox_y1:
+                    type: number
+                  bbox_x2:
+                    type: number
+                  bbox_y2:
+                    type: number
+            count:
+              type: integer
+            next_cursor:
+              type: string
+              description: Cursor of the next page (null if there are no more detections)
+            persistence_status:
+              type: string
+              description: "'queued' while the task's detections are still being written (the list may be incomplete), 'saved' otherwise"
+      400:
+        description: Invalid filter or pagination parameters
+      404:
+        description: Task not found
+      500:
+        description: Server error
+    """
+    try:
+        status = persistence_status(task_id)
+        if not get_task_by_id(task_id, include_result=False) and status != 'queued':
+            return jsonify({'success': False, 'error': 'Task not found'}), 404
+        
+        try:
+            limit = int(request.args.get('limit', DETECTIONS_PAGE_SIZE))
+            if not 1 <= limit <= DETECTIONS_MAX_PAGE_SIZE:
+                raise ValueError(f"limit must be between 1 and {DETECTIONS_MAX_PAGE_SIZE}")
+            min_confidence = request.args.get('min_confidence')
+            if min_confidence is not None:
+                min_confidence = float(min_confidence)
+            region = request.args.get('region')
+            if region is not None:
+                region = parse_region(region)
+            
+            # One extra row tells whether there is a next page
+            detections = iter_task_detections(
+                task_id,
+                species=request.args.get('species'),
+                min_confidence=min_confidence,
+                image=request.args.get('image'),
+                cursor=request.args.get('cursor'),
+                limit=limit + 1,
+                region=region
+            )
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        def generate():
+            yield (f'{{"success": true, "task_id": {json.dumps(task_id)}, '
+                   f'"persistence_status": {json.dumps(status)}, "detections": [')
+            count, next_cursor, last_id = 0, None, None
+            for detection in detections:
+                if count == limit:
+                    next_cursor = encode_cursor(last_id)
+                    break
+                yield (',' if count else '') + json.dumps(detection)
+                count += 1
+                last_id = detection['id']
+            yield f'], "count": {count}, "next_cursor": {json.dumps(next_cursor)}}}'
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route("/tasks/<task_id>/tiles", methods=["GET"])
+def get_task_tiles_endpoint(task_id):
+    """
+    Get Task Tile Pyramids
+    List the deep zoom (DZI) tile pyramids generated for a task
+    ---
+    tags:
+      - Tasks
+    parameters:
+      - name: task_id
+        in: path
+        type: string
+        required: true
+        description: Unique task identifier (UUID)
+    responses:
+      200:
+        description: Tile pyramids retrieved successfully
+        schema:
+          type: object
+          properties:
+            success:
+              type: boolean
+            pyramids:
+              type: array
+              items:
+                type: object
+                properties:
+                  image_key:
+                    type: string
+                  variant:
+                    type: string
+                  dzi_url:
+                    type: string
+      500:
+        description: Server error
+    """
+    try:
+        pyramids = list_task_pyramids(task_id)
+        return jsonify({'success': True, 'count': len(pyramids), 'pyramids': pyramids}), 200
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route("/tiles/<task_id>/<image_key>/<variant>.dzi", methods=["GET"])
+def get_tile_descriptor_endpoint(task_id, image_key, variant):
+    """
+    Get Deep Zoom Descriptor
+    DZI descriptor of a tile pyramid (for OpenSeadragon or any DeepZoom viewer)
+    ---
+    tags:
+      - Tasks
+    parameters:
+      - name: task_id
+        in: path
+        type: string
+        required: true
+      - name: image_key
+        in: path
+        type: string
+        required: true
+      - name: variant
+        in: path
+        type: string
+        required: true
+        description: original or annotated
+    responses:
+      200:
+        description: DZI XML descriptor
+      404:
+        description: Pyramid not found
+    """
+    if variant not in TILE_VARIANTS:
+        abort(404)
+    response = send_from_directory(TILES_DIR, f"{task_id}/{image_key}/{variant}.dzi",
+                                   mimetype='application/xml', max_age=TILE_CACHE_MAX_AGE)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+@app.route("/tiles/<task_id>/<image_key>/<variant>_files/<int:level>/<tile_name>", methods=["GET"])
+def get_tile_endpoint(task_id, image_key, variant, level, tile_name):
+    """
+    Get Deep Zoom Tile
+    A single tile of a pyramid level, served with long-lived cache headers
+    ---
+    tags:
+      - Tasks
+    parameters:
+      - name: task_id
+        in: path
+        type: string
+        required: true
+      - name: image_key
+        in: path
+        type: string
+        required: true
+      - name: variant
+        in: path
+        type: string
+        required: true
+      - name: level
+        in: path
+        type: integer
+        required: true
+      - name: tile_name
+        in: path
+        type: string
+        required: true
+        description: Tile file name ({col}_{row}.{format})
+    responses:
+      200:
+        description: Tile image
+      404:
+        description: Tile not found
+    """
+    if variant not in TILE_VARIANTS:
+        abort(404)
+    response = send_from_directory(TILES_DIR, f"{task_id}/{image_key}/{variant}_files/{level}/{tile_name}",
+                                   max_age=TILE_CACHE_MAX_AGE)
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
 @app.route("/database/stats", methods=["GET"])
 def get_stats_endpoint():
     """
@@ -2323,6 +2948,11 @@ def get_stats_endpoint():
                 species_distribution:
                   type: object
                   description: Detection counts grouped by species
+                daily_activity:
+                  type: array
+                  description: Tasks and detections per day (most recent days, from rollup tables)
+                  items:
+                    type: object
       500:
         description: Server error
     """
@@ -2333,15 +2963,70 @@ def get_stats_endpoint():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route("/export/detections", methods=["GET"])
+def export_detections_endpoint():
+    """
+    Export Detections to Parquet
+    Download detections across tasks as a single Parquet file, streamed one row group at a time.
+    For partitioned datasets (by model and month) use the CLI: python export_parquet.py
+    ---
+    tags:
+      - Database
+    produces:
+      - application/vnd.apache.parquet
+    parameters:
+      - name: start_date
+        in: query
+        type: string
+        required: false
+        description: First day to include (YYYY-MM-DD, by task creation date)
+      - name: end_date
+        in: query
+        type: string
+        required: false
+        description: Last day to include (YYYY-MM-DD, inclusive)
+      - name: model_type
+        in: query
+        type: string
+        required: false
+        description: Only detections of this model (yolo or herdnet)
+      - name: species
+        in: query
+        type: string
+        required: false
+        description: Comma-separated list of species to include
+    responses:
+      200:
+        description: Parquet file with columns task_id, model_type, task_created_at, filename, image_name, species, confidence, x, y, bbox_x1, bbox_y1, bbox_x2, bbox_y2
+      400:
+        description: Invalid filter parameters
+      501:
+        description: pyarrow is not installed on the server
+    """
+    if not parquet_available():
+        return jsonify({'success': False, 'error': 'Parquet export requires pyarrow on the server'}), 501
+    
+    try:
+        filters = parse_export_filters(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    filename = f"detections_{datetime.now().strftime('%Y%m%d_%H%M%S')}.parquet"
+    return Response(
+        stream_with_context(stream_detections_parquet(**filters)),
+        mimetype='application/vnd.apache.parquet',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+
 if __name__ == "__main__":
     print("\n" + "="*60)
     print("🚀 Starting Flask server...")
     print("="*60)
     print(f"\n📊 Model Status:")
-    print(f"  HerdNet:  ✓ Loaded ({num_classes} classes)")
-    print(f"  YOLOv11:  {'✓ Loaded' if yolo_loaded else '✗ Not loaded'}")
+    for name, label in (('herdnet', 'HerdNet'), ('yolo', 'YOLOv11')):
+        print(f"  {label + ':':<9} {model_status(name)['status']}")
     print(f"\n💻 Device: {device}")
-    print(f"🦁 Species: {list(classes_dict.values())}")
     print("\n" + "="*60)
     print("  Server: http://0.0.0.0:8000")
     print("  Health: http://localhost:8000/health")
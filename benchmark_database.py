@@ -0,0 +1,163 @@
+"""
+Database Benchmark - Query latencies of the API's task and detection queries before and after schema migrations
+
+Usage:
+    python benchmark_database.py [--detections 1000000] [--tasks 20000] [--runs 5]
+"""
+
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import database
+
+SPECIES = ['buffalo', 'elephant', 'kob', 'topi', 'warthog', 'waterbuck']
+MODEL_TYPES = ['yolo', 'herdnet']
+STATUSES = ['completed', 'completed', 'completed', 'failed', 'processing']
+
+
+def populate(num_tasks, num_detections):
+    """Fill the database with synthetic tasks, results and detections."""
+    rng = random.Random(42)
+    start = datetime(2023, 1, 1)
+    task_ids = [str(uuid.uuid4()) for _ in range(num_tasks)]
+
+    with database.transaction() as conn:
+        conn.executemany("""
+            INSERT INTO tasks (task_id, model_type, created_at, status, filename, num_images,
+                               processing_time_seconds, total_detections, images_with_detections,
+                               species_counts, processing_params)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, ((task_id, rng.choice(MODEL_TYPES), (start + timedelta(minutes=i)).isoformat(),
+               rng.choice(STATUSES), f'survey_{i}.zip', 10, 12.5, 50, 5,
+               json.dumps({'kob': 50}), json.dumps({'patch_size': 512}))
+              for i, task_id in enumerate(task_ids)))
+
+        conn.executemany("""
+            INSERT INTO task_results (task_id, result_data, created_at)
+            VALUES (?, ?, ?)
+        """, ((task_id, json.dumps({'success': True}), (start + timedelta(minutes=i)).isoformat())
+              for i, task_id in enumerate(task_ids)))
+
+        conn.executemany("""
+            INSERT INTO detections (task_id, image_name, species, confidence, x, y)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, ((rng.choice(task_ids), f'img_{rng.randrange(100)}.jpg', rng.choice(SPECIES),
+               rng.random(), rng.random() * 6000, rng.random() * 4000)
+              for _ in range(num_detections)))
+
+    return task_ids
+
+
+def timed(func, runs):
+    """Median latency of func in milliseconds."""
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return statistics.median(latencies)
+
+
+def query_plan(sql, params=()):
+    """EXPLAIN QUERY PLAN details of a statement."""
+    rows = database.get_connection().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return '; '.join(row['detail'] for row in rows)
+
+
+def run_queries(task_ids, runs):
+    """Run the API queries and return {name: (latency_ms, plan)}."""
+    task_id = task_ids[len(task_ids) // 2]
+    # Cursor positioned halfway through the task list, like a client deep into "load more"
+    deep_offset = len(task_ids) // 2
+    deep_task = database.get_all_tasks(limit=1, offset=deep_offset, fields=['task_id', 'created_at'])[0]
+    deep_cursor = database.encode_cursor(deep_task['created_at'], deep_task['task_id'])
+    queries = {
+        'get_all_tasks()': (
+            lambda: database.get_all_tasks(),
+            "SELECT * FROM tasks WHERE 1=1 ORDER BY created_at DESC, task_id DESC LIMIT 100", ()),
+        'get_all_tasks(model_type, status)': (
+            lambda: database.get_all_tasks(model_type='herdnet', status='completed'),
+            "SELECT * FROM tasks WHERE 1=1 AND model_type = ? AND status = ? "
+            "ORDER BY created_at DESC, task_id DESC LIMIT 100",
+            ('herdnet', 'completed')),
+        'get_all_tasks(deep offset)': (
+            lambda: database.get_all_tasks(offset=deep_offset),
+            "SELECT * FROM tasks WHERE 1=1 ORDER BY created_at DESC, task_id DESC LIMIT 100 OFFSET ?",
+            (deep_offset,)),
+        'get_tasks_page(deep cursor)': (
+            lambda: database.get_tasks_page(cursor=deep_cursor),
+            "SELECT * FROM tasks WHERE 1=1 AND (created_at, task_id) < (?, ?) "
+            "ORDER BY created_at DESC, task_id DESC LIMIT 101",
+            database.decode_cursor(deep_cursor)),
+        'get_tasks_page(fields, model_type)': (
+            lambda: database.get_tasks_page(model_type='yolo', cursor=deep_cursor,
+                                            fields=['task_id', 'status', 'created_at']),
+            "SELECT created_at, task_id, status FROM tasks WHERE 1=1 AND model_type = ? "
+            "AND (created_at, task_id) < (?, ?) ORDER BY created_at DESC, task_id DESC LIMIT 101",
+            ('yolo', *database.decode_cursor(deep_cursor))),
+        'latest result of a task': (
+            lambda: database.get_connection().execute(
+                "SELECT result_data FROM task_results WHERE task_id = ? ORDER BY created_at DESC LIMIT 1",
+                (task_id,)).fetchone(),
+            "SELECT result_data FROM task_results WHERE task_id = ? ORDER BY created_at DESC LIMIT 1", (task_id,)),
+        'detections of a task': (
+            lambda: database.get_connection().execute(
+                "SELECT * FROM detections WHERE task_id = ?", (task_id,)).fetchall(),
+            "SELECT * FROM detections WHERE task_id = ?", (task_id,)),
+        'species distribution (GROUP BY)': (
+            lambda: database.get_connection().execute(
+                "SELECT species, COUNT(*) as count FROM detections GROUP BY species ORDER BY count DESC").fetchall(),
+            "SELECT species, COUNT(*) as count FROM detections GROUP BY species ORDER BY count DESC", ()),
+    }
+
+    results = {}
+    for name, (func, sql, params) in queries.items():
+        results[name] = (timed(func, runs), query_plan(sql, params))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--detections', type=int, default=1_000_000)
+    parser.add_argument('--tasks', type=int, default=20_000)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        database.DB_PATH = Path(temp_dir) / 'benchmark.db'
+        database.init_database(apply_migrations=False)
+
+        print(f"Populating {args.tasks:,} tasks and {args.detections:,} detections...")
+        start = time.perf_counter()
+        task_ids = populate(args.tasks, args.detections)
+        print(f"  done in {time.perf_counter() - start:.1f}s\n")
+
+        before = run_queries(task_ids, args.runs)
+        database.migrate_database()
+        after = run_queries(task_ids, args.runs)
+
+        print(f"\n{'Query':<36} {'Before (ms)':>12} {'After (ms)':>12} {'Speedup':>9}")
+        print("-" * 72)
+        for name in before:
+            b, a = before[name][0], after[name][0]
+            print(f"{name:<36} {b:>12.2f} {a:>12.2f} {b / max(a, 1e-6):>8.1f}x")
+
+        stats_latency = timed(database.get_database_stats, args.runs)
+        print(f"{'get_database_stats() (rollups)':<36} {'':>12} {stats_latency:>12.2f}")
+
+        print("\nQuery plans after migration:")
+        for name, (_, plan) in after.items():
+            print(f"  {name}: {plan}")
+
+        database.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Stitcher Benchmark - Recall and time of the coarse-to-fine HerdNet stitcher against the single-pass streaming stitcher
+
+Every image is processed once by the single-pass streaming stitcher and once per coarse threshold by
+the coarse-to-fine stitcher. Recall is the share of reference points with a detection within
+--radius pixels; the reference is the ground truth when --annotations is given (CSV with images,
+x and y columns), otherwise the single-pass detections.
+
+Usage:
+    python benchmark_stitcher.py --images DIR [--annotations CSV] [--thresholds 0.02,0.05,0.1]
+                                 [--scale 4] [--patch-size 512] [--overlap 160] [--radius 5]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+import pandas as pd
+
+from stitching import (COARSE_SCALE, COARSE_THRESHOLD, DETECTION_COLUMNS, CoarseToFineStitcher, StreamingStitcher,
+                       open_source)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.webp')
+
+
+def detect(stitcher, image_dir, img_names, runs):
+    """
+    Detections of a stitcher over the images.
+
+    Returns:
+        Tuple (DataFrame of detections, median seconds of a pass over all the images)
+    """
+    timings = []
+    for _ in range(runs):
+        frames = []
+        start = time.perf_counter()
+        for name in img_names:
+            source = open_source(os.path.join(image_dir, name))
+            try:
+                frame = pd.DataFrame(stitcher(source), columns=DETECTION_COLUMNS[1:])
+            finally:
+                source.close()
+            frame.insert(0, 'images', name)
+            frames.append(frame)
+        timings.append(time.perf_counter() - start)
+    return pd.concat(frames, ignore_index=True), statistics.median(timings)
+
+
+def match(detections, reference, radius):
+    """
+    Recall and precision of detections against reference points (a point is matched by any
+    point of the other set within radius pixels).
+    """
+    found, correct = 0, 0
+    for name in set(reference['images']) | set(detections['images']):
+        ref = reference.loc[reference['images'] == name, ['x', 'y']].to_numpy(dtype=float)
+        det = detections.loc[detections['images'] == name, ['x', 'y']].to_numpy(dtype=float)
+        if len(ref) and len(det):
+            close = np.hypot(ref[:, None, 0] - det[None, :, 0], ref[:, None, 1] - det[None, :, 1]) <= radius
+            found += int(close.any(axis=1).sum())
+            correct += int(close.any(axis=0).sum())
+    recall = found / len(reference) if len(reference) else 1.0
+    precision = correct / len(detections) if len(detections) else float(not len(reference))
+    return round(recall, 4), round(precision, 4)
+
+
+def main():
+    from model_registry import device, load_model
+    from preprocessing import herdnet_input_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', required=True, help="Folder of the frames")
+    parser.add_argument('--annotations', help="Ground truth CSV (images, x, y); default: single-pass detections")
+    parser.add_argument('--thresholds', default=str(COARSE_THRESHOLD),
+                        help="Comma-separated coarse heatmap thresholds to compare")
+    parser.add_argument('--scale', type=int, default=COARSE_SCALE, help="Downsampling factor of the coarse pass")
+    parser.add_argument('--patch-size', type=int, default=512)
+    parser.add_argument('--overlap', type=int, default=160)
+    parser.add_argument('--radius', type=int, default=5, help="Matching radius (pixels)")
+    parser.add_argument('--runs', type=int, default=1, help="Timed passes per stitcher (median)")
+    args = parser.parse_args()
+
+    img_names = sorted(name for name in os.listdir(args.images) if name.lower().endswith(IMAGE_EXTENSIONS))
+    if not img_names:
+        raise SystemExit(f"❌ No images found in {args.images}")
+    thresholds = [float(value) for value in args.thresholds.split(',')]
+
+    bundle, _ = load_model('herdnet')
+    model = herdnet_input_model(bundle)
+    single = StreamingStitcher(model, args.patch_size, args.overlap, device=device)
+    # One untimed pass over the first frame so that lazy initialization is not measured
+    detect(single, args.images, img_names[:1], 1)
+
+    print(f"⏳ Single-pass streaming stitcher on {len(img_names)} images...")
+    baseline, baseline_time = detect(single, args.images, img_names, args.runs)
+    if args.annotations:
+        reference, reference_name = pd.read_csv(args.annotations), 'ground truth'
+        reference = reference[reference['images'].isin(img_names)]
+    else:
+        reference, reference_name = baseline, 'single-pass detections'
+
+    rows = [('streaming', '', '100.0%', baseline_time, *match(baseline, reference, args.radius), len(baseline))]
+    for threshold in thresholds:
+        print(f"⏳ Coarse-to-fine stitcher (scale {args.scale}, threshold {threshold})...")
+        stitcher = CoarseToFineStitcher(model, args.patch_size, args.overlap, scale=args.scale, threshold=threshold,
+                                        device=device)
+        detections, seconds = detect(stitcher, args.images, img_names, args.runs)
+        run_share = 1 - stitcher.skipped / stitcher.total if stitcher.total else 1.0
+        rows.append(('coarse_to_fine', threshold, f"{run_share:.1%}", seconds,
+                     *match(detections, reference, args.radius), len(detections)))
+
+    print(f"\nReference: {reference_name} ({len(reference)} points, radius {args.radius} px)")
+    print(f"{'Stitcher':<16} {'Threshold':>9} {'Patches':>8} {'Time (s)':>9} {'Speedup':>8} "
+          f"{'Recall':>7} {'Precision':>9} {'Detections':>10}")
+    print("-" * 84)
+    for name, threshold, patches, seconds, recall, precision, count in rows:
+        print(f"{name:<16} {threshold:>9} {patches:>8} {seconds:>9.2f} {baseline_time / max(seconds, 1e-6):>7.1f}x "
+              f"{recall:>7.4f} {precision:>9.4f} {count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Health Check - Verifies that /health reports ready only once every enabled model is warmed up
+
+Runs the preload of the API (MODEL_PRELOAD on) with stand-ins for fetching, loading and warming up
+the models, each held until the check releases it, and queries /health at every stage:
+
+    fetching:       weights being downloaded (ensure_models), no model loaded yet
+    warming up:     a model loaded and in prepare_model, once per enabled model
+    ready:          prepare_model finished for every enabled model
+
+The API is imported with a temporary database, so the check does not touch the real one.
+
+Usage:
+    python check_health.py
+"""
+
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# The check starts the preload itself, once the stand-ins are in place
+os.environ['MODEL_PRELOAD'] = 'false'
+
+import database
+
+_db_dir = tempfile.TemporaryDirectory()
+database.DB_PATH = Path(_db_dir.name) / 'wildlife_detection.db'
+
+import app
+import model_registry
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the preload")
+        time.sleep(0.01)
+
+
+def run_checks():
+    """
+    Preload the enabled models with stand-ins and query /health at every stage.
+
+    Returns:
+        List of (name, passed, detail)
+    """
+    names = [name for name in model_registry.ENABLED_MODELS if name in model_registry._LOADERS]
+    fetch_gate = threading.Event()
+    warmup_gates = {name: threading.Event() for name in names}
+    warmed_up = []
+
+    def ensure_models(model_names):
+        fetch_gate.wait()
+        return {name: True for name in model_names}
+
+    def prepare_model(name, bundle, weights_path, device):
+        warmup_gates[name].wait()
+        warmed_up.append(name)
+        return 0.0
+
+    def apply_backend(name, bundle, weights_path, device):
+        bundle['backend'] = 'torch'
+
+    stand_ins = {
+        'MODEL_PRELOAD': True,
+        'ensure_models': ensure_models,
+        'load_model': lambda name: ({'model': None, 'classes': {}, 'num_classes': 0}, Path(name)),
+        'apply_backend': apply_backend,
+        'prepare_model': prepare_model,
+        'add_bf16_variant': lambda name, bundle, device: None,
+        'load_quantized': lambda name, bundle, weights_path: None,
+    }
+    originals = {attr: getattr(model_registry, attr) for attr in stand_ins}
+    for attr, value in stand_ins.items():
+        setattr(model_registry, attr, value)
+
+    results = []
+    client = app.app.test_client()
+
+    def check(name, expected_code, detail='', passed=True):
+        response = client.get('/health')
+        body = response.get_json()
+        statuses = {key: model['status'] for key, model in body['models'].items() if model['enabled']}
+        passed = passed and response.status_code == expected_code
+        results.append((name, passed, f"{response.status_code} {body['status']} {statuses} {detail}".rstrip()))
+
+    try:
+        thread = model_registry.preload_models()
+        check('fetching', 503)
+
+        fetch_gate.set()
+        for name in names:
+            _wait_for(lambda: model_registry.model_status(name)['status'] == model_registry.STATUS_WARMING_UP)
+            check('warming up', 503, name)
+            warmup_gates[name].set()
+            _wait_for(lambda: model_registry.model_status(name)['status'] == model_registry.STATUS_READY)
+
+        thread.join(10)
+        check('ready', 200, f"warmed up: {', '.join(warmed_up)}", passed=warmed_up == names)
+    finally:
+        fetch_gate.set()
+        for gate in warmup_gates.values():
+            gate.set()
+        for attr, value in originals.items():
+            setattr(model_registry, attr, value)
+    return results
+
+
+def main():
+    results = run_checks()
+    print("\nHealth checks (preload with stand-in models):")
+    for name, passed, detail in results:
+        print(f"  {'✓' if passed else '❌'} {name:<12} {detail}")
+    raise SystemExit(0 if all(passed for _, passed, _ in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Model Loader Check - Runs the model fetcher against a local HTTP stand-in for the model mirror
+
+The stand-in serves files with range requests and can drop a connection halfway through a
+response, like a flaky mirror. The checks cover the cases a cold start can hit:
+
+    download:       fresh download, size and SHA-256 verified, sidecar digest written
+    resume:         connection dropped mid-file, resumed with a range request from the .part file
+    stale part:     .part file left by an earlier version of the file, discarded and downloaded again
+    mismatch:       manifest digest that does not match the served file, rejected and nothing kept
+    truncated:      truncated checkpoint in the cache without a manifest digest, downloaded again
+    parallel:       both models fetched by ensure_models in parallel
+
+Usage:
+    python check_model_loader.py
+"""
+
+import hashlib
+import io
+import re
+import tempfile
+import threading
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import model_loader
+from model_loader import ChecksumError, MODELS, ensure_models, fetch_file, verify_file
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Serves server.files with range support; paths in server.drop are cut after half their bytes once."""
+
+    def do_GET(self):
+        name = self.path.lstrip('/')
+        data = self.server.files.get(name)
+        if data is None:
+            self.send_error(404)
+            return
+
+        start = 0
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        self.server.requests.append((name, self.headers.get('Range')))
+        if match:
+            start = int(match.group(1))
+            if start >= len(data):
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{len(data)}')
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(data) - 1}/{len(data)}')
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if name in self.server.drop:
+            self.server.drop.discard(name)
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _checkpoint(seed, size=200_000):
+    """Bytes of a zip archive, like the checkpoints written by torch.save."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        archive.writestr('archive/data.pkl', hashlib.sha256(str(seed).encode()).digest() * (size // 32))
+    return buffer.getvalue()
+
+
+def _entry(server, name, data, **overrides):
+    entry = {'url': f"http://127.0.0.1:{server.server_port}/{name}",
+             'sha256': hashlib.sha256(data).hexdigest(), 'size': len(data)}
+    entry.update(overrides)
+    return entry
+
+
+def run_checks():
+    """
+    Run every check against a fresh stand-in and cache directory.
+
+    Returns:
+        List of (name, passed, detail)
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.files, server.drop, server.requests = {}, set(), []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Retries are immediate against the stand-in, and small chunks keep the bytes received before a drop
+    sleep, model_loader.time.sleep = model_loader.time.sleep, lambda seconds: None
+    chunk_size, model_loader.MODEL_DOWNLOAD_CHUNK_SIZE = model_loader.MODEL_DOWNLOAD_CHUNK_SIZE, 16 * 1024
+
+    results = []
+
+    def check(name, func):
+        try:
+            detail = func()
+            results.append((name, True, detail))
+        except Exception as e:
+            results.append((name, False, f"{type(e).__name__}: {e}"))
+
+    try:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = Path(cache_dir)
+            v1, v2 = _checkpoint(1), _checkpoint(2)
+
+            def download():
+                server.files['a.pt'] = v1
+                path = fetch_file('a.pt', _entry(server, 'a.pt', v1), cache)
+                assert path.read_bytes() == v1, "downloaded bytes differ"
+                assert (cache / '.a.pt.sha256').read_text() == hashlib.sha256(v1).hexdigest(), "no sidecar digest"
+                return f"{len(v1)} bytes"
+
+            def resume():
+                server.files['b.pt'] = v1
+                server.drop.add('b.pt')
+                server.requests.clear()
+                path = fetch_file('b.pt', _entry(server, 'b.pt', v1), cache)
+                assert path.read_bytes() == v1, "resumed file differs"
+                ranges = [r for n, r in server.requests if n == 'b.pt']
+                assert len(ranges) == 2 and ranges[0] is None and ranges[1], ranges
+                offset = int(re.match(r'bytes=(\d+)-', ranges[1]).group(1))
+                assert 0 < offset <= len(v1) // 2, ranges
+                return f"resumed with {ranges[1]} of {len(v1)}"
+
+            def stale_part():
+                server.files['c.pt'] = v2
+                (cache / 'c.pt.part').write_bytes(v1[:len(v1) // 3])
+                server.requests.clear()
+                path = fetch_file('c.pt', _entry(server, 'c.pt', v2), cache)
+                assert path.read_bytes() == v2, "file built on the stale .part"
+                assert not (cache / 'c.pt.part').exists(), ".part left behind"
+                return f"{len(server.requests)} requests"
+
+            def mismatch():
+                server.files['d.pt'] = v1
+                try:
+                    fetch_file('d.pt', _entry(server, 'd.pt', v1, sha256='0' * 64), cache)
+                except ChecksumError as e:
+                    assert not (cache / 'd.pt').exists() and not (cache / 'd.pt.part').exists(), "file kept"
+                    return str(e)[:60]
+                raise AssertionError("mismatching file accepted")
+
+            def truncated():
+                server.files['e.pt'] = v1
+                (cache / 'e.pt').write_bytes(v1[:len(v1) // 2])
+                entry = {'url': _entry(server, 'e.pt', v1)['url']}
+                assert not verify_file(cache / 'e.pt', entry), "truncated checkpoint accepted"
+                path = fetch_file('e.pt', entry, cache)
+                assert path.read_bytes() == v1, "truncated checkpoint not replaced"
+                return "downloaded again"
+
+            def parallel():
+                filenames = {name: config['filename'] for name, config in MODELS.items()}
+                manifest = {}
+                for seed, (name, filename) in enumerate(filenames.items(), start=10):
+                    server.files[filename] = _checkpoint(seed)
+                    manifest[filename] = _entry(server, filename, server.files[filename])
+                cache_dir, model_loader.MODEL_CACHE_DIR = model_loader.MODEL_CACHE_DIR, cache / 'models'
+                try:
+                    status = ensure_models(manifest=manifest)
+                finally:
+                    model_loader.MODEL_CACHE_DIR = cache_dir
+                assert all(status.values()), status
+                assert all((cache / 'models' / f).read_bytes() == server.files[f] for f in filenames.values())
+                return ', '.join(filenames.values())
+
+            check('download', download)
+            check('resume', resume)
+            check('stale part', stale_part)
+            check('mismatch', mismatch)
+            check('truncated', truncated)
+            check('parallel', parallel)
+    finally:
+        model_loader.time.sleep = sleep
+        model_loader.MODEL_DOWNLOAD_CHUNK_SIZE = chunk_size
+        server.shutdown()
+    return results
+
+
+def main():
+    results = run_checks()
+    print("\nModel loader checks (local HTTP stand-in):")
+    for name, passed, detail in results:
+        print(f"  {'✓' if passed else '❌'} {name:<12} {detail}")
+    raise SystemExit(0 if all(passed for _, passed, _ in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Empty-Tile Filter Check - Compares filtered and unfiltered HerdNet runs on a synthetic frame
+
+The frame holds a faint animal in the overlap between a patch that is run (it also holds a
+bright animal) and a neighbour with nothing else in it, which the filter skips. The stand-in
+network's heatmap is the brightness of the frame above the ground, so the faint animal sits
+between the LMDS adaptive threshold and twice that threshold: averaged with the zero outputs of
+the skipped neighbour it would be lost. Each stitcher must find the same animals with and without
+the filter:
+
+    streaming:      StreamingStitcher (leaves skipped patches out of the overlap counts)
+    full:           animaloc's HerdNetStitcher through KeptShare (needs animaloc)
+
+Usage:
+    python check_tile_filter.py
+"""
+
+import tempfile
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from stitching import run_herdnet
+
+GROUND = 50
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+THRESHOLD = 20
+# (x, y, brightness above the ground): bright animals in the run patches, a faint one in the overlap
+ANIMALS = [(100.5, 100.5, 205), (100.5, 700.5, 205), (430.5, 700.5, 70)]
+
+
+class StandInNetwork(torch.nn.Module):
+    """HerdNet-shaped outputs: heatmap = brightness above the ground, one class everywhere."""
+
+    def __init__(self):
+        super().__init__()
+        self.mean = torch.tensor(MEAN).view(1, -1, 1, 1)
+        self.std = torch.tensor(STD).view(1, -1, 1, 1)
+
+    def forward(self, x):
+        grey = ((x.float() * self.std + self.mean) * 255.0).mean(dim=1, keepdim=True)
+        heatmap = F.avg_pool2d(((grey - GROUND) / 205).clamp(0, 1), 2)
+        clsmap = torch.zeros(len(x), 3, x.shape[-2] // 32, x.shape[-1] // 32)
+        clsmap[:, 1] = 5
+        return (heatmap, clsmap), {}
+
+
+def _frame(width=864, height=864, sigma=3.0):
+    yy, xx = np.mgrid[0:height, 0:width]
+    grey = np.full((height, width), GROUND, dtype=np.float32)
+    for x, y, brightness in ANIMALS:
+        grey += brightness * np.exp(-((xx - x) ** 2 + (yy - y) ** 2) / (2 * sigma ** 2))
+    return Image.fromarray(np.repeat(grey.clip(0, 255).astype(np.uint8)[..., None], 3, axis=2))
+
+
+def _detect(image_dir, mode, threshold):
+    herdnet = {'model': StandInNetwork().eval(), 'mean': MEAN, 'std': STD, 'num_classes': 3}
+    stats = {}
+    detections = run_herdnet(herdnet, image_dir, ['frame.png'], mode=mode, header='[CHECK]',
+                             empty_tile_threshold=threshold, tile_stats=stats)
+    return len(detections), stats
+
+
+def run_checks():
+    """
+    Run each stitcher mode with and without the filter.
+
+    Returns:
+        List of (name, passed, detail); passed is None when the mode cannot run here
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as image_dir:
+        _frame().save(f"{image_dir}/frame.png")
+        for mode in ('streaming', 'full'):
+            try:
+                unfiltered, _ = _detect(image_dir, mode, 0)
+                filtered, stats = _detect(image_dir, mode, THRESHOLD)
+            except ImportError as e:
+                results.append((mode, None, f"not run ({e})"))
+                continue
+            passed = filtered == unfiltered == len(ANIMALS) and stats['skipped_tiles'] > 0
+            results.append((mode, passed, f"{unfiltered} animals unfiltered, {filtered} filtered "
+                                          f"({stats['skipped_tiles']}/{stats['total_tiles']} patches skipped)"))
+    return results
+
+
+def main():
+    results = run_checks()
+    print("\nEmpty-tile filter checks (synthetic frame):")
+    for name, passed, detail in results:
+        print(f"  {'⚠️ ' if passed is None else '✓' if passed else '❌'} {name:<12} {detail}")
+    raise SystemExit(0 if all(passed is not False for _, passed, _ in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
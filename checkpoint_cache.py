@@ -0,0 +1,205 @@
+"""
+Checkpoint Cache - Converts model checkpoints once into a memory-mappable file cached next to the original
+
+The converted file keeps only the weights and the model configuration, saved in torch's zip format
+so it can be loaded with torch.load(mmap=True). Weights are then backed by the page cache instead of
+anonymous memory: cold starts skip reading the whole file, and every worker process maps the same
+physical pages. A JSON manifest with SHA-256 checksums ties the cached file to its source checkpoint.
+
+Usage:
+    python checkpoint_cache.py [checkpoint.pth ...]
+"""
+
+import inspect
+import json
+import os
+import uuid
+from pathlib import Path
+
+import torch
+
+from model_loader import file_sha256
+
+# Checkpoint cache configuration (from environment variables or defaults)
+MODEL_MMAP = os.environ.get('MODEL_MMAP', 'true').lower() in ('true', '1', 'yes', 'on')
+# Hash the cached file on every load (otherwise only its size is checked)
+CHECKPOINT_VERIFY = os.environ.get('CHECKPOINT_VERIFY', 'false').lower() in ('true', '1', 'yes', 'on')
+
+CACHE_SUFFIX = '.mmap.pt'
+MANIFEST_SUFFIX = '.mmap.json'
+CACHE_FORMAT_VERSION = 1
+
+# Checkpoint entries kept in the cached file (optimizer state and the like are dropped)
+CHECKPOINT_KEYS = ('model_state_dict', 'classes', 'mean', 'std')
+
+# torch.load(mmap=True) and load_state_dict(assign=True) need torch >= 2.1
+MMAP_SUPPORTED = 'mmap' in inspect.signature(torch.load).parameters
+
+
+def cache_paths(path):
+    """Paths of the cached checkpoint and its manifest, next to the original."""
+    path = Path(path)
+    return path.with_suffix(CACHE_SUFFIX), path.with_suffix(MANIFEST_SUFFIX)
+
+
+def _atomic_write(path, write):
+    """Write a file through a temporary file renamed into place."""
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        write(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_manifest(manifest_path, manifest):
+    def write(temp_path):
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    _atomic_write(manifest_path, write)
+
+
+def _cache_is_valid(path, manifest_path, cache_path, channels_last=False):
+    """
+    Whether the cached file matches the source checkpoint (and the requested weight layout).
+
+    The source is identified by size and modification time; if those changed (e.g. the file was
+    downloaded again) its checksum is compared before discarding the cache.
+    """
+    manifest = _read_manifest(manifest_path)
+    if manifest is None or manifest.get('format_version') != CACHE_FORMAT_VERSION or not cache_path.exists():
+        return False
+    if manifest.get('channels_last', False) != channels_last:
+        return False
+
+    if cache_path.stat().st_size != manifest['size']:
+        return False
+    if CHECKPOINT_VERIFY and file_sha256(cache_path) != manifest['sha256']:
+        print(f"⚠️  Checksum mismatch in {cache_path}, converting again")
+        return False
+
+    stat = os.stat(path)
+    if stat.st_size == manifest['source_size'] and stat.st_mtime_ns == manifest['source_mtime_ns']:
+        return True
+    if stat.st_size != manifest['source_size'] or file_sha256(path) != manifest['source_sha256']:
+        return False
+
+    # Same content with a new timestamp: keep the cache
+    manifest['source_mtime_ns'] = stat.st_mtime_ns
+    _write_manifest(manifest_path, manifest)
+    return True
+
+
+def convert_checkpoint(path, channels_last=False):
+    """
+    Convert a checkpoint into the cached memory-mappable file and write its manifest.
+
+    Args:
+        path: Original checkpoint path
+        channels_last: Store 4D weights (convolutions) in channels_last, so a channels_last model
+                       can use the memory-mapped tensors without copying them
+
+    Returns:
+        Path of the cached file
+    """
+    path = Path(path)
+    cache_path, manifest_path = cache_paths(path)
+
+    print(f"⏳ Converting {path.name} to a memory-mappable checkpoint...")
+    checkpoint = torch.load(path, map_location='cpu')
+    converted = {key: checkpoint[key] for key in CHECKPOINT_KEYS if key in checkpoint}
+    # Contiguous tensors with their own storage, so each one maps to a single region of the file
+    converted['model_state_dict'] = {
+        name: tensor.detach().contiguous(
+            memory_format=torch.channels_last if channels_last and tensor.dim() == 4 else torch.contiguous_format
+        ).clone() for name, tensor in checkpoint['model_state_dict'].items()
+    }
+
+    _atomic_write(cache_path, lambda temp_path: torch.save(converted, temp_path))
+
+    stat = os.stat(path)
+    _write_manifest(manifest_path, {
+        'format_version': CACHE_FORMAT_VERSION,
+        'source': path.name,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': file_sha256(path),
+        'size': cache_path.stat().st_size,
+        'sha256': file_sha256(cache_path),
+        'channels_last': channels_last
+    })
+
+    print(f"✓ Cached {cache_path.name} ({cache_path.stat().st_size / 1024 / 1024:.1f} MB)")
+    return cache_path
+
+
+def ensure_cached_checkpoint(path, channels_last=False):
+    """Path of the cached file of a checkpoint, converting it first if it is missing or stale."""
+    cache_path, manifest_path = cache_paths(path)
+    if _cache_is_valid(path, manifest_path, cache_path, channels_last):
+        return cache_path
+    return convert_checkpoint(path, channels_last)
+
+
+def load_checkpoint(path, map_location='cpu', channels_last=False):
+    """
+    Load a checkpoint, memory-mapped from its cached file when possible.
+
+    Memory-mapped weights are CPU tensors backed by the page cache; load them into the model
+    with load_state_dict(..., assign=True) so the parameters keep pointing at the mapping.
+
+    Args:
+        path: Original checkpoint path
+        map_location: Device for a regular (not memory-mapped) load
+        channels_last: Layout of the 4D weights in the cached file (see convert_checkpoint)
+
+    Returns:
+        Tuple (checkpoint dictionary, whether it is memory-mapped)
+    """
+    if MODEL_MMAP and MMAP_SUPPORTED:
+        try:
+            cache_path = ensure_cached_checkpoint(path, channels_last)
+            return torch.load(cache_path, map_location='cpu', mmap=True, weights_only=True), True
+        except Exception as e:
+            print(f"⚠️  Could not memory-map {path}, loading it normally: {e}")
+    elif MODEL_MMAP:
+        print(f"⚠️  torch {torch.__version__} cannot memory-map checkpoints (requires 2.1+), loading normally")
+
+    return torch.load(path, map_location=map_location), False
+
+
+def main():
+    import argparse
+
+    from model_loader import model_file_path
+    from preprocessing import HERDNET_CHANNELS_LAST
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('checkpoints', nargs='*', default=[str(model_file_path('herdnet'))],
+                        help="Checkpoints to convert (default: the HerdNet checkpoint)")
+    parser.add_argument('--force', action='store_true', help="Convert even if the cache is up to date")
+    parser.add_argument('--channels-last', choices=('true', 'false'),
+                        default=str(HERDNET_CHANNELS_LAST).lower(),
+                        help="Store convolution weights in channels_last (default: HERDNET_CHANNELS_LAST)")
+    args = parser.parse_args()
+    channels_last = args.channels_last == 'true'
+
+    for path in args.checkpoints:
+        if args.force:
+            convert_checkpoint(path, channels_last)
+        else:
+            cache_path = ensure_cached_checkpoint(path, channels_last)
+            print(f"✓ {path} -> {cache_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,356 @@
 Database module for storing analysis tasks and results
 """
 
+import os
 import sqlite3
 import json
+import base64
+import threading
+import time
 import uuid
-from datetime import datetime
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 
+from result_store import put_blob, get_blob
+
 DB_PATH = Path(__file__).parent / "wildlife_detection.db"
 
+# Connection tuning (from environment variables or defaults)
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 30000))
+DB_CACHE_SIZE_KB = int(os.environ.get('DB_CACHE_SIZE_KB', 65536))
+DB_MMAP_SIZE = int(os.environ.get('DB_MMAP_SIZE', 268435456))
+DB_SYNCHRONOUS = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', 256))
 
-def get_connection():
-    """Get database connection."""
-    conn = sqlite3.connect(str(DB_PATH))
+# Store a full JSON copy of each detection in detections.detection_data (duplicates the columns)
+STORE_DETECTION_DATA = os.environ.get('STORE_DETECTION_DATA', 'false').lower() in ('true', '1', 'yes', 'on')
+
+# Results larger than this (serialized JSON bytes) go to the compressed sidecar store (see result_store.py)
+RESULT_INLINE_MAX_BYTES = int(os.environ.get('RESULT_INLINE_MAX_BYTES', 16384))
+
+# Pages returned to the filesystem per incremental vacuum transaction (see incremental_vacuum())
+VACUUM_STEP_PAGES = int(os.environ.get('VACUUM_STEP_PAGES', 2048))
+
+# One connection per thread (and per process, so forked gunicorn workers never share one)
+_local = threading.local()
+
+
+def _open_connection():
+    """Open a tuned connection to the database."""
+    conn = sqlite3.connect(
+        str(DB_PATH),
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        isolation_level=None,  # autocommit; writes use explicit transactions (see transaction())
+        cached_statements=DB_STATEMENT_CACHE_SIZE
+    )
     conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
     return conn
 
 
-def init_database():
-    """Initialize database tables."""
+def get_connection():
+    """Get the database connection of the current thread (opened on first use)."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid():
+        conn = _open_connection()
+        _local.conn = conn
+        _local.pid = os.getpid()
+    return conn
+
+
+def close_connection():
+    """Close the database connection of the current thread, if any."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+
+@contextmanager
+def transaction():
+    """
+    Write transaction on the current thread's connection.
+
+    Takes the write lock up front (BEGIN IMMEDIATE) so concurrent writers wait on
+    busy_timeout instead of failing with "database is locked". Nested calls join
+    the outer transaction.
+    """
+    conn = get_connection()
+    if conn.in_transaction:
+        yield conn
+        return
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+# ========================================
+# Statistics Rollups
+# ========================================
+# /database/stats reads these small tables instead of aggregating tasks and detections.
+# They are kept up to date inside the same transactions that write tasks and detections,
+# and can be rebuilt from scratch with: python database.py rebuild-stats
+
+# Days of daily activity returned by get_database_stats()
+STATS_DAILY_DAYS = int(os.environ.get('STATS_DAILY_DAYS', 30))
+
+
+def _create_stats_tables(conn):
+    """Create the rollup tables."""
+    # Counters per dimension: 'model_type', 'status' and 'species'
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            dimension TEXT NOT NULL,
+            key TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dimension, key)
+        ) WITHOUT ROWID
+    """)
+    # Tasks and detections per day (task creation date) and model
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats_daily (
+            day TEXT NOT NULL,
+            model_type TEXT NOT NULL,
+            tasks INTEGER NOT NULL DEFAULT 0,
+            detections INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, model_type)
+        ) WITHOUT ROWID
+    """)
+
+
+def _increment_counter(conn, dimension, key, amount=1):
+    """Add amount to a rollup counter."""
+    conn.execute("""
+        INSERT INTO stats_counters (dimension, key, count) VALUES (?, ?, ?)
+        ON CONFLICT (dimension, key) DO UPDATE SET count = count + excluded.count
+    """, (dimension, key, amount))
+
+
+def _increment_daily(conn, day, model_type, tasks=0, detections=0):
+    """Add tasks/detections to a daily rollup row."""
+    conn.execute("""
+        INSERT INTO stats_daily (day, model_type, tasks, detections) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, model_type) DO UPDATE SET
+            tasks = tasks + excluded.tasks,
+            detections = detections + excluded.detections
+    """, (day, model_type, tasks, detections))
+
+
+def _set_task_status(conn, task_id, new_status):
+    """Move a task between status counters. Returns False if the task does not exist."""
+    row = conn.execute("SELECT status FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+    if row is None:
+        return False
+    if row['status'] != new_status:
+        _increment_counter(conn, 'status', row['status'], -1)
+        _increment_counter(conn, 'status', new_status, 1)
+    return True
+
+
+def _rebuild_stats(conn):
+    """Recompute all rollup tables from the tasks and detections tables."""
+    _create_stats_tables(conn)
+    conn.execute("DELETE FROM stats_counters")
+    conn.execute("DELETE FROM stats_daily")
+    
+    conn.execute("""
+        INSERT INTO stats_counters (dimension, key, count)
+        SELECT 'model_type', model_type, COUNT(*) FROM tasks GROUP BY model_type
+    """)
+    conn.execute("""
+        INSERT INTO stats_counters (dimension, key, count)
+        SELECT 'status', status, COUNT(*) FROM tasks GROUP BY status
+    """)
+    conn.execute("""
+        INSERT INTO stats_counters (dimension, key, count)
+        SELECT 'species', species, COUNT(*) FROM detections GROUP BY species
+    """)
+    conn.execute("""
+        INSERT INTO stats_daily (day, model_type, tasks, detections)
+        SELECT substr(t.created_at, 1, 10), t.model_type, COUNT(*), COALESCE(SUM(d.count), 0)
+        FROM tasks t
+        LEFT JOIN (SELECT task_id, COUNT(*) AS count FROM detections GROUP BY task_id) d
+            ON d.task_id = t.task_id
+        GROUP BY substr(t.created_at, 1, 10), t.model_type
+    """)
+
+
+def rebuild_stats():
+    """Rebuild the statistics rollups (repair command)."""
+    start_time = time.perf_counter()
+    with transaction() as conn:
+        _rebuild_stats(conn)
+    print(f"✓ Statistics rollups rebuilt in {time.perf_counter() - start_time:.2f}s")
+
+
+# ========================================
+# Spatial Index
+# ========================================
+# detections_rtree indexes every detection's box (points are zero-size boxes) in pixel
+# coordinates, with the image as a third dimension so windows of different images never
+# overlap. save_detections indexes each bulk insert with one set-based statement (a per-row
+# insert trigger made bulk inserts several times slower); a delete trigger removes entries
+# of deleted detections.
+
+def _index_detections(conn, task_id=None, min_id=0):
+    """Add detections (optionally only those of a task with id > min_id) to the spatial index."""
+    where = "d.id > ? AND (d.x IS NOT NULL OR d.bbox_x1 IS NOT NULL)"
+    params = [min_id]
+    if task_id is not None:
+        where += " AND d.task_id = ?"
+        params.append(task_id)
+    
+    conn.execute(f"""
+        INSERT OR IGNORE INTO detection_images (task_id, image_name)
+        SELECT DISTINCT d.task_id, d.image_name FROM detections d WHERE {where}
+    """, params)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO detections_rtree (id, min_x, max_x, min_y, max_y, min_image, max_image)
+        SELECT d.id, COALESCE(d.bbox_x1, d.x), COALESCE(d.bbox_x2, d.x),
+               COALESCE(d.bbox_y1, d.y), COALESCE(d.bbox_y2, d.y), i.image_id, i.image_id
+        FROM detections d JOIN detection_images i ON i.task_id = d.task_id AND i.image_name = d.image_name
+        WHERE {where}
+    """, params)
+
+
+def _create_spatial_index(conn):
+    """Create the detection R*Tree, its image key table and delete trigger, then index all detections."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS detection_images (
+            image_id INTEGER PRIMARY KEY,
+            task_id TEXT NOT NULL,
+            image_name TEXT NOT NULL,
+            UNIQUE (task_id, image_name)
+        )
+    """)
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS detections_rtree USING rtree(
+            id, min_x, max_x, min_y, max_y, min_image, max_image
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS detections_rtree_delete AFTER DELETE ON detections
+        BEGIN
+            DELETE FROM detections_rtree WHERE id = OLD.id;
+        END
+    """)
+    
+    _index_detections(conn)
+
+
+# ========================================
+# Schema Migrations
+# ========================================
+# Each migration is (version, description, steps). Steps are SQL statements or
+# callables taking the connection. The applied version is tracked in PRAGMA user_version;
+# version 0 is the base schema created by init_database().
+MIGRATIONS = [
+    (1, 'Secondary indexes for task listing, result lookup and detection statistics', [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks (created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_model_type_created_at ON tasks (model_type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at ON tasks (status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_model_type_created_at ON tasks (status, model_type, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_task_results_task_id_created_at ON task_results (task_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_detections_task_id ON detections (task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_detections_species ON detections (species)",
+    ]),
+    (2, 'Statistics rollup tables for /database/stats', [
+        _rebuild_stats,
+    ]),
+    (3, 'Task listing indexes ending in (created_at, task_id) for keyset pagination', [
+        "DROP INDEX IF EXISTS idx_tasks_created_at",
+        "DROP INDEX IF EXISTS idx_tasks_model_type_created_at",
+        "DROP INDEX IF EXISTS idx_tasks_status_created_at",
+        "DROP INDEX IF EXISTS idx_tasks_status_model_type_created_at",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_created_at_task_id ON tasks (created_at, task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_model_type_created_at_task_id ON tasks (model_type, created_at, task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_created_at_task_id ON tasks (status, created_at, task_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_status_model_type_created_at_task_id "
+        "ON tasks (status, model_type, created_at, task_id)",
+    ]),
+    (4, 'Pointer and size columns for results stored in the compressed sidecar store', [
+        "ALTER TABLE task_results ADD COLUMN result_ref TEXT",
+        "ALTER TABLE task_results ADD COLUMN result_size INTEGER",
+        "ALTER TABLE task_results ADD COLUMN stored_size INTEGER",
+        "UPDATE task_results SET result_size = length(CAST(result_data AS BLOB)), "
+        "stored_size = length(CAST(result_data AS BLOB))",
+        "CREATE INDEX IF NOT EXISTS idx_task_results_result_ref ON task_results (result_ref)",
+    ]),
+    (5, 'Detection indexes for per-task filtering by species and image', [
+        # idx_detections_task_id already serves (task_id, id) ranges; these add the filtered variants
+        "CREATE INDEX IF NOT EXISTS idx_detections_task_id_species ON detections (task_id, species)",
+        "CREATE INDEX IF NOT EXISTS idx_detections_task_id_image_name ON detections (task_id, image_name)",
+    ]),
+    (6, 'R*Tree spatial index on detections for region queries', [
+        _create_spatial_index,
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version():
+    """Get the schema version applied to the database."""
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate_database(target_version=SCHEMA_VERSION):
+    """
+    Apply pending schema migrations up to target_version.
+    
+    Each migration runs in its own transaction together with the version bump,
+    so an interrupted migration is retried on the next start.
+    
+    Returns:
+        List of applied migration versions
+    """
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version > target_version or version <= get_schema_version():
+            continue
+        
+        start_time = time.perf_counter()
+        with transaction() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f"PRAGMA user_version = {version}")
+        
+        print(f"✓ Migration {version} applied in {time.perf_counter() - start_time:.2f}s: {description}")
+        applied.append(version)
+    
+    if applied:
+        # Refresh query planner statistics for the new indexes
+        get_connection().execute("PRAGMA optimize")
+    
+    return applied
+
+
+def init_database(apply_migrations=True):
+    """Initialize database tables and apply pending migrations."""
     conn = get_connection()
+    
+    # Lets incremental_vacuum() return freed pages without a blocking full VACUUM.
+    # Only takes effect on new databases; existing ones are converted by 'python database.py vacuum'
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    
+    # WAL lets readers (/tasks, /database/stats) run while inference results are written
+    conn.execute("PRAGMA journal_mode = WAL")
+    
     cursor = conn.cursor()
     
     # Tasks table
@@ -71,9 +402,10 @@ def init_database():
         )
     """)
     
-    conn.commit()
-    conn.close()
-    print(f"✓ Database initialized: {DB_PATH}")
+    if apply_migrations:
+        migrate_database()
+    
+    print(f"✓ Database initialized: {DB_PATH} (schema version {get_schema_version()})")
 
 
 def generate_task_id():
@@ -81,83 +413,201 @@ def generate_task_id():
     return str(uuid.uuid4())
 
 
+# Each write is split into prepare_*(), which does the serialization outside the write lock
+# and returns a write(conn) function, and a public wrapper running it in a transaction.
+# The persistence worker (persistence.py) runs several prepared writes in one transaction.
+
+def prepare_save_task(task_id, model_type, filename, num_images, processing_params):
+    """Prepare saving a new task."""
+    created_at = datetime.now().isoformat()
+    processing_params_json = json.dumps(processing_params)
+    
+    def write(conn):
+        conn.execute("""
+            INSERT INTO tasks (task_id, model_type, created_at, status, filename, num_images, processing_params)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (task_id, model_type, created_at, 'processing', filename, num_images, processing_params_json))
+        
+        _increment_counter(conn, 'model_type', model_type)
+        _increment_counter(conn, 'status', 'processing')
+        _increment_daily(conn, created_at[:10], model_type, tasks=1)
+    
+    return write
+
+
 def save_task(task_id, model_type, filename, num_images, processing_params):
     """Save new task."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    write = prepare_save_task(task_id, model_type, filename, num_images, processing_params)
+    with transaction() as conn:
+        write(conn)
+    return task_id
+
+
+def prepare_task_success(task_id, processing_time, total_detections, images_with_detections, species_counts,
+                         result_data):
+    """Prepare updating a task with success (serializes and stores the result)."""
+    species_counts_json = json.dumps(species_counts)
+    result_data_json, result_ref, result_size, stored_size = _store_result(result_data)
     
-    cursor.execute("""
-        INSERT INTO tasks (task_id, model_type, created_at, status, filename, num_images, processing_params)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (task_id, model_type, datetime.now().isoformat(), 'processing', filename, num_images, json.dumps(processing_params)))
+    def write(conn):
+        _set_task_status(conn, task_id, 'completed')
+        
+        conn.execute("""
+            UPDATE tasks SET status = 'completed', processing_time_seconds = ?,
+                   total_detections = ?, images_with_detections = ?, species_counts = ?
+            WHERE task_id = ?
+        """, (processing_time, total_detections, images_with_detections, species_counts_json, task_id))
+        
+        conn.execute("""
+            INSERT INTO task_results (task_id, result_data, created_at, result_ref, result_size, stored_size)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (task_id, result_data_json, datetime.now().isoformat(), result_ref, result_size, stored_size))
     
-    conn.commit()
-    conn.close()
-    return task_id
+    return write
 
 
 def update_task_success(task_id, processing_time, total_detections, images_with_detections, species_counts, result_data):
     """Update task with success."""
-    conn = get_connection()
-    cursor = conn.cursor()
+    # Serialize before taking the write lock so other writers are not kept waiting
+    write = prepare_task_success(task_id, processing_time, total_detections, images_with_detections,
+                                 species_counts, result_data)
+    with transaction() as conn:
+        write(conn)
+
+
+def _store_result(result_data):
+    """
+    Serialize a result and, if it is large, move it to the compressed sidecar store.
     
-    cursor.execute("""
-        UPDATE tasks SET status = 'completed', processing_time_seconds = ?,
-               total_detections = ?, images_with_detections = ?, species_counts = ?
-        WHERE task_id = ?
-    """, (processing_time, total_detections, images_with_detections, json.dumps(species_counts), task_id))
+    Returns:
+        Tuple (inline JSON or '' if stored in the sidecar, blob reference or None,
+               uncompressed size, stored size)
+    """
+    data = json.dumps(result_data).encode('utf-8')
+    if len(data) <= RESULT_INLINE_MAX_BYTES:
+        return data.decode('utf-8'), None, len(data), len(data)
     
-    cursor.execute("""
-        INSERT INTO task_results (task_id, result_data, created_at)
-        VALUES (?, ?, ?)
-    """, (task_id, json.dumps(result_data), datetime.now().isoformat()))
+    result_ref, stored_size = put_blob(data)
+    return '', result_ref, len(data), stored_size
+
+
+def _load_result(row):
+    """Decode the result of a task_results row (inline or from the sidecar store)."""
+    if row['result_ref']:
+        return json.loads(get_blob(row['result_ref']))
+    return json.loads(row['result_data'])
+
+
+def _yolo_detection_rows(task_id, detections, store_detection_data):
+    """Yield detections table rows for YOLO detections (bounding boxes)."""
+    for d in detections:
+        center = d.get('center', {})
+        bbox = d.get('bbox', {})
+        yield (task_id, d.get('image', ''), d.get('class_name', ''), d.get('confidence', 0.0),
+               center.get('x'), center.get('y'),
+               bbox.get('x1'), bbox.get('y1'), bbox.get('x2'), bbox.get('y2'),
+               json.dumps(d) if store_detection_data else None)
+
+
+def _herdnet_detection_rows(task_id, detections, store_detection_data):
+    """Yield detections table rows for HerdNet detections (points)."""
+    for d in detections:
+        yield (task_id, d.get('images', ''), d.get('species', ''), d.get('scores', 0.0),
+               d.get('x'), d.get('y'), None, None, None, None,
+               json.dumps(d) if store_detection_data else None)
+
+
+def prepare_save_detections(task_id, detections, model_type, store_detection_data=None):
+    """Prepare a bulk detection insert (rows are built before the write lock is taken)."""
+    if store_detection_data is None:
+        store_detection_data = STORE_DETECTION_DATA
+    
+    if model_type == 'yolo':
+        rows = list(_yolo_detection_rows(task_id, detections, store_detection_data))
+    else:
+        rows = list(_herdnet_detection_rows(task_id, detections, store_detection_data))
+    
+    species_key = 'class_name' if model_type == 'yolo' else 'species'
+    species_counts = Counter(d.get(species_key, '') for d in detections)
+    
+    def write(conn):
+        if not rows:
+            return
+        
+        # The write lock is held, so every id above this one belongs to this insert
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM detections").fetchone()[0]
+        
+        conn.executemany("""
+            INSERT INTO detections (task_id, image_name, species, confidence, x, y, bbox_x1, bbox_y1, bbox_x2, bbox_y2, detection_data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        
+        _index_detections(conn, task_id, min_id=last_id)
+        
+        for species, count in species_counts.items():
+            _increment_counter(conn, 'species', species, count)
+        
+        task_row = conn.execute("SELECT created_at, model_type FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        if task_row:
+            _increment_daily(conn, task_row['created_at'][:10], task_row['model_type'], detections=len(rows))
     
-    conn.commit()
-    conn.close()
+    return write
 
 
-def save_detections(task_id, detections, model_type):
-    """Save detections."""
-    conn = get_connection()
-    cursor = conn.cursor()
+def save_detections(task_id, detections, model_type, store_detection_data=None):
+    """
+    Save detections in bulk (one executemany in a single transaction).
     
-    for d in detections:
-        if model_type == 'yolo':
-            cursor.execute("""
-                INSERT INTO detections (task_id, image_name, species, confidence, x, y, bbox_x1, bbox_y1, bbox_x2, bbox_y2, detection_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (task_id, d.get('image', ''), d.get('class_name', ''), d.get('confidence', 0.0),
-                  d.get('center', {}).get('x'), d.get('center', {}).get('y'),
-                  d.get('bbox', {}).get('x1'), d.get('bbox', {}).get('y1'),
-                  d.get('bbox', {}).get('x2'), d.get('bbox', {}).get('y2'),
-                  json.dumps(d)))
-        else:
-            cursor.execute("""
-                INSERT INTO detections (task_id, image_name, species, confidence, x, y, detection_data)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (task_id, d.get('images', ''), d.get('species', ''), d.get('scores', 0.0),
-                  d.get('x'), d.get('y'), json.dumps(d)))
-    
-    conn.commit()
-    conn.close()
+    Args:
+        task_id: Task the detections belong to
+        detections: List of detection dicts as returned by the analysis endpoints
+        model_type: 'yolo' or 'herdnet'
+        store_detection_data: Also store a JSON copy of each detection
+            (defaults to the STORE_DETECTION_DATA environment variable)
+    """
+    if not detections:
+        return
+    
+    write = prepare_save_detections(task_id, detections, model_type, store_detection_data)
+    
+    start_time = time.perf_counter()
+    with transaction() as conn:
+        write(conn)
+    elapsed = time.perf_counter() - start_time
+    
+    print(f"✓ Saved {len(detections)} detections for task {task_id} in {elapsed * 1000:.1f} ms "
+          f"({len(detections) / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+def prepare_task_error(task_id, error_message):
+    """Prepare updating a task with error."""
+    def write(conn):
+        _set_task_status(conn, task_id, 'failed')
+        
+        conn.execute("""
+            UPDATE tasks SET status = 'failed', error_message = ?
+            WHERE task_id = ?
+        """, (error_message, task_id))
+    
+    return write
 
 
 def update_task_error(task_id, error_message):
     """Update task with error."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("""
-        UPDATE tasks SET status = 'failed', error_message = ?
-        WHERE task_id = ?
-    """, (error_message, task_id))
-    
-    conn.commit()
-    conn.close()
+    write = prepare_task_error(task_id, error_message)
+    with transaction() as conn:
+        write(conn)
 
 
-def get_task_by_id(task_id):
-    """Get task by ID."""
+def get_task_by_id(task_id, include_result=True):
+    """
+    Get task by ID.
+    
+    Args:
+        task_id: Task identifier
+        include_result: Load result_data (decompressed from the sidecar store if needed).
+            result_size is always returned
+    """
     conn = get_connection()
     cursor = conn.cursor()
     
@@ -165,7 +615,6 @@ def get_task_by_id(task_id):
     task_row = cursor.fetchone()
     
     if not task_row:
-        conn.close()
         return None
     
     task = dict(task_row)
@@ -174,25 +623,120 @@ def get_task_by_id(task_id):
     if task['species_counts']:
         task['species_counts'] = json.loads(task['species_counts'])
     
-    cursor.execute("""
-        SELECT result_data FROM task_results WHERE task_id = ?
+    # result_data is only read (and decompressed) when requested
+    columns = "result_ref, result_size, result_data" if include_result else "result_ref, result_size"
+    cursor.execute(f"""
+        SELECT {columns} FROM task_results WHERE task_id = ?
         ORDER BY created_at DESC LIMIT 1
     """, (task_id,))
     
     result_row = cursor.fetchone()
     if result_row:
-        task['result_data'] = json.loads(result_row['result_data'])
+        task['result_size'] = result_row['result_size']
+        if include_result:
+            task['result_data'] = _load_result(result_row)
     
-    conn.close()
     return task
 
 
-def get_all_tasks(model_type=None, status=None, limit=100, offset=0):
-    """Get all tasks with filtering."""
+def offload_results(batch_size=100):
+    """
+    Move large results still stored inline in the database to the compressed sidecar store.
+    
+    Rows are moved in small transactions so the API keeps serving while this runs. Run
+    VACUUM afterwards to return the freed pages to the filesystem.
+    
+    Returns:
+        Dictionary with the number of results moved and the inline bytes removed
+    """
     conn = get_connection()
-    cursor = conn.cursor()
+    moved, inline_bytes = 0, 0
+    last_id = 0
     
-    query = "SELECT * FROM tasks WHERE 1=1"
+    while True:
+        rows = conn.execute("""
+            SELECT id, result_data FROM task_results
+            WHERE id > ? AND result_ref IS NULL AND length(CAST(result_data AS BLOB)) > ?
+            ORDER BY id LIMIT ?
+        """, (last_id, RESULT_INLINE_MAX_BYTES, batch_size)).fetchall()
+        if not rows:
+            break
+        
+        # Compress outside the write lock
+        blobs = []
+        for row in rows:
+            data = row['result_data'].encode('utf-8')
+            result_ref, stored_size = put_blob(data)
+            blobs.append((result_ref, len(data), stored_size, row['id']))
+            inline_bytes += len(data)
+        
+        with transaction() as conn:
+            conn.executemany("""
+                UPDATE task_results SET result_data = '', result_ref = ?, result_size = ?, stored_size = ?
+                WHERE id = ?
+            """, blobs)
+        
+        moved += len(rows)
+        last_id = rows[-1]['id']
+    
+    print(f"✓ Moved {moved} results ({inline_bytes / 1024 / 1024:.1f} MB) to the sidecar store")
+    return {'moved': moved, 'inline_bytes': inline_bytes}
+
+
+# Columns of the tasks table that can be requested with fields=
+TASK_FIELDS = ('task_id', 'model_type', 'created_at', 'status', 'filename', 'num_images',
+               'processing_time_seconds', 'total_detections', 'images_with_detections',
+               'species_counts', 'processing_params', 'error_message')
+JSON_TASK_FIELDS = ('processing_params', 'species_counts')
+
+
+def parse_task_fields(fields):
+    """
+    Validate a task field projection.
+    
+    Args:
+        fields: Comma-separated string or list of field names (None/empty = all fields)
+    
+    Returns:
+        Tuple of field names
+    
+    Raises:
+        ValueError: If a field is unknown
+    """
+    if not fields:
+        return TASK_FIELDS
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in TASK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown task fields: {unknown}. Valid fields: {list(TASK_FIELDS)}")
+    return tuple(dict.fromkeys(fields))
+
+
+def encode_cursor(*key):
+    """Opaque pagination cursor for the position after the given sort key (e.g. created_at, task_id)."""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, key_length=2):
+    """Decode a pagination cursor into its sort key. Raises ValueError if it is malformed."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != key_length:
+        raise ValueError("Invalid cursor")
+    # Only plain values can reach the row-value comparison of the queries
+    if not all(isinstance(value, (str, int)) and not isinstance(value, bool) for value in key):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _tasks_query(model_type, status, fields):
+    """Build the task listing query (projection + filters) and its parameters."""
+    # created_at and task_id are always read: they define the sort order and the cursor
+    columns = dict.fromkeys(('created_at', 'task_id') + tuple(fields))
+    query = f"SELECT {', '.join(columns)} FROM tasks WHERE 1=1"
     params = []
     
     if model_type:
@@ -202,57 +746,441 @@ def get_all_tasks(model_type=None, status=None, limit=100, offset=0):
         query += " AND status = ?"
         params.append(status)
     
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+    return query, params
+
+
+def _task_from_row(row, fields):
+    """Convert a task row to a dict with the requested fields, decoding JSON columns."""
+    task = {field: row[field] for field in fields}
+    for field in JSON_TASK_FIELDS:
+        if task.get(field):
+            task[field] = json.loads(task[field])
+    return task
+
+
+def get_all_tasks(model_type=None, status=None, limit=100, offset=0, fields=None):
+    """Get all tasks with filtering (offset pagination)."""
+    fields = parse_task_fields(fields)
+    query, params = _tasks_query(model_type, status, fields)
+    
+    query += " ORDER BY created_at DESC, task_id DESC LIMIT ? OFFSET ?"
     params.extend([limit, offset])
     
-    cursor.execute(query, params)
-    rows = cursor.fetchall()
+    rows = get_connection().execute(query, params).fetchall()
+    return [_task_from_row(row, fields) for row in rows]
+
+
+def get_tasks_page(model_type=None, status=None, limit=100, cursor=None, fields=None):
+    """
+    Get one page of tasks with keyset pagination on (created_at, task_id).
+    
+    Every page costs the same index range scan no matter how deep it is.
+    
+    Args:
+        model_type: Filter by model type
+        status: Filter by status
+        limit: Page size
+        cursor: next_cursor returned by the previous page (None = first page)
+        fields: Field projection (see parse_task_fields)
+    
+    Returns:
+        Dictionary with 'tasks' and 'next_cursor' (None on the last page)
+    
+    Raises:
+        ValueError: If the cursor or fields are invalid
+    """
+    fields = parse_task_fields(fields)
+    query, params = _tasks_query(model_type, status, fields)
+    
+    if cursor:
+        query += " AND (created_at, task_id) < (?, ?)"
+        params.extend(decode_cursor(cursor))
+    
+    # Fetch one extra row to know whether there is a next page
+    query += " ORDER BY created_at DESC, task_id DESC LIMIT ?"
+    params.append(limit + 1)
+    
+    rows = get_connection().execute(query, params).fetchall()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['task_id'])
+    
+    return {
+        'tasks': [_task_from_row(row, fields) for row in rows],
+        'next_cursor': next_cursor
+    }
+
+
+# Columns returned for each detection by iter_task_detections
+DETECTION_FIELDS = ('id', 'image_name', 'species', 'confidence', 'x', 'y', 'bbox_x1', 'bbox_y1', 'bbox_x2', 'bbox_y2')
+
+
+def parse_region(region):
+    """
+    Parse a pixel window "x1,y1,x2,y2".
+    
+    Returns:
+        Tuple (x1, y1, x2, y2) with x1 <= x2 and y1 <= y2
+    
+    Raises:
+        ValueError: If the window is malformed
+    """
+    try:
+        x1, y1, x2, y2 = (float(v) for v in region.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError("region must be 'x1,y1,x2,y2' in pixels")
+    return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
+
+def _region_ids_query(task_id, image, region):
+    """Subquery (and parameters) selecting the ids of detections of an image intersecting a window."""
+    image_row = get_connection().execute(
+        "SELECT image_id FROM detection_images WHERE task_id = ? AND image_name = ?", (task_id, image)
+    ).fetchone()
+    image_id = image_row['image_id'] if image_row else -1
+    
+    x1, y1, x2, y2 = region
+    query = """
+        SELECT id FROM detections_rtree
+        WHERE min_image <= ? AND max_image >= ?
+          AND max_x >= ? AND min_x <= ? AND max_y >= ? AND min_y <= ?
+    """
+    return query, [image_id, image_id, x1, x2, y1, y2]
+
+
+def iter_task_detections(task_id, species=None, min_confidence=None, image=None, cursor=None, limit=1000,
+                         region=None):
+    """
+    Iterate over detections of a task in id order, straight from the detections table.
+    
+    Rows are fetched lazily so callers can stream large pages. To paginate, request
+    limit + 1 rows and pass encode_cursor(last_returned['id']) as the next cursor.
+    
+    Args:
+        task_id: Task identifier
+        species: Only detections of this species
+        min_confidence: Only detections with at least this confidence
+        image: Only detections of this image name
+        cursor: Cursor of the previous page (None = start)
+        limit: Maximum number of detections
+        region: Only detections whose box (or point) intersects this pixel window (x1, y1, x2, y2),
+            looked up in the R*Tree spatial index. Requires image
     
-    tasks = []
-    for row in rows:
-        task = dict(row)
-        if task['processing_params']:
-            task['processing_params'] = json.loads(task['processing_params'])
-        if task['species_counts']:
-            task['species_counts'] = json.loads(task['species_counts'])
-        tasks.append(task)
+    Returns:
+        Iterator of detection dicts (DETECTION_FIELDS)
     
-    conn.close()
-    return tasks
+    Raises:
+        ValueError: If the cursor is invalid or region is given without image
+    """
+    query = f"SELECT {', '.join(DETECTION_FIELDS)} FROM detections WHERE task_id = ?"
+    params = [task_id]
+    
+    if species:
+        query += " AND species = ?"
+        params.append(species)
+    if image:
+        query += " AND image_name = ?"
+        params.append(image)
+    if min_confidence is not None:
+        query += " AND confidence >= ?"
+        params.append(min_confidence)
+    if region is not None:
+        if not image:
+            raise ValueError("region requires image")
+        region_query, region_params = _region_ids_query(task_id, image, region)
+        query += f" AND id IN ({region_query})"
+        params.extend(region_params)
+        # The R*Tree stores rounded 32-bit coordinates; recheck the exact window
+        x1, y1, x2, y2 = region
+        query += (" AND COALESCE(bbox_x2, x) >= ? AND COALESCE(bbox_x1, x) <= ?"
+                  " AND COALESCE(bbox_y2, y) >= ? AND COALESCE(bbox_y1, y) <= ?")
+        params.extend([x1, x2, y1, y2])
+    if cursor:
+        query += " AND id > ?"
+        params.extend(decode_cursor(cursor, key_length=1))
+    
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit)
+    
+    # Executed here so an invalid query fails before the caller starts streaming
+    rows = get_connection().execute(query, params)
+    return (dict(row) for row in rows)
+
+
+# Columns of the cross-task detection export (see export_parquet.py)
+EXPORT_COLUMNS = ('task_id', 'model_type', 'task_created_at', 'filename', 'image_name', 'species', 'confidence',
+                  'x', 'y', 'bbox_x1', 'bbox_y1', 'bbox_x2', 'bbox_y2')
+
+
+def iter_detection_export_batches(start_date=None, end_date=None, model_type=None, species=None, batch_size=100000):
+    """
+    Iterate over detections across tasks in batches, for bulk export.
+    
+    Rows are ordered by (model_type, task created_at) so exports partitioned by model and
+    month receive each partition contiguously. Only one batch is held in memory at a time.
+    
+    Args:
+        start_date: First day to include ('YYYY-MM-DD', by task creation date)
+        end_date: Last day to include ('YYYY-MM-DD', inclusive)
+        model_type: Only detections of tasks of this model
+        species: Only these species (list of names)
+        batch_size: Rows per batch
+    
+    Yields:
+        Lists of row tuples with EXPORT_COLUMNS
+    
+    Raises:
+        ValueError: If a date is not in YYYY-MM-DD format
+    """
+    query = """
+        SELECT t.task_id, t.model_type, t.created_at, t.filename, d.image_name, d.species, d.confidence,
+               d.x, d.y, d.bbox_x1, d.bbox_y1, d.bbox_x2, d.bbox_y2
+        FROM tasks t CROSS JOIN detections d ON d.task_id = t.task_id
+        WHERE 1=1
+    """
+    params = []
+    
+    if start_date:
+        query += " AND t.created_at >= ?"
+        params.append(datetime.strptime(start_date, '%Y-%m-%d').date().isoformat())
+    if end_date:
+        query += " AND t.created_at < ?"
+        params.append((datetime.strptime(end_date, '%Y-%m-%d').date() + timedelta(days=1)).isoformat())
+    if model_type:
+        query += " AND t.model_type = ?"
+        params.append(model_type)
+    if species:
+        query += f" AND d.species IN ({', '.join('?' * len(species))})"
+        params.extend(species)
+    
+    # CROSS JOIN pins tasks as the outer loop, so rows come out in index order of
+    # idx_tasks_model_type_created_at_task_id and are never sorted in a temp b-tree
+    query += " ORDER BY t.model_type, t.created_at, t.task_id"
+    
+    # A dedicated cursor: the export can run for a long time next to other queries on this connection
+    cursor = get_connection().cursor()
+    cursor.execute(query, params)
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+    finally:
+        cursor.close()
 
 
 def get_database_stats():
-    """Get database statistics."""
+    """Get database statistics (read from the rollup tables, constant time)."""
     conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute("SELECT COUNT(*) as count FROM tasks")
-    total_tasks = cursor.fetchone()['count']
+    # Single read transaction so all counters come from the same snapshot
+    # (inside transaction(), the outer transaction already is one)
+    own_transaction = not conn.in_transaction
+    if own_transaction:
+        cursor.execute("BEGIN")
+    try:
+        cursor.execute("SELECT dimension, key, count FROM stats_counters WHERE count != 0 ORDER BY count DESC")
+        counters = {'model_type': {}, 'status': {}, 'species': {}}
+        for row in cursor.fetchall():
+            counters.setdefault(row['dimension'], {})[row['key']] = row['count']
+        
+        cursor.execute("""
+            SELECT day, SUM(tasks) AS tasks, SUM(detections) AS detections
+            FROM stats_daily GROUP BY day ORDER BY day DESC LIMIT ?
+        """, (STATS_DAILY_DAYS,))
+        daily_activity = [dict(row) for row in reversed(cursor.fetchall())]
+    finally:
+        if own_transaction:
+            cursor.execute("COMMIT")
+    
+    return {
+        'total_tasks': sum(counters['model_type'].values()),
+        'tasks_by_model': counters['model_type'],
+        'tasks_by_status': counters['status'],
+        'total_detections': sum(counters['species'].values()),
+        'species_distribution': counters['species'],
+        'daily_activity': daily_activity
+    }
+
+
+# ========================================
+# Retention
+# ========================================
+# Deletion and space reclamation primitives; the retention policy and archival live in retention.py
+
+def get_database_size():
+    """Size of the database and of its free pages, in bytes."""
+    conn = get_connection()
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {
+        'total_bytes': page_count * page_size,
+        'free_bytes': freelist_count * page_size,
+        'used_bytes': (page_count - freelist_count) * page_size
+    }
+
+
+def find_expired_tasks(created_before=None, statuses=('completed', 'failed'), limit=100):
+    """
+    Oldest tasks eligible for retention.
     
-    cursor.execute("SELECT model_type, COUNT(*) as count FROM tasks GROUP BY model_type")
-    tasks_by_model = {row['model_type']: row['count'] for row in cursor.fetchall()}
+    Args:
+        created_before: Only tasks created before this datetime (None = any age)
+        statuses: Only tasks with one of these statuses (tasks still processing are never expired)
+        limit: Maximum number of task ids
     
-    cursor.execute("SELECT status, COUNT(*) as count FROM tasks GROUP BY status")
-    tasks_by_status = {row['status']: row['count'] for row in cursor.fetchall()}
+    Returns:
+        List of task ids, oldest first
+    """
+    query = f"SELECT task_id FROM tasks WHERE status IN ({', '.join('?' * len(statuses))})"
+    params = list(statuses)
+    if created_before is not None:
+        query += " AND created_at < ?"
+        params.append(created_before.isoformat())
+    query += " ORDER BY created_at, task_id LIMIT ?"
+    params.append(limit)
+    return [row['task_id'] for row in get_connection().execute(query, params)]
+
+
+def delete_tasks(task_ids):
+    """
+    Delete tasks with their results, detections and spatial index entries, in one transaction.
     
-    cursor.execute("SELECT COUNT(*) as count FROM detections")
-    total_detections = cursor.fetchone()['count']
+    The statistics rollups are decremented so they keep matching the remaining rows.
     
-    cursor.execute("SELECT species, COUNT(*) as count FROM detections GROUP BY species ORDER BY count DESC")
-    species_distribution = {row['species']: row['count'] for row in cursor.fetchall()}
+    Returns:
+        Dictionary with the number of deleted tasks and detections, and the sidecar result
+        references no longer used by any task (to be deleted from the result store)
+    """
+    deleted_tasks, deleted_detections = 0, 0
+    result_refs = set()
     
-    conn.close()
+    with transaction() as conn:
+        for task_id in task_ids:
+            task_row = conn.execute(
+                "SELECT model_type, status, created_at FROM tasks WHERE task_id = ?", (task_id,)
+            ).fetchone()
+            if task_row is None:
+                continue
+            
+            detections = 0
+            for row in conn.execute(
+                "SELECT species, COUNT(*) AS count FROM detections WHERE task_id = ? GROUP BY species", (task_id,)
+            ).fetchall():
+                _increment_counter(conn, 'species', row['species'], -row['count'])
+                detections += row['count']
+            
+            day = task_row['created_at'][:10]
+            _increment_counter(conn, 'model_type', task_row['model_type'], -1)
+            _increment_counter(conn, 'status', task_row['status'], -1)
+            _increment_daily(conn, day, task_row['model_type'], tasks=-1, detections=-detections)
+            conn.execute("""
+                DELETE FROM stats_daily WHERE day = ? AND model_type = ? AND tasks <= 0 AND detections <= 0
+            """, (day, task_row['model_type']))
+            
+            result_refs.update(row['result_ref'] for row in conn.execute(
+                "SELECT result_ref FROM task_results WHERE task_id = ? AND result_ref IS NOT NULL", (task_id,)
+            ).fetchall())
+            
+            # detections_rtree entries are removed by the detections_rtree_delete trigger
+            conn.execute("DELETE FROM detections WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM detection_images WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM task_results WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            
+            deleted_tasks += 1
+            deleted_detections += detections
+        
+        # Results are content-addressed: keep blobs still referenced by other tasks
+        unreferenced_refs = [
+            ref for ref in result_refs
+            if conn.execute("SELECT 1 FROM task_results WHERE result_ref = ? LIMIT 1", (ref,)).fetchone() is None
+        ]
     
     return {
-        'total_tasks': total_tasks,
-        'tasks_by_model': tasks_by_model,
-        'tasks_by_status': tasks_by_status,
-        'total_detections': total_detections,
-        'species_distribution': species_distribution
+        'tasks': deleted_tasks,
+        'detections': deleted_detections,
+        'unreferenced_result_refs': unreferenced_refs
     }
 
 
+def incremental_vacuum(max_pages=None):
+    """
+    Return free pages to the filesystem in small steps (auto_vacuum=INCREMENTAL).
+    
+    Each step is a short write transaction of VACUUM_STEP_PAGES pages, so API writes
+    interleave with the vacuum instead of waiting for a full VACUUM.
+    
+    Args:
+        max_pages: Maximum number of pages to release (None = all free pages)
+    
+    Returns:
+        Bytes reclaimed
+    """
+    conn = get_connection()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        print("⚠️  auto_vacuum is not INCREMENTAL: run 'python database.py vacuum' once to enable it")
+        return 0
+    
+    size_before = get_database_size()['total_bytes']
+    remaining = max_pages
+    while remaining is None or remaining > 0:
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages == 0:
+            break
+        step = min(VACUUM_STEP_PAGES, free_pages, remaining if remaining is not None else free_pages)
+        with transaction() as conn:
+            conn.execute(f"PRAGMA incremental_vacuum({step})").fetchall()
+        if remaining is not None:
+            remaining -= step
+    
+    # Copy the vacuumed pages back into the database file so it is truncated on disk
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+    
+    return size_before - get_database_size()['total_bytes']
+
+
+def full_vacuum():
+    """
+    Rebuild the database with VACUUM, switching it to auto_vacuum=INCREMENTAL.
+    
+    Blocks all writers while it runs: meant as a one-time offline conversion of databases
+    created before incremental vacuum was enabled.
+    
+    Returns:
+        Bytes reclaimed
+    """
+    conn = get_connection()
+    size_before = get_database_size()['total_bytes']
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return size_before - get_database_size()['total_bytes']
+
+
 if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Wildlife detection database management")
+    parser.add_argument('command', nargs='?', default='init',
+                        choices=['init', 'rebuild-stats', 'offload-results', 'vacuum'],
+                        help="init: create tables and apply migrations | rebuild-stats: recompute statistics rollups | "
+                             "offload-results: move large inline results to the compressed sidecar store | "
+                             "vacuum: full VACUUM enabling incremental vacuum (blocks the API while it runs)")
+    args = parser.parse_args()
+    
     init_database()
+    if args.command == 'rebuild-stats':
+        rebuild_stats()
+    elif args.command == 'offload-results':
+        offload_results()
+    elif args.command == 'vacuum':
+        reclaimed = full_vacuum()
+        print(f"✓ VACUUM reclaimed {reclaimed / 1024 / 1024:.1f} MB (auto_vacuum=INCREMENTAL)")
     print("Database ready!")
 
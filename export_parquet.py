@@ -0,0 +1,231 @@
+"""
+Parquet Export - Streams detections across tasks from SQLite into compressed columnar Parquet files
+
+Rows are read from a database cursor one row group at a time, so memory stays bounded no matter
+how many detections are exported.
+
+Usage:
+    python export_parquet.py [output_dir] [--start-date 2024-01-01] [--end-date 2024-06-30]
+                             [--model-type herdnet] [--species elephant,buffalo]
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+from database import EXPORT_COLUMNS, iter_detection_export_batches
+
+# pyarrow is optional: only needed for exports
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Export configuration (from environment variables or defaults)
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', Path(__file__).parent / 'exports'))
+EXPORT_ROW_GROUP_SIZE = int(os.environ.get('EXPORT_ROW_GROUP_SIZE', 100000))
+EXPORT_COMPRESSION = os.environ.get('EXPORT_COMPRESSION', 'zstd')
+
+# Partition columns are encoded in the directory names (model_type=<model>/month=<YYYY-MM>)
+PARTITION_COLUMNS = ('model_type',)
+
+
+def parquet_available():
+    """Whether pyarrow is installed."""
+    return pa is not None
+
+
+def _schema(exclude=()):
+    """Arrow schema of the exported columns."""
+    types = {
+        'task_created_at': pa.timestamp('us'),
+        'confidence': pa.float64(),
+        'x': pa.float64(), 'y': pa.float64(),
+        'bbox_x1': pa.float64(), 'bbox_y1': pa.float64(), 'bbox_x2': pa.float64(), 'bbox_y2': pa.float64(),
+    }
+    return pa.schema([(name, types.get(name, pa.string())) for name in EXPORT_COLUMNS if name not in exclude])
+
+
+def _record_batch(rows, schema):
+    """Build a record batch from database row tuples (in EXPORT_COLUMNS order)."""
+    columns = dict(zip(EXPORT_COLUMNS, zip(*rows)))
+    arrays = []
+    for field in schema:
+        values = pa.array(columns[field.name], type=pa.string() if field.name == 'task_created_at' else field.type)
+        if field.name == 'task_created_at':
+            values = values.cast(field.type)
+        arrays.append(values)
+    return pa.record_batch(arrays, schema=schema)
+
+
+def parse_export_filters(args):
+    """
+    Parse export filters from request arguments or CLI options.
+
+    Args:
+        args: Mapping with optional start_date, end_date, model_type and species (comma-separated)
+
+    Returns:
+        Dictionary of keyword arguments for iter_detection_export_batches
+
+    Raises:
+        ValueError: If a date is not in YYYY-MM-DD format
+    """
+    filters = {}
+    for key in ('start_date', 'end_date'):
+        value = args.get(key)
+        if value:
+            try:
+                datetime.strptime(value, '%Y-%m-%d')
+            except ValueError:
+                raise ValueError(f"{key} must be a date in YYYY-MM-DD format")
+            filters[key] = value
+    if args.get('model_type'):
+        filters['model_type'] = args['model_type']
+    if args.get('species'):
+        filters['species'] = [s.strip() for s in args['species'].split(',') if s.strip()]
+    return filters
+
+
+def export_detections(output_dir, row_group_size=None, **filters):
+    """
+    Export detections to a Parquet dataset partitioned by model and month.
+
+    Files are written as <output_dir>/model_type=<model>/month=<YYYY-MM>/detections.parquet
+    (Hive partitioning, readable with pyarrow.dataset, pandas, DuckDB or Spark).
+
+    Args:
+        output_dir: Dataset directory
+        row_group_size: Rows per row group and per database fetch
+        **filters: start_date, end_date, model_type, species (see iter_detection_export_batches)
+
+    Returns:
+        Dictionary with the written files, total rows and total bytes
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+    row_group_size = row_group_size or EXPORT_ROW_GROUP_SIZE
+    output_dir = Path(output_dir)
+    schema = _schema(exclude=PARTITION_COLUMNS)
+    model_index = EXPORT_COLUMNS.index('model_type')
+    created_index = EXPORT_COLUMNS.index('task_created_at')
+
+    files, total_rows = [], 0
+    writer, partition = None, None
+    try:
+        for batch in iter_detection_export_batches(batch_size=row_group_size, **filters):
+            # Rows arrive ordered by (model_type, created_at): split the batch at partition changes
+            start = 0
+            while start < len(batch):
+                key = (batch[start][model_index], batch[start][created_index][:7])
+                end = start
+                while end < len(batch) and (batch[end][model_index], batch[end][created_index][:7]) == key:
+                    end += 1
+
+                if key != partition:
+                    if writer is not None:
+                        writer.close()
+                    partition = key
+                    path = output_dir / f"model_type={key[0]}" / f"month={key[1]}" / "detections.parquet"
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    writer = pq.ParquetWriter(str(path), schema, compression=EXPORT_COMPRESSION)
+                    files.append(path)
+
+                writer.write_batch(_record_batch(batch[start:end], schema), row_group_size=row_group_size)
+                total_rows += end - start
+                start = end
+    finally:
+        if writer is not None:
+            writer.close()
+
+    return {
+        'files': [str(path) for path in files],
+        'rows': total_rows,
+        'bytes': sum(path.stat().st_size for path in files)
+    }
+
+
+class _ChunkSink:
+    """Minimal writable file that hands out what has been written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_detections_parquet(row_group_size=None, **filters):
+    """
+    Stream detections as a single Parquet file, one row group at a time.
+
+    Args:
+        row_group_size: Rows per row group and per database fetch
+        **filters: start_date, end_date, model_type, species (see iter_detection_export_batches)
+
+    Yields:
+        Chunks of the Parquet file
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for Parquet export (pip install pyarrow)")
+
+    row_group_size = row_group_size or EXPORT_ROW_GROUP_SIZE
+    schema = _schema()
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=EXPORT_COMPRESSION)
+    try:
+        for batch in iter_detection_export_batches(batch_size=row_group_size, **filters):
+            writer.write_batch(_record_batch(batch, schema), row_group_size=row_group_size)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def main():
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('output_dir', nargs='?', help="Dataset directory (default: EXPORT_DIR/detections_<timestamp>)")
+    parser.add_argument('--start-date', help="First day to include (YYYY-MM-DD)")
+    parser.add_argument('--end-date', help="Last day to include (YYYY-MM-DD)")
+    parser.add_argument('--model-type', choices=['yolo', 'herdnet'])
+    parser.add_argument('--species', help="Comma-separated species to include")
+    parser.add_argument('--row-group-size', type=int, default=EXPORT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    filters = parse_export_filters(vars(args))
+    output_dir = args.output_dir or EXPORT_DIR / f"detections_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    start_time = time.perf_counter()
+    summary = export_detections(output_dir, row_group_size=args.row_group_size, **filters)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"✓ Exported {summary['rows']:,} detections to {len(summary['files'])} files in {output_dir} "
+          f"({summary['bytes'] / 1024 / 1024:.1f} MB, {elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+GeoTIFF Ingestion - Windowed reading of large GeoTIFF orthomosaics
+
+Drone surveys come as multi-GB tiled GeoTIFF orthomosaics, far larger than what Image.open can
+decode. RasterSource reads only the windows the stitchers ask for, through rasterio (GDAL): tiled
+and compressed files decode only the blocks a window touches, and uncompressed files are
+memory-mapped (GDAL's GTIFF_VIRTUAL_MEM_IO) instead of being read through the block cache. Plots
+and previews use a decimated read, served from the overviews when the file has them.
+
+Detections are mapped from frame pixels back to the raster's CRS and to WGS84 longitude/latitude.
+
+rasterio is optional: without it .tif/.tiff files are decoded whole with PIL like other images.
+"""
+
+import os
+
+import numpy as np
+import torch
+from PIL import Image
+
+# rasterio is optional: only needed for windowed GeoTIFF reading
+try:
+    import rasterio
+    from rasterio.enums import Resampling
+    from rasterio.warp import transform as warp_transform
+    from rasterio.windows import Window
+except ImportError:
+    rasterio = None
+
+GEOTIFF_EXTENSIONS = ('tif', 'tiff')
+
+# GeoTIFF configuration (from environment variables or defaults)
+# Memory-map uncompressed GeoTIFFs for windowed reads
+GEOTIFF_MMAP = os.environ.get('GEOTIFF_MMAP', 'true').lower() in ('true', '1', 'yes', 'on')
+# Longest side of the decimated image used for plots and previews of GeoTIFFs
+GEOTIFF_PREVIEW_SIZE = int(os.environ.get('GEOTIFF_PREVIEW_SIZE', 4096))
+
+
+def rasterio_available():
+    """Whether rasterio is installed."""
+    return rasterio is not None
+
+
+def is_geotiff(path):
+    """Whether a file is read with RasterSource (a .tif/.tiff file and rasterio installed)."""
+    return rasterio is not None and str(path).rsplit('.', 1)[-1].lower() in GEOTIFF_EXTENSIONS
+
+
+def _to_uint8(data):
+    """Bands of a raster window as uint8 (16-bit imagery is scaled, other types clipped)."""
+    if data.dtype == np.uint8:
+        return data
+    if data.dtype == np.uint16:
+        return (data // 257).astype(np.uint8)
+    return np.clip(data, 0, 255).astype(np.uint8)
+
+
+class RasterSource:
+    """
+    Frame of a GeoTIFF read window by window as uint8 CHW tensors.
+
+    Same interface as stitching.ImageSource (width, height, read, crop, preview, downsample, close).
+    The frame is the raster rotated by rotation x 90 degrees counter-clockwise, like the plots of the
+    API; geo_coordinates maps frame pixels back to the raster.
+    """
+
+    def __init__(self, path, rotation=0):
+        self.config = {'GTIFF_VIRTUAL_MEM_IO': 'YES'} if GEOTIFF_MMAP else {}
+        with rasterio.Env(**self.config):
+            self.dataset = rasterio.open(path)
+        self.rotation = rotation % 4
+        self.indexes = [1, 2, 3] if self.dataset.count >= 3 else [1]
+        self.source_width, self.source_height = self.dataset.width, self.dataset.height
+        if self.rotation % 2:
+            self.width, self.height = self.source_height, self.source_width
+        else:
+            self.width, self.height = self.source_width, self.source_height
+        self.memory_mapped = GEOTIFF_MMAP and self.dataset.compression is None
+
+    def to_source(self, x, y):
+        """Raster pixel coordinates of frame coordinates (inverse of the rotation)."""
+        w, h = self.source_width, self.source_height
+        if self.rotation == 1:
+            return w - y, x
+        if self.rotation == 2:
+            return w - x, h - y
+        if self.rotation == 3:
+            return y, h - x
+        return x, y
+
+    def read(self, x0, y0, x1, y1):
+        """Window of the frame; areas outside the raster are black."""
+        (ax, ay), (bx, by) = self.to_source(x0, y0), self.to_source(x1, y1)
+        left, top, right, bottom = min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)
+        out = np.zeros((len(self.indexes), bottom - top, right - left), dtype=np.uint8)
+
+        # Only the part of the window inside the raster is read
+        cl, ct = max(left, 0), max(top, 0)
+        cr, cb = min(right, self.source_width), min(bottom, self.source_height)
+        if cr > cl and cb > ct:
+            with rasterio.Env(**self.config):
+                data = self.dataset.read(self.indexes, window=Window(cl, ct, cr - cl, cb - ct))
+            out[:, ct - top:cb - top, cl - left:cr - left] = _to_uint8(data)
+
+        if len(self.indexes) == 1:
+            out = np.repeat(out, 3, axis=0)
+        if self.rotation:
+            out = np.ascontiguousarray(np.rot90(out, self.rotation, axes=(1, 2)))
+        return torch.from_numpy(out)
+
+    def crop(self, box):
+        """PIL image of a window of the frame."""
+        return Image.fromarray(self.read(*box).permute(1, 2, 0).numpy())
+
+    def preview(self, max_size=GEOTIFF_PREVIEW_SIZE):
+        """
+        Decimated image of the whole frame.
+
+        Returns:
+            Tuple (PIL image, scale from frame pixels to image pixels)
+        """
+        scale = min(1.0, max_size / max(self.source_width, self.source_height))
+        height = max(1, round(self.source_height * scale))
+        width = max(1, round(self.source_width * scale))
+        return self._decimated(height, width, Resampling.nearest), scale
+
+    def downsample(self, factor):
+        """PIL image of the frame reduced by an integer factor (block average, like Image.reduce)."""
+        height, width = -(-self.source_height // factor), -(-self.source_width // factor)
+        return self._decimated(height, width, Resampling.average)
+
+    def _decimated(self, height, width, resampling):
+        """Whole raster read at a lower resolution, as a PIL image of the frame."""
+        with rasterio.Env(**self.config):
+            data = self.dataset.read(self.indexes, out_shape=(len(self.indexes), height, width),
+                                     resampling=resampling)
+        data = _to_uint8(data)
+        if len(self.indexes) == 1:
+            data = np.repeat(data, 3, axis=0)
+        if self.rotation:
+            data = np.rot90(data, self.rotation, axes=(1, 2))
+        return Image.fromarray(np.ascontiguousarray(data.transpose(1, 2, 0)))
+
+    def geo_coordinates(self, xs, ys):
+        """
+        Map coordinates of frame points.
+
+        Returns:
+            List of dicts with x, y (raster CRS), crs, lon and lat per point, or None if the raster
+            is not georeferenced
+        """
+        if self.dataset.crs is None:
+            return None
+        sx, sy = self.to_source(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+        gx, gy = self.dataset.transform * (sx, sy)
+        gx, gy = np.atleast_1d(gx).tolist(), np.atleast_1d(gy).tolist()
+        if not gx:
+            return []
+        lon, lat = warp_transform(self.dataset.crs, 'EPSG:4326', gx, gy)
+        crs = self.dataset.crs.to_string()
+        return [{'x': x, 'y': y, 'crs': crs, 'lon': lo, 'lat': la} for x, y, lo, la in zip(gx, gy, lon, lat)]
+
+    def close(self):
+        self.dataset.close()
@@ -0,0 +1,128 @@
+"""
+Image Encoding - Encodes preview images (originals, annotated frames, plots and thumbnails) for API responses
+"""
+
+import io
+import os
+import base64
+
+from PIL import Image
+
+# Supported preview formats: request value -> (PIL format, MIME type)
+PREVIEW_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png')
+}
+
+# Defaults (from environment variables or defaults): fast, size-capped JPEG
+DEFAULT_PREVIEW_FORMAT = os.environ.get('PREVIEW_FORMAT', 'jpeg').strip().lower()
+DEFAULT_PREVIEW_QUALITY = int(os.environ.get('PREVIEW_QUALITY', 85))
+DEFAULT_PREVIEW_MAX_SIZE = int(os.environ.get('PREVIEW_MAX_SIZE', 1920))
+
+# Encoder speed settings (0 = fastest for both WebP method and PNG compression)
+WEBP_METHOD = int(os.environ.get('PREVIEW_WEBP_METHOD', 0))
+PNG_COMPRESS_LEVEL = int(os.environ.get('PREVIEW_PNG_COMPRESS_LEVEL', 1))
+
+
+def parse_preview_options(form):
+    """
+    Parse preview encoding options from request form data.
+
+    Args:
+        form: Request form (preview_format, preview_quality, preview_max_size)
+
+    Returns:
+        Dictionary with 'format', 'quality' and 'max_size' (0 = no size cap)
+
+    Raises:
+        ValueError: If any option is invalid
+    """
+    preview_format = form.get('preview_format', DEFAULT_PREVIEW_FORMAT).strip().lower()
+    if preview_format == 'jpg':
+        preview_format = 'jpeg'
+    if preview_format not in PREVIEW_FORMATS:
+        raise ValueError(f"preview_format must be one of {sorted(PREVIEW_FORMATS)}")
+
+    preview_quality = int(form.get('preview_quality', DEFAULT_PREVIEW_QUALITY))
+    if not 1 <= preview_quality <= 100:
+        raise ValueError("preview_quality must be between 1 and 100")
+
+    preview_max_size = int(form.get('preview_max_size', DEFAULT_PREVIEW_MAX_SIZE))
+    if preview_max_size < 0:
+        raise ValueError("preview_max_size must be 0 (no limit) or a positive number of pixels")
+
+    return {
+        'format': preview_format,
+        'quality': preview_quality,
+        'max_size': preview_max_size
+    }
+
+
+def default_preview_options():
+    """Preview options used when the caller does not provide any."""
+    return parse_preview_options({})
+
+
+def resize_for_preview(img, max_size):
+    """Downscale an image so its longest side is at most max_size (0 = keep size)."""
+    if not max_size or max(img.width, img.height) <= max_size:
+        return img
+
+    ratio = max_size / max(img.width, img.height)
+    new_size = (max(1, int(img.width * ratio)), max(1, int(img.height * ratio)))
+    # reducing_gap lets PIL do a cheap integer reduce before the final LANCZOS pass
+    return img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+
+def encode_image(img, preview_options=None):
+    """
+    Encode an image (PIL Image or RGB numpy array) with the given preview options.
+
+    Args:
+        img: PIL Image or HxWxC uint8 numpy array (RGB)
+        preview_options: Dictionary from parse_preview_options (defaults if None)
+
+    Returns:
+        Tuple (encoded bytes, encoded PIL size as (width, height))
+    """
+    if preview_options is None:
+        preview_options = default_preview_options()
+
+    if not isinstance(img, Image.Image):
+        img = Image.fromarray(img)
+
+    img = resize_for_preview(img, preview_options['max_size'])
+    pil_format, _ = PREVIEW_FORMATS[preview_options['format']]
+
+    buffered = io.BytesIO()
+    if pil_format == 'JPEG':
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(buffered, format='JPEG', quality=preview_options['quality'])
+    elif pil_format == 'WEBP':
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() else 'RGB')
+        img.save(buffered, format='WEBP', quality=preview_options['quality'], method=WEBP_METHOD)
+    else:
+        img.save(buffered, format='PNG', compress_level=PNG_COMPRESS_LEVEL)
+
+    return buffered.getvalue(), img.size
+
+
+def encode_image_base64(img, preview_options=None):
+    """
+    Encode an image as a base64 string with the given preview options.
+
+    Returns:
+        Tuple (base64 string, encoded size as (width, height))
+    """
+    data, size = encode_image(img, preview_options)
+    return base64.b64encode(data).decode('utf-8'), size
+
+
+def preview_mime_type(preview_options):
+    """MIME type of images encoded with the given preview options."""
+    if preview_options is None:
+        preview_options = default_preview_options()
+    return PREVIEW_FORMATS[preview_options['format']][1]
@@ -1,13 +1,56 @@
 """
-Model Loader - Downloads models from Google Drive if not present locally
+Model Loader - Fetches model weights into a local cache directory if not present
+
+Files are fetched in parallel, only when missing or invalid. Each file is downloaded to a
+.part file with HTTP range requests, so an interrupted download resumes where it stopped,
+and it is only moved into place after its size and SHA-256 match the manifest. The cache
+directory can be shared by several containers: a lock file makes sure only one of them
+downloads each file.
+
+Sources, in order of preference:
+    1. The file's "url" in the manifest (MODEL_MANIFEST)
+    2. MODEL_BASE_URL/<filename> (e.g. an internal mirror or bucket)
+    3. The Google Drive folder GDRIVE_FOLDER_ID (downloaded once for all missing files)
+
+Manifest format (JSON, keyed by filename):
+    {"best.pt": {"url": "https://...", "sha256": "<hex digest>", "size": 5457012}}
+
+Usage:
+    python model_loader.py [yolo] [herdnet]
+    python model_loader.py --write-manifest model_manifest.json
 """
 
+import hashlib
+import json
 import os
-import gdown
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: downloads are not coordinated across processes sharing the cache
+    fcntl = None
 
 # Google Drive folder ID (from environment variable or default)
 GDRIVE_FOLDER_ID = os.environ.get('GDRIVE_FOLDER_ID', '1BMy6W7_3JhSA6uSEzze48ZR22qJv4s2R')
 
+# Model cache configuration (from environment variables or defaults)
+MODEL_CACHE_DIR = Path(os.environ.get('MODEL_CACHE_DIR', Path(__file__).parent))
+MODEL_MANIFEST = os.environ.get('MODEL_MANIFEST', str(Path(__file__).parent / 'model_manifest.json'))
+MODEL_BASE_URL = os.environ.get('MODEL_BASE_URL', '')
+MODEL_DOWNLOAD_WORKERS = int(os.environ.get('MODEL_DOWNLOAD_WORKERS', 4))
+MODEL_DOWNLOAD_RETRIES = int(os.environ.get('MODEL_DOWNLOAD_RETRIES', 3))
+MODEL_DOWNLOAD_TIMEOUT = float(os.environ.get('MODEL_DOWNLOAD_TIMEOUT', 60))
+MODEL_DOWNLOAD_CHUNK_SIZE = int(os.environ.get('MODEL_DOWNLOAD_CHUNK_SIZE', 1024 * 1024))
+
 # Model configurations (filenames from environment variables or defaults)
 MODELS = {
     'yolo': {
@@ -21,58 +64,361 @@ MODELS = {
 }
 
 
-def download_model(model_name):
-    """Download a model from Google Drive if it doesn't exist."""
-    if model_name not in MODELS:
-        return False
-    
-    config = MODELS[model_name]
-    filename = config['filename']
-    
-    # Check if already exists
-    if os.path.exists(filename):
-        size_mb = os.path.getsize(filename) / (1024 * 1024)
-        print(f"✓ {config['description']} already exists: {filename} ({size_mb:.1f} MB)")
-        return True
-    
-    print(f"\n📥 Downloading {config['description']} from Google Drive...")
-    print(f"   File: {filename}")
-    
+class ChecksumError(Exception):
+    """Raised when a downloaded file does not match its expected size or SHA-256."""
+
+
+def model_file_path(model_name):
+    """Local path of a model's weights file in the cache directory."""
+    return MODEL_CACHE_DIR / MODELS[model_name]['filename']
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_manifest(source=None):
+    """
+    Load the model manifest from a path or an http(s) URL.
+
+    Returns:
+        Dictionary filename -> {'url', 'sha256', 'size'} (empty if there is no manifest)
+    """
+    source = MODEL_MANIFEST if source is None else source
+    if not source:
+        return {}
+    if source.startswith(('http://', 'https://')):
+        response = requests.get(source, timeout=MODEL_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
     try:
-        # Download folder and extract file
-        folder_url = f"https://drive.google.com/drive/folders/{GDRIVE_FOLDER_ID}"
-        gdown.download_folder(url=folder_url, output=".", quiet=False, use_cookies=False)
-        
-        if os.path.exists(filename):
-            size_mb = os.path.getsize(filename) / (1024 * 1024)
-            print(f"✅ Downloaded {filename} ({size_mb:.1f} MB)")
+        with open(source) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared by every process (and container) using the cache directory (none without fcntl)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(path.with_name(f".{path.name}.lock"), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _checksum_path(path):
+    return path.with_name(f".{path.name}.sha256")
+
+
+def _is_complete_archive(path):
+    """
+    Whether a file is not a truncated zip archive.
+
+    torch.save (and so YOLOv11 and HerdNet checkpoints) writes zip archives, whose directory is at
+    the end of the file: an interrupted download starts like an archive but has no end record.
+    Files that are not zip archives (e.g. legacy pickle checkpoints) are not checked.
+    """
+    with open(path, 'rb') as f:
+        if f.read(4) != b'PK\x03\x04':
             return True
-        else:
-            print(f"❌ Failed to download {filename}")
-            return False
-    except Exception as e:
-        print(f"❌ Error downloading {filename}: {str(e)}")
+    return zipfile.is_zipfile(path)
+
+
+def verify_file(path, entry):
+    """
+    Check a file against its manifest entry (size and SHA-256).
+
+    Without a SHA-256 in the entry, only truncated checkpoint archives are detected.
+
+    The digest of a verified file is remembered in a .<filename>.sha256 sidecar, so an
+    unchanged file is not hashed again on every start.
+    """
+    if not path.exists():
+        return False
+    stat = path.stat()
+    if entry.get('size') is not None and stat.st_size != entry['size']:
+        return False
+    if not entry.get('sha256'):
+        return _is_complete_archive(path)
+
+    checksum_path = _checksum_path(path)
+    try:
+        if checksum_path.stat().st_mtime_ns >= stat.st_mtime_ns:
+            if checksum_path.read_text().strip() == entry['sha256']:
+                return True
+    except FileNotFoundError:
+        pass
+
+    if file_sha256(path) != entry['sha256']:
         return False
+    checksum_path.write_text(entry['sha256'])
+    return True
+
+
+def _check_download(path, entry):
+    """Raise ChecksumError if a downloaded file does not match its manifest entry."""
+    size = path.stat().st_size
+    if entry.get('size') is not None and size != entry['size']:
+        raise ChecksumError(f"{path.name}: expected {entry['size']} bytes, got {size}")
+    if entry.get('sha256'):
+        digest = file_sha256(path)
+        if digest != entry['sha256']:
+            raise ChecksumError(f"{path.name}: SHA-256 mismatch (expected {entry['sha256']}, got {digest})")
+    elif not _is_complete_archive(path):
+        raise ChecksumError(f"{path.name}: truncated checkpoint archive")
+
+
+def _download_range(url, part_path):
+    """
+    Download a URL into a .part file, resuming from its current size with a range request.
+
+    Returns:
+        Number of bytes received
+    """
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+
+    with requests.get(url, headers=headers, stream=True, timeout=MODEL_DOWNLOAD_TIMEOUT) as response:
+        if response.status_code == 416:
+            # Range not satisfiable: the .part file is already complete
+            return 0
+        response.raise_for_status()
+        if offset and response.status_code != 206:
+            # Server ignored the range: start over
+            offset = 0
+        received = 0
+        with open(part_path, 'ab' if offset else 'wb') as f:
+            for chunk in response.iter_content(chunk_size=MODEL_DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+                received += len(chunk)
+    return received
+
+
+def fetch_file(filename, entry, cache_dir=None):
+    """
+    Make sure a file is in the cache directory and matches its manifest entry.
+
+    Args:
+        filename: File name in the cache directory
+        entry: Manifest entry with 'url' and optional 'sha256' and 'size'
+        cache_dir: Cache directory (default MODEL_CACHE_DIR)
+
+    Returns:
+        Path of the verified file
 
+    Raises:
+        ChecksumError: If the downloaded file does not match the manifest
+        requests.RequestException: If the download keeps failing after the retries
+    """
+    path = Path(cache_dir or MODEL_CACHE_DIR) / filename
+    if verify_file(path, entry):
+        return path
+
+    with _file_lock(path):
+        # Another process may have fetched it while we waited for the lock
+        if verify_file(path, entry):
+            return path
+
+        part_path = path.with_name(f"{path.name}.part")
+        resumed = part_path.exists()
+        print(f"📥 {'Resuming' if resumed else 'Downloading'} {filename} from {entry['url']}")
+        start_time = time.perf_counter()
+
+        while True:
+            for attempt in range(1, MODEL_DOWNLOAD_RETRIES + 1):
+                try:
+                    _download_range(entry['url'], part_path)
+                    break
+                except requests.RequestException as e:
+                    if attempt == MODEL_DOWNLOAD_RETRIES:
+                        raise
+                    print(f"⚠️  Download of {filename} interrupted ({e}), resuming (attempt {attempt + 1})")
+                    time.sleep(min(2 ** attempt, 30))
+
+            try:
+                _check_download(part_path, entry)
+                break
+            except ChecksumError as e:
+                part_path.unlink()
+                if not resumed:
+                    raise
+                # The .part file left by an earlier run may belong to another version of the file
+                print(f"⚠️  {e}, downloading again from scratch")
+                resumed = False
+
+        os.replace(part_path, path)
+        if entry.get('sha256'):
+            _checksum_path(path).write_text(entry['sha256'])
+
+        size_mb = path.stat().st_size / (1024 * 1024)
+        print(f"✅ Downloaded {filename} ({size_mb:.1f} MB in {time.perf_counter() - start_time:.1f}s)")
+        return path
+
+
+def _fetch_from_gdrive(filenames, manifest):
+    """
+    Download the Google Drive folder once and move the requested files into the cache.
+
+    Returns:
+        Dictionary filename -> True/False
+    """
+    import gdown
+
+    status = {}
+    MODEL_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with _file_lock(MODEL_CACHE_DIR / 'gdrive'):
+        missing = [f for f in filenames if not verify_file(MODEL_CACHE_DIR / f, manifest.get(f, {}))]
+        status.update({f: True for f in filenames if f not in missing})
+        if not missing:
+            return status
+
+        print(f"\n📥 Downloading {', '.join(missing)} from Google Drive...")
+        with tempfile.TemporaryDirectory(dir=MODEL_CACHE_DIR) as temp_dir:
+            folder_url = f"https://drive.google.com/drive/folders/{GDRIVE_FOLDER_ID}"
+            try:
+                gdown.download_folder(url=folder_url, output=temp_dir, quiet=False, use_cookies=False)
+            except Exception as e:
+                print(f"❌ Error downloading from Google Drive: {str(e)}")
+
+            for filename in missing:
+                downloaded = next(Path(temp_dir).rglob(filename), None)
+                if downloaded is None:
+                    print(f"❌ Failed to download {filename}")
+                    status[filename] = False
+                    continue
+                try:
+                    _check_download(downloaded, manifest.get(filename, {}))
+                except ChecksumError as e:
+                    print(f"❌ {e}")
+                    status[filename] = False
+                    continue
+                shutil.move(str(downloaded), MODEL_CACHE_DIR / filename)
+                size_mb = (MODEL_CACHE_DIR / filename).stat().st_size / (1024 * 1024)
+                print(f"✅ Downloaded {filename} ({size_mb:.1f} MB)")
+                status[filename] = True
+    return status
+
+
+def ensure_models(model_names=None, manifest=None):
+    """
+    Ensure models are available in the cache directory, fetching the missing ones in parallel.
+
+    Args:
+        model_names: Models to fetch (default: all)
+        manifest: Manifest dictionary (default: loaded from MODEL_MANIFEST)
+
+    Returns:
+        Dictionary model name -> True if its file is available
+    """
+    model_names = list(MODELS) if model_names is None else list(model_names)
+    manifest = load_manifest() if manifest is None else manifest
 
-def ensure_models():
-    """Ensure all models are available."""
     print("\n" + "="*60)
-    print("🔍 Checking model files...")
+    print(f"🔍 Checking model files in {MODEL_CACHE_DIR}...")
     print("="*60)
-    
-    status = {}
-    for model_name in ['yolo', 'herdnet']:
-        status[model_name] = download_model(model_name)
-    
+
+    status, to_fetch, from_gdrive = {}, {}, []
+    for model_name in model_names:
+        config = MODELS[model_name]
+        filename = config['filename']
+        entry = dict(manifest.get(filename, {}))
+        path = MODEL_CACHE_DIR / filename
+        if not entry.get('sha256'):
+            print(f"⚠️  No SHA-256 for {filename} in the manifest ({MODEL_MANIFEST or 'none'}): only truncated "
+                  f"downloads are detected (create it with: python model_loader.py --write-manifest PATH)")
+
+        if verify_file(path, entry):
+            size_mb = path.stat().st_size / (1024 * 1024)
+            print(f"✓ {config['description']} already exists: {filename} ({size_mb:.1f} MB)")
+            status[model_name] = True
+        elif entry.get('url') or MODEL_BASE_URL:
+            entry.setdefault('url', f"{MODEL_BASE_URL.rstrip('/')}/{filename}")
+            to_fetch[model_name] = entry
+        else:
+            from_gdrive.append(model_name)
+
+    def fetch(model_name):
+        try:
+            fetch_file(MODELS[model_name]['filename'], to_fetch[model_name])
+            return True
+        except Exception as e:
+            print(f"❌ Error downloading {MODELS[model_name]['filename']}: {str(e)}")
+            return False
+
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=max(1, MODEL_DOWNLOAD_WORKERS)) as executor:
+            status.update(zip(to_fetch, executor.map(fetch, to_fetch)))
+
+    if from_gdrive:
+        gdrive_status = _fetch_from_gdrive([MODELS[m]['filename'] for m in from_gdrive], manifest)
+        status.update({m: gdrive_status[MODELS[m]['filename']] for m in from_gdrive})
+
     print("\n" + "="*60)
-    print(f"YOLOv11:  {'✓' if status['yolo'] else '✗'}")
-    print(f"HerdNet:  {'✓' if status['herdnet'] else '✗'}")
+    for model_name in model_names:
+        print(f"{MODELS[model_name]['description']}:  {'✓' if status[model_name] else '✗'}")
     print("="*60 + "\n")
-    
+
     return status
 
 
-if __name__ == "__main__":
-    ensure_models()
+def download_model(model_name):
+    """Download a model if it is not in the cache directory. Returns True if it is available."""
+    if model_name not in MODELS:
+        return False
+    return ensure_models([model_name])[model_name]
 
+
+def write_manifest(path, base_url=''):
+    """Write a manifest with the size and SHA-256 of the model files in the cache directory."""
+    manifest = {}
+    for model_name in MODELS:
+        filename = MODELS[model_name]['filename']
+        file_path = MODEL_CACHE_DIR / filename
+        if not file_path.exists():
+            print(f"⚠️  {filename} not found in {MODEL_CACHE_DIR}, skipped")
+            continue
+        manifest[filename] = {'sha256': file_sha256(file_path), 'size': file_path.stat().st_size}
+        if base_url:
+            manifest[filename]['url'] = f"{base_url.rstrip('/')}/{filename}"
+
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✓ Wrote manifest for {len(manifest)} files to {path}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='*', help=f"Models to fetch: {', '.join(MODELS)} (default: all)")
+    parser.add_argument('--write-manifest', metavar='PATH',
+                        help="Write a manifest of the local model files instead of fetching")
+    parser.add_argument('--base-url', default=MODEL_BASE_URL, help="Base URL recorded in the written manifest")
+    args = parser.parse_args()
+
+    unknown = [m for m in args.models if m not in MODELS]
+    if unknown:
+        parser.error(f"unknown models: {', '.join(unknown)}")
+
+    if args.write_manifest:
+        write_manifest(args.write_manifest, args.base_url)
+        return
+
+    status = ensure_models(args.models or None)
+    raise SystemExit(0 if all(status.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Model Registry - Loads detection models on first use (or eagerly at startup) and tracks their readiness
+
+Only the models listed in ENABLED_MODELS are served by this process, so nodes can be dedicated
+to YOLOv11 or HerdNet and never pay the startup time or memory of the other model. Model
+libraries (animaloc, ultralytics) are imported only when their model is loaded.
+"""
+
+import os
+import threading
+import time
+
+import torch
+
+from checkpoint_cache import load_checkpoint
+from model_loader import MODELS, download_model, ensure_models, model_file_path
+from model_warmup import prepare_model
+from onnx_backend import apply_backend
+from precision import MODEL_PRECISION, PRECISIONS, add_bf16_variant
+from preprocessing import HERDNET_CHANNELS_LAST, to_channels_last
+from quantization import QUANTIZED_DEFAULT, load_quantized
+
+# Model registry configuration (from environment variables or defaults)
+ENABLED_MODELS = tuple(
+    m.strip().lower() for m in os.environ.get('ENABLED_MODELS', 'yolo,herdnet').split(',') if m.strip()
+)
+# Load enabled models in a background thread at startup (false = load on first request)
+MODEL_PRELOAD = os.environ.get('MODEL_PRELOAD', 'true').lower() in ('true', '1', 'yes', 'on')
+
+# Model status, as reported by /health
+STATUS_DISABLED = 'disabled'
+STATUS_NOT_LOADED = 'not_loaded'
+STATUS_LOADING = 'loading'
+STATUS_WARMING_UP = 'warming_up'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# Default HerdNet configuration, used when the checkpoint does not include it
+DEFAULT_HERDNET_CLASSES = {
+    1: 'buffalo', 2: 'elephant', 3: 'kob',
+    4: 'topi', 5: 'warthog', 6: 'waterbuck'
+}
+DEFAULT_IMG_MEAN = [0.485, 0.456, 0.406]
+DEFAULT_IMG_STD = [0.229, 0.224, 0.225]
+
+
+class ModelUnavailableError(Exception):
+    """Raised when a model is disabled on this server or could not be loaded."""
+
+    def __init__(self, name, status, message):
+        super().__init__(message)
+        self.name = name
+        self.status = status
+
+
+def _load_herdnet():
+    """Build HerdNet from its checkpoint."""
+    from animaloc.models import HerdNet, LossWrapper
+
+    path = model_file_path('herdnet')
+    print(f"Loading HerdNet checkpoint from {path}...")
+    checkpoint, mmapped = load_checkpoint(path, map_location=device, channels_last=HERDNET_CHANNELS_LAST)
+
+    # Extract model configuration from checkpoint
+    classes = checkpoint.get('classes', DEFAULT_HERDNET_CLASSES)
+    num_classes = len(classes) + 1  # +1 for background
+
+    net = HerdNet(num_classes=num_classes, pretrained=False)
+    net = LossWrapper(net, [])
+    # Memory-mapped weights are assigned, not copied, so they stay shared in the page cache
+    net.load_state_dict(checkpoint['model_state_dict'], assign=mmapped)
+    # The cached checkpoint already stores channels_last weights, so on CPU they stay memory-mapped
+    net = to_channels_last(net.to(device))
+    net.eval()
+
+    animal_classes = {0: "no_animal"}
+    animal_classes.update(classes)
+
+    return {
+        'model': net,
+        'classes': classes,
+        'animal_classes': animal_classes,
+        'num_classes': num_classes,
+        'mean': checkpoint.get('mean', DEFAULT_IMG_MEAN),
+        'std': checkpoint.get('std', DEFAULT_IMG_STD),
+        'mmap': mmapped
+    }
+
+
+def _load_yolo():
+    """Load the YOLOv11 model."""
+    from ultralytics import YOLO
+
+    path = model_file_path('yolo')
+    print(f"Loading YOLOv11 model from {path}...")
+    yolo = YOLO(str(path))
+    yolo.to(device)
+
+    return {
+        'model': yolo,
+        'classes': yolo.names,  # Dictionary of class ID to class name
+        'num_classes': len(yolo.names)
+    }
+
+
+_LOADERS = {
+    'herdnet': _load_herdnet,
+    'yolo': _load_yolo
+}
+
+_models = {}
+_status = {
+    name: {
+        'status': STATUS_NOT_LOADED if name in ENABLED_MODELS else STATUS_DISABLED,
+        'error': None,
+        'load_seconds': None,
+        'warmup_seconds': None,
+        'backend': None,
+        'compiled': None,
+        'quantized': False,
+        'precision': None,
+        'precisions': []
+    }
+    for name in _LOADERS
+}
+_locks = {name: threading.Lock() for name in _LOADERS}
+
+
+def is_enabled(name):
+    """Whether a model is served by this process."""
+    return name in _LOADERS and name in ENABLED_MODELS
+
+
+def load_model(name):
+    """
+    Fetch the weights of a model if needed and load it in PyTorch (no backend switch or warm-up).
+
+    Returns:
+        Tuple (model dictionary, weights path)
+    """
+    if not download_model(name):
+        raise FileNotFoundError(f"{MODELS[name]['filename']} is not available")
+    return _LOADERS[name](), model_file_path(name)
+
+
+def get_model(name):
+    """
+    Get a loaded model, loading it on first use.
+
+    Concurrent callers wait for a single load. A failed load is not retried:
+    fix the weights file (or ENABLED_MODELS) and restart the server.
+
+    Args:
+        name: 'yolo' or 'herdnet'
+
+    Returns:
+        Dictionary with the model ('model'), its classes and its configuration
+
+    Raises:
+        ModelUnavailableError: If the model is disabled or could not be loaded
+    """
+    if not is_enabled(name):
+        raise ModelUnavailableError(
+            name, STATUS_DISABLED, f"Model '{name}' is not enabled on this server (ENABLED_MODELS)"
+        )
+
+    bundle = _models.get(name)
+    if bundle is not None:
+        return bundle
+
+    with _locks[name]:
+        if name in _models:
+            return _models[name]
+
+        status = _status[name]
+        if status['status'] == STATUS_FAILED:
+            raise ModelUnavailableError(name, STATUS_FAILED, f"Model '{name}' failed to load: {status['error']}")
+
+        status['status'] = STATUS_LOADING
+        start_time = time.perf_counter()
+        try:
+            bundle, weights_path = load_model(name)
+            apply_backend(name, bundle, weights_path, device)
+            status['backend'] = bundle['backend']
+
+            # Compiled variants and warm-up pass, before the model is handed to requests
+            status['status'] = STATUS_WARMING_UP
+            status['warmup_seconds'] = prepare_model(name, bundle, weights_path, device)
+            status['compiled'] = bundle.get('compiled', 'none')
+            add_bf16_variant(name, bundle, device)
+            load_quantized(name, bundle, weights_path)
+            status['quantized'] = 'int8' in bundle
+            status['precisions'] = ['fp32'] + [p for p in ('bf16', 'int8') if p in bundle]
+            status['precision'] = model_variant(name, bundle).get('precision', 'fp32')
+        except Exception as e:
+            status['status'] = STATUS_FAILED
+            status['error'] = str(e)
+            print(f"❌ Could not load {MODELS[name]['description']}: {e}")
+            raise ModelUnavailableError(name, STATUS_FAILED, f"Model '{name}' failed to load: {e}")
+
+        _models[name] = bundle
+        status['status'] = STATUS_READY
+        status['load_seconds'] = round(time.perf_counter() - start_time, 2)
+        print(f"✓ {MODELS[name]['description']} ready in {status['load_seconds']}s "
+              f"({bundle['num_classes']} classes, device: {device})")
+        return bundle
+
+
+def yolo_predictor(bundle, img_size):
+    """YOLOv11 model to run at img_size: its compiled export for that size if there is one."""
+    return bundle.get('exported', {}).get(img_size, bundle['model'])
+
+
+def model_variant(name, bundle, quantized=None, precision=None):
+    """
+    Model dictionary to run a request on.
+
+    Args:
+        name: 'yolo' or 'herdnet'
+        bundle: Loaded model dictionary
+        quantized: Run the INT8 variant (None = QUANTIZED_DEFAULT, unless a precision is given)
+        precision: 'fp32', 'bf16' or 'int8' (None = MODEL_PRECISION); bf16 runs in fp32
+                   where the hardware has no native bfloat16
+
+    Raises:
+        ValueError: If the precision is unknown or the INT8 variant was requested but is not loaded
+    """
+    if precision is not None:
+        precision = precision.lower()
+        if precision not in PRECISIONS + ('int8',):
+            raise ValueError(f"Unknown precision '{precision}' (expected {', '.join(PRECISIONS + ('int8',))})")
+        quantized = quantized or precision == 'int8'
+    elif quantized is None:
+        quantized = QUANTIZED_DEFAULT and 'int8' in bundle
+
+    if quantized:
+        if 'int8' not in bundle:
+            raise ValueError(f"No INT8 variant of '{name}' on this server (QUANTIZED_MODELS)")
+        return bundle['int8']
+    if (precision or MODEL_PRECISION) == 'bf16':
+        return bundle.get('bf16', bundle)
+    return bundle
+
+
+def get_loaded_model(name):
+    """Get a model only if it is already loaded (never triggers a load)."""
+    return _models.get(name)
+
+
+def model_status(name):
+    """Status of a model: status, error, load and warm-up time in seconds, backend, variants and precision."""
+    return dict(_status[name])
+
+
+def models_ready():
+    """
+    Whether this process can serve all its enabled models: each one is loaded and warmed up,
+    or not loaded yet but loaded on first use (MODEL_PRELOAD off).
+    """
+    ready = (STATUS_READY,) if MODEL_PRELOAD else (STATUS_READY, STATUS_NOT_LOADED)
+    return all(_status[name]['status'] in ready for name in ENABLED_MODELS if name in _LOADERS)
+
+
+def preload_models(background=True):
+    """
+    Load all enabled models.
+
+    Args:
+        background: Load in a daemon thread so the server starts accepting requests
+                    immediately (requests for a model wait until it is loaded)
+
+    Returns:
+        The loading thread, or None when loading in the foreground
+    """
+    names = [name for name in ENABLED_MODELS if name in _LOADERS]
+    # Reported as loading while the weights are fetched, before get_model takes over
+    for name in names:
+        if _status[name]['status'] == STATUS_NOT_LOADED:
+            _status[name]['status'] = STATUS_LOADING
+
+    def run():
+        for name in ENABLED_MODELS:
+            if name not in _LOADERS:
+                print(f"⚠️  Unknown model in ENABLED_MODELS: {name}")
+
+        # Fetch all missing weights in parallel before loading
+        try:
+            ensure_models(names)
+        except Exception as e:
+            print(f"❌ Error fetching models: {e}")
+
+        for name in names:
+            try:
+                get_model(name)
+            except ModelUnavailableError:
+                pass
+
+    if not background:
+        run()
+        return None
+
+    thread = threading.Thread(target=run, name='model-preload', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,245 @@
+"""
+Model Warm-up - Compiled model variants and a warm-up pass run before a model reports ready
+
+The first inference after loading pays for kernel selection (CUDA/oneDNN), ultralytics predictor
+setup (layer fusion) and allocator growth. Running a few synthetic frames at the configured sizes
+moves that cost to startup, so the first request is as fast as the following ones.
+
+Optionally, models are replaced by compiled variants cached in COMPILED_CACHE_DIR between restarts:
+    torchscript: HerdNet traced and frozen with TorchScript; YOLOv11 exported by ultralytics to TorchScript
+    compile:     HerdNet compiled with torch.compile (inductor cache kept in COMPILED_CACHE_DIR)
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from model_loader import MODEL_CACHE_DIR
+
+# Warm-up configuration (from environment variables or defaults)
+MODEL_WARMUP = os.environ.get('MODEL_WARMUP', 'true').lower() in ('true', '1', 'yes', 'on')
+WARMUP_ITERATIONS = int(os.environ.get('WARMUP_ITERATIONS', 2))
+WARMUP_IMG_SIZE = int(os.environ.get('WARMUP_IMG_SIZE', 640))  # YOLOv11 img_size
+WARMUP_PATCH_SIZE = int(os.environ.get('WARMUP_PATCH_SIZE', 512))  # HerdNet patch_size
+
+# Compiled variants: none, torchscript or compile
+MODEL_COMPILE = os.environ.get('MODEL_COMPILE', 'none').lower()
+COMPILED_CACHE_DIR = Path(os.environ.get('COMPILED_CACHE_DIR', MODEL_CACHE_DIR / 'compiled'))
+
+COMPILE_MODES = ('none', 'torchscript', 'compile')
+
+
+def artifact_key(weights_path, *parts):
+    """Key of a compiled artifact: weights file identity, torch version, device and extra parts."""
+    stat = os.stat(weights_path)
+    identity = [Path(weights_path).name, stat.st_size, stat.st_mtime_ns, torch.__version__, *parts]
+    return hashlib.sha256('|'.join(map(str, identity)).encode()).hexdigest()[:16]
+
+
+def _atomic_save(path, save):
+    """Save an artifact through a temporary file renamed into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        save(temp_path)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+
+def _flatten(output):
+    """Tensors of a model output (tensor, tuple/list or dict of them)."""
+    if isinstance(output, torch.Tensor):
+        return [output]
+    if isinstance(output, dict):
+        output = list(output.values())
+    return [t for item in output for t in _flatten(item)]
+
+
+def outputs_close(expected, actual, rtol=1e-3, atol=1e-4):
+    """Whether two model outputs have the same structure and match within tolerance."""
+    expected, actual = _flatten(expected), _flatten(actual)
+    return len(expected) == len(actual) and all(
+        e.shape == a.shape and torch.allclose(e, a, rtol=rtol, atol=atol) for e, a in zip(expected, actual)
+    )
+
+
+def _trace_herdnet(network, device):
+    """
+    Trace and freeze the HerdNet network.
+
+    Patch sizes change per request, so the trace is checked against eager outputs at a
+    second size: if a shape was baked into the trace the eager network is kept.
+
+    Returns:
+        The traced module, or None if it does not match the eager network
+    """
+    size = WARMUP_PATCH_SIZE
+    check_size = max(64, (size * 3 // 4) // 32 * 32)
+    with torch.no_grad():
+        traced = torch.jit.trace(network, torch.rand(1, 3, size, size, device=device), strict=False)
+        traced = torch.jit.freeze(traced.eval())
+
+        check = torch.rand(1, 3, check_size, check_size, device=device)
+        if not outputs_close(network(check), traced(check)):
+            print(f"⚠️  Traced HerdNet does not match the eager model at patch size {check_size}, keeping eager")
+            return None
+    return traced
+
+
+def _configure_inductor_cache():
+    """Keep torch.compile caches in COMPILED_CACHE_DIR and restore saved artifacts, if any."""
+    os.environ.setdefault('TORCHINDUCTOR_CACHE_DIR', str(COMPILED_CACHE_DIR / 'inductor'))
+    os.environ.setdefault('TORCHINDUCTOR_FX_GRAPH_CACHE', '1')
+
+    artifacts_path = COMPILED_CACHE_DIR / f"inductor-{torch.__version__}.bin"
+    if artifacts_path.exists() and hasattr(torch.compiler, 'load_cache_artifacts'):
+        torch.compiler.load_cache_artifacts(artifacts_path.read_bytes())
+    return artifacts_path
+
+
+def _save_inductor_artifacts(artifacts_path):
+    """Save torch.compile cache artifacts after warm-up (torch 2.7+)."""
+    if not hasattr(torch.compiler, 'save_cache_artifacts'):
+        return
+    artifacts = torch.compiler.save_cache_artifacts()
+    if artifacts:
+        _atomic_save(artifacts_path, lambda temp_path: temp_path.write_bytes(artifacts[0]))
+
+
+def compile_herdnet(bundle, weights_path, device):
+    """
+    Replace the HerdNet network (inside its LossWrapper) by its compiled variant.
+
+    Returns:
+        Path of the torch.compile artifacts to save after warm-up, or None
+    """
+    wrapper = bundle['model']
+    network = wrapper.model
+    bundle['eager_network'] = network
+
+    if MODEL_COMPILE == 'torchscript':
+        path = COMPILED_CACHE_DIR / f"herdnet-{artifact_key(weights_path, device, WARMUP_PATCH_SIZE)}.torchscript.pt"
+        if path.exists():
+            traced = torch.jit.load(str(path), map_location=device)
+            print(f"✓ Loaded traced HerdNet from {path.name}")
+        else:
+            traced = _trace_herdnet(network, device)
+            if traced is None:
+                return None
+            _atomic_save(path, lambda temp_path: torch.jit.save(traced, str(temp_path)))
+            print(f"✓ Traced HerdNet cached as {path.name}")
+        wrapper.model = traced
+        bundle['compiled'] = 'torchscript'
+        return None
+
+    if MODEL_COMPILE == 'compile':
+        artifacts_path = _configure_inductor_cache()
+        wrapper.model = torch.compile(network, dynamic=True)
+        bundle['compiled'] = 'compile'
+        return artifacts_path
+
+    return None
+
+
+def compile_yolo(bundle, weights_path, device):
+    """Add a TorchScript export of YOLOv11 at WARMUP_IMG_SIZE (used for requests with that img_size)."""
+    if MODEL_COMPILE == 'compile':
+        print("⚠️  MODEL_COMPILE=compile applies to HerdNet only, YOLOv11 runs eager")
+        return
+    if MODEL_COMPILE != 'torchscript':
+        return
+
+    from ultralytics import YOLO
+
+    size = WARMUP_IMG_SIZE
+    path = COMPILED_CACHE_DIR / f"{Path(weights_path).stem}-{artifact_key(weights_path, device, size)}.torchscript"
+    if not path.exists():
+        exported = bundle['model'].export(format='torchscript', imgsz=size,
+                                          device='cpu' if device.type == 'cpu' else device.index or 0)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(exported, path)
+        print(f"✓ YOLOv11 TorchScript export cached as {path.name}")
+
+    bundle.setdefault('exported', {})[size] = YOLO(str(path), task='detect')
+    bundle['compiled'] = 'torchscript'
+
+
+def warm_up_herdnet(bundle, device):
+    """Run synthetic patches through HerdNet."""
+    x = torch.rand(1, 3, WARMUP_PATCH_SIZE, WARMUP_PATCH_SIZE, device=device)
+    with torch.no_grad():
+        for _ in range(WARMUP_ITERATIONS):
+            bundle['model'](x)
+    if device.type == 'cuda':
+        torch.cuda.synchronize()
+
+
+def warm_up_yolo(bundle, device):
+    """Run synthetic frames through YOLOv11 (and its exported variants)."""
+    predictors = [(WARMUP_IMG_SIZE, bundle['model'])] + list(bundle.get('exported', {}).items())
+    for size, predictor in predictors:
+        frame = np.zeros((size, size, 3), dtype=np.uint8)
+        for _ in range(WARMUP_ITERATIONS):
+            predictor.predict(source=frame, imgsz=size, verbose=False)
+
+
+def _revert_to_eager(name, bundle):
+    """Drop the compiled variants of a model."""
+    if name == 'herdnet':
+        bundle['model'].model = bundle['eager_network']
+    else:
+        bundle.pop('exported', None)
+    bundle['compiled'] = 'none'
+
+
+def prepare_model(name, bundle, weights_path, device):
+    """
+    Compile (if configured) and warm up a freshly loaded model.
+
+    Failures are reported and the model stays usable in eager mode.
+
+    Returns:
+        Seconds spent
+    """
+    if MODEL_COMPILE not in COMPILE_MODES:
+        print(f"⚠️  Unknown MODEL_COMPILE={MODEL_COMPILE} (expected {', '.join(COMPILE_MODES)}), using eager models")
+
+    start_time = time.perf_counter()
+    compile_fn, warm_up_fn = {
+        'herdnet': (compile_herdnet, warm_up_herdnet),
+        'yolo': (compile_yolo, warm_up_yolo)
+    }[name]
+
+    bundle['compiled'] = 'none'
+    artifacts_path = None
+    # Models on another backend (e.g. ONNX Runtime) are only warmed up
+    if bundle.get('backend', 'torch') == 'torch':
+        try:
+            artifacts_path = compile_fn(bundle, weights_path, device)
+        except Exception as e:
+            print(f"⚠️  Could not compile {name} ({MODEL_COMPILE}), using the eager model: {e}")
+            _revert_to_eager(name, bundle)
+
+    if MODEL_WARMUP or bundle['compiled'] != 'none':
+        try:
+            warm_up_fn(bundle, device)
+            if artifacts_path is not None:
+                _save_inductor_artifacts(artifacts_path)
+        except Exception as e:
+            if bundle['compiled'] == 'none':
+                print(f"⚠️  Warm-up of {name} failed: {e}")
+            else:
+                # torch.compile errors only show up on the first call
+                print(f"⚠️  Compiled {name} failed during warm-up, using the eager model: {e}")
+                _revert_to_eager(name, bundle)
+                if MODEL_WARMUP:
+                    warm_up_fn(bundle, device)
+
+    return round(time.perf_counter() - start_time, 2)
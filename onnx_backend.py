@@ -0,0 +1,310 @@
+"""
+ONNX Backend - Runs HerdNet and YOLOv11 through ONNX Runtime instead of eager PyTorch
+
+Selected per model with HERDNET_BACKEND / YOLO_BACKEND (torch or onnx). Each model is exported to
+ONNX once and cached in COMPILED_CACHE_DIR/onnx; ONNX Runtime then runs it with graph optimizations
+and a tuned number of intra-op threads.
+
+HerdNet: the network inside its LossWrapper is exported with dynamic batch and spatial axes and
+replaced by a module that calls the ONNX Runtime session, so the stitcher and the evaluator are
+unchanged. The export is checked against the PyTorch outputs before it is used.
+YOLOv11: exported by ultralytics with dynamic axes and served by ultralytics' ONNX Runtime backend.
+
+Parity check (PyTorch vs ONNX Runtime):
+    python onnx_backend.py [herdnet] [yolo] [--images DIR] [--sizes 512,384]
+"""
+
+import inspect
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from model_warmup import COMPILED_CACHE_DIR, WARMUP_IMG_SIZE, WARMUP_PATCH_SIZE, artifact_key, outputs_close
+
+# onnxruntime is optional: only needed for the onnx backend
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+# Backend of each model (from environment variables or defaults): torch or onnx
+MODEL_BACKENDS = {
+    'herdnet': os.environ.get('HERDNET_BACKEND', 'torch').lower(),
+    'yolo': os.environ.get('YOLO_BACKEND', 'torch').lower()
+}
+# ONNX Runtime session configuration (0 threads = one per physical core)
+ONNX_INTRA_OP_THREADS = int(os.environ.get('ONNX_INTRA_OP_THREADS', 0))
+ONNX_INTER_OP_THREADS = int(os.environ.get('ONNX_INTER_OP_THREADS', 1))
+ONNX_GRAPH_OPTIMIZATION = os.environ.get('ONNX_GRAPH_OPTIMIZATION', 'all').lower()
+ONNX_OPSET = int(os.environ.get('ONNX_OPSET', 17))
+
+ONNX_DIR = COMPILED_CACHE_DIR / 'onnx'
+BACKENDS = ('torch', 'onnx')
+
+
+def onnx_available():
+    """Whether onnxruntime is installed."""
+    return ort is not None
+
+
+def session_options():
+    """ONNX Runtime session options from the ONNX_* settings."""
+    levels = {
+        'disabled': ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    }
+    options = ort.SessionOptions()
+    options.graph_optimization_level = levels.get(ONNX_GRAPH_OPTIMIZATION, levels['all'])
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+    return options
+
+
+def create_session(path, device):
+    """ONNX Runtime inference session for a model file (on CUDA when the device is a GPU and supported)."""
+    providers = ['CPUExecutionProvider']
+    if device.type == 'cuda' and 'CUDAExecutionProvider' in ort.get_available_providers():
+        providers.insert(0, 'CUDAExecutionProvider')
+    return ort.InferenceSession(str(path), session_options(), providers=providers)
+
+
+class OnnxModule(torch.nn.Module):
+    """Module that runs an ONNX Runtime session on a batch of images (NCHW float32)."""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_names = [output.name for output in session.get_outputs()]
+
+    def forward(self, x):
+        outputs = self.session.run(
+            self.output_names, {self.input_name: x.detach().float().cpu().contiguous().numpy()}
+        )
+        outputs = tuple(torch.from_numpy(output).to(x.device) for output in outputs)
+        return outputs[0] if len(outputs) == 1 else outputs
+
+
+def _export_kwargs():
+    """Use the TorchScript-based exporter where torch.onnx.export also offers the dynamo one."""
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        return {'dynamo': False}
+    return {}
+
+
+def export_herdnet(network, path):
+    """
+    Export the HerdNet network (without its LossWrapper) to ONNX with dynamic batch and spatial axes.
+
+    Returns:
+        Path of the ONNX file
+    """
+    device = next(network.parameters()).device
+    example = torch.rand(1, 3, WARMUP_PATCH_SIZE, WARMUP_PATCH_SIZE, device=device)
+    with torch.no_grad():
+        outputs = network(example)
+    num_outputs = 1 if isinstance(outputs, torch.Tensor) else len(outputs)
+    output_names = [f"output_{i}" for i in range(num_outputs)]
+
+    dynamic_axes = {'image': {0: 'batch', 2: 'height', 3: 'width'}}
+    dynamic_axes.update({name: {0: 'batch', 2: 'out_height', 3: 'out_width'} for name in output_names})
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.tmp")
+    try:
+        torch.onnx.export(
+            network, example, str(temp_path),
+            input_names=['image'], output_names=output_names, dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET, do_constant_folding=True, **_export_kwargs()
+        )
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+    return path
+
+
+def herdnet_onnx_path(weights_path, device):
+    return ONNX_DIR / f"herdnet-{artifact_key(weights_path, device, ONNX_OPSET)}.onnx"
+
+
+def check_herdnet_parity(network, module, sizes, device, batch_size=1):
+    """
+    Compare the PyTorch network and its ONNX Runtime module on random patches.
+
+    Returns:
+        List of (size, matches, max absolute difference)
+    """
+    results = []
+    with torch.no_grad():
+        for size in sizes:
+            x = torch.rand(batch_size, 3, size, size, device=device)
+            expected, actual = network(x), module(x)
+            expected_list = [expected] if isinstance(expected, torch.Tensor) else list(expected)
+            actual_list = [actual] if isinstance(actual, torch.Tensor) else list(actual)
+            max_diff = max(
+                (e.float() - a.float()).abs().max().item() if e.shape == a.shape else float('inf')
+                for e, a in zip(expected_list, actual_list)
+            )
+            results.append((size, outputs_close(expected, actual), max_diff))
+    return results
+
+
+def use_onnx_herdnet(bundle, weights_path, device):
+    """Replace the HerdNet network by an ONNX Runtime module (exported and checked on first use)."""
+    wrapper = bundle['model']
+    network = wrapper.model
+    path = herdnet_onnx_path(weights_path, device)
+
+    if not path.exists():
+        print(f"⏳ Exporting HerdNet to ONNX ({path.name})...")
+        export_herdnet(network, path)
+        module = OnnxModule(create_session(path, device))
+        check_size = max(64, (WARMUP_PATCH_SIZE * 3 // 4) // 32 * 32)
+        for size, matches, max_diff in check_herdnet_parity(network, module, (WARMUP_PATCH_SIZE, check_size), device):
+            if not matches:
+                path.unlink()
+                raise RuntimeError(f"ONNX export does not match PyTorch at patch size {size} (max diff {max_diff:.2e})")
+        print("✓ HerdNet ONNX export verified against PyTorch")
+    else:
+        module = OnnxModule(create_session(path, device))
+
+    wrapper.model = module
+    bundle['eager_network'] = network
+    bundle['onnx_path'] = str(path)
+
+
+def yolo_onnx_path(weights_path, device):
+    return ONNX_DIR / f"{Path(weights_path).stem}-{artifact_key(weights_path, device, ONNX_OPSET)}.onnx"
+
+
+def use_onnx_yolo(bundle, weights_path, device):
+    """Replace YOLOv11 by its ONNX export (dynamic axes, so every img_size is served)."""
+    from ultralytics import YOLO
+
+    path = yolo_onnx_path(weights_path, device)
+    if not path.exists():
+        print(f"⏳ Exporting YOLOv11 to ONNX ({path.name})...")
+        exported = bundle['model'].export(format='onnx', imgsz=WARMUP_IMG_SIZE, dynamic=True,
+                                          simplify=False, opset=ONNX_OPSET, device='cpu')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(exported, path)
+
+    bundle['eager_model'] = bundle['model']
+    bundle['model'] = YOLO(str(path), task='detect')
+    bundle['onnx_path'] = str(path)
+
+
+def apply_backend(name, bundle, weights_path, device):
+    """
+    Switch a freshly loaded model to its configured backend.
+
+    Falls back to PyTorch (with a warning) if onnxruntime is missing or the export fails.
+    """
+    backend = MODEL_BACKENDS.get(name, 'torch')
+    bundle['backend'] = 'torch'
+    if backend == 'torch':
+        return
+    if backend not in BACKENDS:
+        print(f"⚠️  Unknown backend {backend} for {name} (expected {', '.join(BACKENDS)}), using torch")
+        return
+    if ort is None:
+        print(f"⚠️  onnxruntime is not installed, {name} runs on torch")
+        return
+
+    start_time = time.perf_counter()
+    try:
+        {'herdnet': use_onnx_herdnet, 'yolo': use_onnx_yolo}[name](bundle, weights_path, device)
+    except Exception as e:
+        print(f"⚠️  Could not use the ONNX backend for {name}, using torch: {e}")
+        return
+    bundle['backend'] = 'onnx'
+    print(f"✓ {name} runs on ONNX Runtime {ort.__version__} ({time.perf_counter() - start_time:.1f}s)")
+
+
+def _yolo_detections(predictor, image, img_size):
+    result = predictor.predict(source=image, imgsz=img_size, verbose=False)[0]
+    return result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(), result.boxes.cls.cpu().numpy()
+
+
+def check_yolo_parity(torch_model, onnx_model, images, img_size):
+    """
+    Compare PyTorch and ONNX Runtime YOLOv11 detections image by image.
+
+    Returns:
+        List of (image, torch detections, onnx detections, max box difference, max confidence difference)
+    """
+    results = []
+    for image in images:
+        boxes_t, conf_t, cls_t = _yolo_detections(torch_model, image, img_size)
+        boxes_o, conf_o, cls_o = _yolo_detections(onnx_model, image, img_size)
+        if len(boxes_t) == len(boxes_o) and len(boxes_t) > 0 and (cls_t == cls_o).all():
+            box_diff = float(np.abs(boxes_t - boxes_o).max())
+            conf_diff = float(np.abs(conf_t - conf_o).max())
+        else:
+            box_diff = conf_diff = 0.0 if len(boxes_t) == len(boxes_o) == 0 else float('inf')
+        results.append((str(image) if not isinstance(image, np.ndarray) else 'synthetic',
+                        len(boxes_t), len(boxes_o), box_diff, conf_diff))
+    return results
+
+
+def main():
+    import argparse
+
+    from model_registry import device, load_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='*', default=['herdnet', 'yolo'], help="Models to check (default: both)")
+    parser.add_argument('--images', help="Folder of images for the YOLOv11 check (default: synthetic frames)")
+    parser.add_argument('--sizes', default=f"{WARMUP_PATCH_SIZE},{max(64, WARMUP_PATCH_SIZE * 3 // 4 // 32 * 32)}",
+                        help="HerdNet patch sizes to compare (comma-separated)")
+    parser.add_argument('--img-size', type=int, default=WARMUP_IMG_SIZE, help="YOLOv11 img_size")
+    args = parser.parse_args()
+
+    if ort is None:
+        raise SystemExit("❌ onnxruntime is not installed (pip install onnxruntime)")
+
+    ok = True
+    if 'herdnet' in args.models:
+        bundle, weights_path = load_model('herdnet')
+        network = bundle['model'].model
+        path = herdnet_onnx_path(weights_path, device)
+        if not path.exists():
+            export_herdnet(network, path)
+        module = OnnxModule(create_session(path, device))
+        print(f"\nHerdNet: PyTorch vs ONNX Runtime ({path.name})")
+        for size, matches, max_diff in check_herdnet_parity(
+                network, module, [int(s) for s in args.sizes.split(',')], device):
+            print(f"  {'✓' if matches else '❌'} patch {size}: max abs diff {max_diff:.2e}")
+            ok = ok and matches
+
+    if 'yolo' in args.models:
+        from ultralytics import YOLO
+
+        bundle, weights_path = load_model('yolo')
+        torch_model = bundle['model']
+        use_onnx_yolo(bundle, weights_path, device)
+        if args.images:
+            images = sorted(p for p in Path(args.images).iterdir() if p.is_file())
+        else:
+            rng = np.random.default_rng(0)
+            images = [rng.integers(0, 255, (args.img_size, args.img_size, 3), dtype=np.uint8) for _ in range(4)]
+        print(f"\nYOLOv11: PyTorch vs ONNX Runtime ({Path(bundle['onnx_path']).name})")
+        for image, n_torch, n_onnx, box_diff, conf_diff in check_yolo_parity(
+                torch_model, YOLO(bundle['onnx_path'], task='detect'), images, args.img_size):
+            matches = n_torch == n_onnx and box_diff <= 1.0 and conf_diff <= 1e-2
+            print(f"  {'✓' if matches else '❌'} {Path(image).name}: {n_torch} vs {n_onnx} detections, "
+                  f"max box diff {box_diff:.2f} px, max confidence diff {conf_diff:.4f}")
+            ok = ok and matches
+
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
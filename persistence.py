@@ -0,0 +1,221 @@
+"""
+Persistence - Write-behind queue that moves task and detection writes off the request path
+
+Analysis endpoints hand their writes to a background worker and return immediately. The worker
+serializes each write outside the database lock, then commits queued writes in batches (one
+transaction per batch). Pending writes are flushed when the process exits.
+
+All writes of one call (e.g. a task's result and its detections) are committed together, so
+once a task is visible as completed its detections are queryable. The writes of a task are
+committed in the order they were submitted.
+
+The queue and the pending counts live in each process: under a multi-worker server (gunicorn),
+persistence_status only knows the writes queued by the worker that answers the request.
+"""
+
+import atexit
+import copy
+import os
+import queue
+import threading
+import time
+from collections import Counter
+
+from database import (transaction, prepare_save_task, prepare_task_success, prepare_save_detections,
+                      prepare_task_error)
+
+# Persistence configuration (from environment variables or defaults)
+PERSIST_ASYNC = os.environ.get('PERSIST_ASYNC', 'true').lower() in ('true', '1', 'yes', 'on')
+PERSIST_QUEUE_SIZE = int(os.environ.get('PERSIST_QUEUE_SIZE', 256))
+PERSIST_BATCH_SIZE = int(os.environ.get('PERSIST_BATCH_SIZE', 32))
+# Seconds a request waits for room in a full queue before writing synchronously
+PERSIST_ENQUEUE_TIMEOUT = float(os.environ.get('PERSIST_ENQUEUE_TIMEOUT', 5))
+# Seconds to wait for pending writes on shutdown
+PERSIST_FLUSH_TIMEOUT = float(os.environ.get('PERSIST_FLUSH_TIMEOUT', 60))
+
+# Persistence status of a task, as reported in responses
+STATUS_QUEUED = 'queued'
+STATUS_SAVED = 'saved'
+
+_queue = queue.Queue(maxsize=PERSIST_QUEUE_SIZE)
+_pending = Counter()  # task_id -> queued writes not yet committed
+_pending_lock = threading.Lock()
+_worker = None
+_worker_pid = None
+_worker_lock = threading.Lock()
+_stop = object()
+
+
+def _run(operations):
+    """Prepare and commit a list of (prepare_fn, args, kwargs) in one transaction."""
+    writes = [prepare(*args, **kwargs) for prepare, args, kwargs in operations]
+    with transaction() as conn:
+        for write in writes:
+            write(conn)
+
+
+def _commit(items):
+    """Commit a batch of queued items, isolating any item that fails."""
+    try:
+        _run([operation for _, operations in items for operation in operations])
+    except Exception:
+        # Retry one by one so a single bad write does not drop the whole batch
+        for task_id, operations in items:
+            try:
+                _run(operations)
+            except Exception as e:
+                print(f"❌ Persistence failed for task {task_id}: {e}")
+
+
+def _worker_loop():
+    """Drain the queue in batches until the stop marker is received."""
+    while True:
+        item = _queue.get()
+        if item is _stop:
+            return
+
+        items = [item]
+        stop = False
+        while len(items) < PERSIST_BATCH_SIZE:
+            try:
+                next_item = _queue.get_nowait()
+            except queue.Empty:
+                break
+            if next_item is _stop:
+                stop = True
+                break
+            items.append(next_item)
+
+        start_time = time.perf_counter()
+        try:
+            _commit(items)
+        finally:
+            with _pending_lock:
+                for task_id, _ in items:
+                    _pending[task_id] -= 1
+                    if _pending[task_id] <= 0:
+                        del _pending[task_id]
+
+        if len(items) > 1:
+            print(f"✓ Persisted {len(items)} queued writes in {(time.perf_counter() - start_time) * 1000:.1f} ms")
+        if stop:
+            return
+
+
+def _ensure_worker():
+    """Start the worker thread (again after a fork, since threads do not survive it)."""
+    global _worker, _worker_pid
+    with _worker_lock:
+        if _worker is None or _worker_pid != os.getpid() or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, name='persistence-worker', daemon=True)
+            _worker.start()
+            _worker_pid = os.getpid()
+
+
+def _submit(task_id, operations):
+    """
+    Queue the operations of a task, or run them now if async persistence is off or the queue stays
+    full (only when no earlier write of the task is pending, otherwise they wait for room).
+    """
+    if not PERSIST_ASYNC:
+        _run(operations)
+        return STATUS_SAVED
+
+    # Snapshot the arguments: callers keep mutating their responses (e.g. translating species names)
+    operations = copy.deepcopy(operations)
+
+    _ensure_worker()
+    with _pending_lock:
+        _pending[task_id] += 1
+    try:
+        _queue.put((task_id, operations), timeout=PERSIST_ENQUEUE_TIMEOUT)
+    except queue.Full:
+        with _pending_lock:
+            earlier_writes = _pending[task_id] > 1
+        if earlier_writes:
+            # A synchronous write would overtake the task's queued writes (e.g. its success
+            # before its start), so wait for room behind them instead
+            print(f"⚠️  Persistence queue full, waiting to queue task {task_id} behind its pending writes")
+            _queue.put((task_id, operations))
+            return STATUS_QUEUED
+        with _pending_lock:
+            _pending[task_id] -= 1
+            if _pending[task_id] <= 0:
+                del _pending[task_id]
+        print(f"⚠️  Persistence queue full, writing task {task_id} synchronously")
+        _run(operations)
+        return STATUS_SAVED
+    return STATUS_QUEUED
+
+
+def persist_task_start(task_id, model_type, filename, num_images, processing_params):
+    """Save a new task (status: processing)."""
+    return _submit(task_id, [(prepare_save_task, (task_id, model_type, filename, num_images, processing_params), {})])
+
+
+def persist_task_success(task_id, model_type, processing_time, total_detections, images_with_detections,
+                         species_counts, result_data, detections):
+    """
+    Save a successful task result together with its detections (committed in the same transaction).
+
+    Returns:
+        Persistence status: 'queued' or 'saved'
+    """
+    operations = [(prepare_task_success, (task_id, processing_time, total_detections, images_with_detections,
+                                          species_counts, result_data), {})]
+    if detections:
+        operations.append((prepare_save_detections, (task_id, detections, model_type), {}))
+    return _submit(task_id, operations)
+
+
+def persist_task_error(task_id, error_message):
+    """Mark a task as failed."""
+    return _submit(task_id, [(prepare_task_error, (task_id, error_message), {})])
+
+
+def persistence_status(task_id):
+    """
+    'queued' while writes of the task are pending in this process, 'saved' otherwise.
+
+    Writes queued by other worker processes are not seen: there the task is reported 'saved'
+    (or not found) until they are committed.
+    """
+    with _pending_lock:
+        return STATUS_QUEUED if _pending.get(task_id) else STATUS_SAVED
+
+
+def queue_depth():
+    """Number of queued writes not yet committed."""
+    with _pending_lock:
+        return sum(_pending.values())
+
+
+def flush(timeout=None):
+    """
+    Wait until all queued writes are committed.
+
+    Returns:
+        True if the queue was drained within the timeout
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while queue_depth() > 0:
+        if _worker is None or not _worker.is_alive() or _worker_pid != os.getpid():
+            return False
+        if deadline is not None and time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+@atexit.register
+def shutdown():
+    """Flush pending writes and stop the worker (runs at interpreter exit)."""
+    if _worker is None or _worker_pid != os.getpid() or not _worker.is_alive():
+        return
+    pending = queue_depth()
+    if pending:
+        print(f"⏳ Flushing {pending} queued database writes...")
+    _queue.put(_stop)
+    _worker.join(PERSIST_FLUSH_TIMEOUT)
+    if _worker.is_alive():
+        print(f"❌ Persistence worker did not finish within {PERSIST_FLUSH_TIMEOUT}s: {queue_depth()} writes lost")
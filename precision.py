@@ -0,0 +1,123 @@
+"""
+Inference Precision - bfloat16 autocast variants of HerdNet and YOLOv11
+
+On CPUs with native bfloat16 (AVX-512 BF16 or AMX) and on recent GPUs, running the networks under
+bfloat16 autocast is much faster and halves activation memory for large patches. Each loaded model
+gets a bf16 variant that shares its weights: the network runs under torch.autocast and its outputs
+are cast back to float32, so the stitcher, LMDS and ultralytics post-processing are unchanged.
+
+MODEL_PRECISION sets the deployment default (fp32 or bf16); requests override it with 'precision'.
+Where the hardware has no native bfloat16, bf16 requests run in fp32.
+"""
+
+import functools
+import os
+
+import torch
+
+from model_warmup import MODEL_WARMUP, warm_up_herdnet, warm_up_yolo
+
+PRECISIONS = ('fp32', 'bf16')
+
+# Default precision of requests (from environment variables or defaults): fp32 or bf16
+MODEL_PRECISION = os.environ.get('MODEL_PRECISION', 'fp32').lower()
+if MODEL_PRECISION not in PRECISIONS:
+    print(f"⚠️  Unknown MODEL_PRECISION={MODEL_PRECISION} (expected {', '.join(PRECISIONS)}), using fp32")
+    MODEL_PRECISION = 'fp32'
+
+
+@functools.lru_cache(maxsize=None)
+def bf16_supported(device):
+    """Whether the device runs bfloat16 natively (AVX-512 BF16/AMX on CPU, Ampere or newer on CUDA)."""
+    if device.type == 'cuda':
+        return torch.cuda.is_bf16_supported()
+    try:
+        with open('/proc/cpuinfo') as f:
+            flags = f.read()
+        return 'avx512_bf16' in flags or 'amx_bf16' in flags
+    except OSError:
+        pass
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def effective_precision(device):
+    """Precision that requests get by default on this device."""
+    if MODEL_PRECISION == 'bf16' and not bf16_supported(device):
+        return 'fp32'
+    return MODEL_PRECISION
+
+
+def _to_float(output):
+    """Cast the bfloat16 tensors of a model output back to float32."""
+    if isinstance(output, torch.Tensor):
+        return output.float() if output.dtype == torch.bfloat16 else output
+    if isinstance(output, tuple):
+        return tuple(_to_float(item) for item in output)
+    if isinstance(output, list):
+        return [_to_float(item) for item in output]
+    if isinstance(output, dict):
+        return {key: _to_float(value) for key, value in output.items()}
+    return output
+
+
+class AutocastModule(torch.nn.Module):
+    """Runs a network under bfloat16 autocast and returns float32 outputs."""
+
+    def __init__(self, model, device_type):
+        super().__init__()
+        self.model = model
+        self.device_type = device_type
+
+    def forward(self, x):
+        with torch.autocast(device_type=self.device_type, dtype=torch.bfloat16):
+            return _to_float(self.model(x))
+
+
+class AutocastPredictor:
+    """YOLOv11 model whose predictions run under bfloat16 autocast."""
+
+    def __init__(self, yolo, device_type):
+        self.yolo = yolo
+        self.device_type = device_type
+        # Detection head outputs go back to float32 before NMS and the numpy conversions of the results
+        if not getattr(yolo.model, '_float_output_hook', False):
+            yolo.model.register_forward_hook(lambda module, args, output: _to_float(output))
+            yolo.model._float_output_hook = True
+
+    def predict(self, *args, **kwargs):
+        with torch.autocast(device_type=self.device_type, dtype=torch.bfloat16):
+            return self.yolo.predict(*args, **kwargs)
+
+
+def add_bf16_variant(name, bundle, device):
+    """
+    Add the bf16 variant of a freshly loaded model as bundle['bf16'] (if the hardware supports it).
+
+    The variant always runs the PyTorch network: TorchScript traces and ONNX models keep float32.
+    """
+    if not bf16_supported(device):
+        return
+
+    try:
+        if name == 'herdnet':
+            from animaloc.models import LossWrapper
+
+            network = bundle['model'].model
+            if bundle.get('backend') != 'torch' or bundle.get('compiled') == 'torchscript':
+                network = bundle['eager_network']
+            model = LossWrapper(AutocastModule(network, device.type), [])
+            model.eval()
+        else:
+            yolo = bundle['eager_model'] if bundle.get('backend') == 'onnx' else bundle['model']
+            model = AutocastPredictor(yolo, device.type)
+        variant = dict(bundle, model=model, exported={}, precision='bf16')
+        if MODEL_WARMUP and MODEL_PRECISION == 'bf16':
+            {'herdnet': warm_up_herdnet, 'yolo': warm_up_yolo}[name](variant, device)
+    except Exception as e:
+        print(f"⚠️  Could not prepare the bf16 variant of {name}: {e}")
+        return
+
+    bundle['bf16'] = variant
@@ -0,0 +1,111 @@
+"""
+HerdNet Preprocessing - uint8 frames normalized per patch batch and fed in channels_last
+
+With albumentations A.Normalize every frame became a float32 HWC copy (about 288 MB for a 24 MP
+frame) and then an NCHW tensor before the stitcher cut it into patches. Here frames stay uint8 CHW
+tensors (72 MB for 24 MP) through the dataloader and the stitcher; each patch batch is converted
+to float32 channels_last and normalized in place right before the network, so the float32 working
+set is a single patch batch. Channels-last activations and weights let oneDNN convolutions run
+without layout reorders.
+"""
+
+import os
+
+import numpy as np
+import torch
+from PIL import Image
+
+# HerdNet preprocessing configuration (from environment variables or defaults)
+# Keep frames uint8 and normalize per patch batch (false = albumentations A.Normalize on the whole frame)
+HERDNET_UINT8_PREPROCESSING = os.environ.get('HERDNET_UINT8_PREPROCESSING', 'true').lower() in ('true', '1', 'yes', 'on')
+# channels_last weights and patch batches (converting the weights copies them out of the memory-mapped checkpoint)
+HERDNET_CHANNELS_LAST = os.environ.get('HERDNET_CHANNELS_LAST', 'true').lower() in ('true', '1', 'yes', 'on')
+
+
+class FrameDataset(torch.utils.data.Dataset):
+    """
+    Images of a folder as uint8 CHW tensors, for inference with HerdNetEvaluator.
+
+    Targets are the same placeholder point the API uses with CSVDataset (one point at
+    (0, 0) with label 1 per image): inference does not use them.
+    """
+
+    def __init__(self, root_dir, img_names, rotation=0):
+        self.root_dir = root_dir
+        self._img_names = list(img_names)
+        self.rotation = rotation
+
+    def __len__(self):
+        return len(self._img_names)
+
+    def __getitem__(self, index):
+        with Image.open(os.path.join(self.root_dir, self._img_names[index])) as image:
+            frame = torch.from_numpy(np.array(image.convert('RGB'))).permute(2, 0, 1)
+        target = {'points': torch.zeros((1, 2)), 'labels': torch.ones(1, dtype=torch.int64)}
+        if self.rotation:
+            from animaloc.data.transforms import Rotate90
+            frame, target = Rotate90(k=self.rotation)(frame, target)
+        return frame, target
+
+
+class PatchNormalizer(torch.nn.Module):
+    """
+    Normalizes uint8 patch batches and feeds them to the model in channels_last.
+
+    Float inputs (already normalized) are passed through, only changing their memory format.
+    """
+
+    def __init__(self, model, mean, std, channels_last=True):
+        super().__init__()
+        self.model = model
+        self.channels_last = channels_last
+        # (x / 255 - mean) / std == x * scale + shift
+        std = torch.tensor(std, dtype=torch.float32).view(1, 3, 1, 1)
+        mean = torch.tensor(mean, dtype=torch.float32).view(1, 3, 1, 1)
+        self.register_buffer('scale', 1.0 / (255.0 * std), persistent=False)
+        self.register_buffer('shift', -mean / std, persistent=False)
+
+    def forward(self, x, *args, **kwargs):
+        memory_format = torch.channels_last if self.channels_last else torch.contiguous_format
+        if x.dtype == torch.uint8:
+            x = x.to(dtype=torch.float32, memory_format=memory_format)
+            x.mul_(self.scale.to(x.device)).add_(self.shift.to(x.device))
+        else:
+            x = x.contiguous(memory_format=memory_format)
+        return self.model(x, *args, **kwargs)
+
+
+def herdnet_dataset(image_dir, img_names, mean, std, rotation=0):
+    """Dataset of images to run through HerdNetEvaluator (uint8 frames, or normalized float frames)."""
+    if HERDNET_UINT8_PREPROCESSING:
+        return FrameDataset(image_dir, img_names, rotation)
+
+    import albumentations as A
+    import pandas as pd
+    from animaloc.data.transforms import DownSample, Rotate90
+    from animaloc.datasets import CSVDataset
+
+    n = len(img_names)
+    df = pd.DataFrame(data={'images': img_names, 'x': [0] * n, 'y': [0] * n, 'labels': [1] * n})
+    end_transforms = []
+    if rotation != 0:
+        end_transforms.append(Rotate90(k=rotation))
+    end_transforms.append(DownSample(down_ratio=2, anno_type='point'))
+    return CSVDataset(
+        csv_file=df,
+        root_dir=image_dir,
+        albu_transforms=[A.Normalize(mean=mean, std=std)],
+        end_transforms=end_transforms
+    )
+
+
+def herdnet_input_model(bundle):
+    """HerdNet model (of a model dictionary) that accepts the frames of herdnet_dataset."""
+    return PatchNormalizer(bundle['model'], bundle['mean'], bundle['std'], HERDNET_CHANNELS_LAST)
+
+
+def to_channels_last(network):
+    """Convert the weights of a network to channels_last (if HERDNET_CHANNELS_LAST)."""
+    if HERDNET_CHANNELS_LAST:
+        network = network.to(memory_format=torch.channels_last)
+    return network
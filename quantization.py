@@ -0,0 +1,417 @@
+"""
+INT8 Quantization - Post-training static quantization of HerdNet and YOLOv11 for CPU inference
+
+The ONNX exports of onnx_backend.py are quantized with ONNX Runtime (QDQ format, per-channel INT8
+weights) using activation ranges calibrated on a folder of representative aerial tiles. The CLI
+writes the quantized models to COMPILED_CACHE_DIR/onnx together with an accuracy report comparing
+them with the FP32 models: PointsMetrics (precision, recall, F1, MAE) for HerdNet and mAP for YOLOv11,
+against ground truth when given, otherwise against the FP32 detections.
+
+Models listed in QUANTIZED_MODELS load their INT8 variant next to the FP32 one. Requests choose it
+with the 'quantized' parameter; QUANTIZED_DEFAULT makes it the default for the whole deployment.
+
+Usage:
+    python quantization.py --tiles DIR [herdnet] [yolo] [--eval-images DIR]
+                           [--herdnet-annotations CSV] [--yolo-data data.yaml]
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from PIL import Image
+
+from model_warmup import MODEL_WARMUP, WARMUP_IMG_SIZE, WARMUP_PATCH_SIZE, artifact_key, warm_up_herdnet, warm_up_yolo
+from onnx_backend import (ONNX_DIR, ONNX_OPSET, OnnxModule, create_session, export_herdnet, herdnet_onnx_path,
+                          use_onnx_yolo)
+
+# onnxruntime is optional: only needed for the INT8 variants
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+except ImportError:
+    ort = None
+    CalibrationDataReader = object
+
+# Quantization configuration (from environment variables or defaults)
+# Models that load their INT8 variant (comma-separated: yolo, herdnet)
+QUANTIZED_MODELS = tuple(
+    m.strip().lower() for m in os.environ.get('QUANTIZED_MODELS', '').split(',') if m.strip()
+)
+# Run requests on the INT8 variant unless they pass quantized=false
+QUANTIZED_DEFAULT = os.environ.get('QUANTIZED_DEFAULT', 'false').lower() in ('true', '1', 'yes', 'on')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.webp')
+CPU = torch.device('cpu')
+
+
+def quantized_path(name, weights_path):
+    """Path of the INT8 model (its accuracy report is saved next to it with a .json suffix)."""
+    return ONNX_DIR / f"{name}-{artifact_key(weights_path, 'cpu', ONNX_OPSET, 'int8')}.int8.onnx"
+
+
+def _image_paths(folder):
+    return sorted(p for p in Path(folder).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def _herdnet_patches(image_paths, mean, std, patch_size):
+    """Normalized HerdNet patches (1, 3, patch_size, patch_size) tiled over the images, zero-padded at the edges."""
+    mean = np.asarray(mean, dtype=np.float32).reshape(3, 1, 1)
+    std = np.asarray(std, dtype=np.float32).reshape(3, 1, 1)
+    for path in image_paths:
+        image = np.asarray(Image.open(path).convert('RGB'), dtype=np.float32).transpose(2, 0, 1) / 255.0
+        image = (image - mean) / std
+        height, width = image.shape[1:]
+        for y in range(0, height, patch_size):
+            for x in range(0, width, patch_size):
+                patch = np.zeros((1, 3, patch_size, patch_size), dtype=np.float32)
+                crop = image[:, y:y + patch_size, x:x + patch_size]
+                patch[0, :, :crop.shape[1], :crop.shape[2]] = crop
+                yield patch
+
+
+def _yolo_frames(image_paths, img_size):
+    """YOLOv11 inputs (1, 3, img_size, img_size): letterboxed like the ultralytics predictor, scaled to [0, 1]."""
+    for path in image_paths:
+        image = Image.open(path).convert('RGB')
+        scale = min(img_size / image.width, img_size / image.height)
+        resized = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                               Image.BILINEAR)
+        canvas = Image.new('RGB', (img_size, img_size), (114, 114, 114))
+        canvas.paste(resized, ((img_size - resized.width) // 2, (img_size - resized.height) // 2))
+        yield (np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0)[np.newaxis]
+
+
+class TileCalibrationReader(CalibrationDataReader):
+    """Feeds up to max_samples calibration inputs to the ONNX Runtime calibrator."""
+
+    def __init__(self, input_name, samples, max_samples):
+        self.input_name = input_name
+        self.samples = samples
+        self.remaining = max_samples
+
+    def get_next(self):
+        if self.remaining <= 0:
+            return None
+        sample = next(self.samples, None)
+        if sample is None:
+            return None
+        self.remaining -= 1
+        return {self.input_name: sample}
+
+
+def quantize_model(fp32_path, int8_path, samples, max_samples=64, method='minmax'):
+    """
+    Quantize an ONNX model to INT8 (QDQ, per-channel weights) with activation ranges from the samples.
+
+    Returns:
+        Path of the INT8 model
+    """
+    methods = {
+        'minmax': CalibrationMethod.MinMax,
+        'entropy': CalibrationMethod.Entropy,
+        'percentile': CalibrationMethod.Percentile
+    }
+    input_name = create_session(fp32_path, CPU).get_inputs()[0].name
+
+    with tempfile.TemporaryDirectory(dir=ONNX_DIR) as temp_dir:
+        # Shape inference and graph cleanup make more operators quantizable
+        model_input = fp32_path
+        try:
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+            model_input = Path(temp_dir) / 'preprocessed.onnx'
+            quant_pre_process(str(fp32_path), str(model_input))
+        except Exception as e:
+            print(f"⚠️  Quantization pre-processing skipped: {e}")
+            model_input = fp32_path
+
+        temp_path = Path(temp_dir) / int8_path.name
+        quantize_static(
+            str(model_input), str(temp_path),
+            TileCalibrationReader(input_name, samples, max_samples),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True,
+            calibrate_method=methods[method]
+        )
+        os.replace(temp_path, int8_path)
+    return int8_path
+
+
+def load_quantized(name, bundle, weights_path):
+    """
+    Load the INT8 variant of a model into bundle['int8'] if it is listed in QUANTIZED_MODELS.
+
+    The variant is a copy of the model dictionary whose 'model' runs the quantized ONNX model on CPU.
+    """
+    if name not in QUANTIZED_MODELS:
+        return
+    if ort is None:
+        print(f"⚠️  onnxruntime is not installed, no INT8 variant of {name}")
+        return
+    path = quantized_path(name, weights_path)
+    if not path.exists():
+        print(f"⚠️  No INT8 model for {name}, create it with: python quantization.py --tiles DIR {name}")
+        return
+
+    try:
+        if name == 'herdnet':
+            from animaloc.models import LossWrapper
+
+            model = LossWrapper(OnnxModule(create_session(path, CPU)), [])
+            model.eval()
+        else:
+            from ultralytics import YOLO
+
+            model = YOLO(str(path), task='detect')
+        variant = dict(bundle, model=model, exported={}, backend='onnx', compiled='none', precision='int8')
+        if MODEL_WARMUP:
+            {'herdnet': warm_up_herdnet, 'yolo': warm_up_yolo}[name](variant, CPU)
+    except Exception as e:
+        print(f"⚠️  Could not load the INT8 variant of {name}: {e}")
+        return
+
+    bundle['int8'] = variant
+    print(f"✓ INT8 variant of {name} loaded ({path.name})")
+
+
+def _evaluate_herdnet(model, bundle, image_dir, annotations, patch_size, overlap, radius, device):
+    """
+    Run HerdNet through the stitcher and evaluator of the API on annotated images.
+
+    Returns:
+        Tuple (metrics dictionary, detections DataFrame)
+    """
+    import albumentations as A
+    from animaloc.data.transforms import DownSample
+    from animaloc.datasets import CSVDataset
+    from animaloc.eval import HerdNetEvaluator, HerdNetStitcher
+    from animaloc.eval.metrics import PointsMetrics
+    from torch.utils.data import DataLoader, SequentialSampler
+
+    dataset = CSVDataset(
+        csv_file=annotations,
+        root_dir=str(image_dir),
+        albu_transforms=[A.Normalize(mean=bundle['mean'], std=bundle['std'])],
+        end_transforms=[DownSample(down_ratio=2, anno_type='point')]
+    )
+    stitcher = HerdNetStitcher(model=model, size=(patch_size, patch_size), overlap=overlap, down_ratio=2,
+                               up=True, reduction='mean', device_name=device)
+    metrics = PointsMetrics(radius, num_classes=bundle['num_classes'])
+    work_dir = tempfile.mkdtemp()
+    evaluator = HerdNetEvaluator(
+        model=model,
+        dataloader=DataLoader(dataset, batch_size=1, shuffle=False, sampler=SequentialSampler(dataset)),
+        metrics=metrics,
+        lmds_kwargs=dict(kernel_size=(3, 3), adapt_ts=0.2, neg_ts=0.1),
+        device_name=device,
+        print_freq=100,
+        stitcher=stitcher,
+        work_dir=work_dir,
+        header='[QUANTIZATION]'
+    )
+
+    start_time = time.perf_counter()
+    evaluator.evaluate(wandb_flag=False, viz=False, log_meters=False)
+    seconds = time.perf_counter() - start_time
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    detections = evaluator.detections.dropna()
+    return {
+        'precision': round(float(metrics.precision()), 4),
+        'recall': round(float(metrics.recall()), 4),
+        'f1_score': round(float(metrics.fbeta_score()), 4),
+        'mae': round(float(metrics.mae()), 4),
+        'detections': len(detections),
+        'seconds_per_image': round(seconds / len(dataset), 4)
+    }, detections
+
+
+def evaluate_herdnet(bundle, weights_path, int8_path, image_dir, annotations_csv, patch_size, overlap, radius):
+    """
+    Compare the FP32 and INT8 HerdNet models with PointsMetrics.
+
+    Without ground truth annotations, the FP32 detections are used as reference.
+    """
+    import pandas as pd
+    from animaloc.models import LossWrapper
+
+    from model_registry import device
+
+    fp32_model = bundle['model']
+    int8_model = LossWrapper(OnnxModule(create_session(int8_path, CPU)), [])
+    int8_model.eval()
+
+    if annotations_csv:
+        annotations = pd.read_csv(annotations_csv)
+        reference = 'ground truth'
+    else:
+        images = [p.name for p in _image_paths(image_dir)]
+        placeholder = pd.DataFrame({'images': images, 'x': [0] * len(images), 'y': [0] * len(images),
+                                    'labels': [1] * len(images)})
+        _, detections = _evaluate_herdnet(fp32_model, bundle, image_dir, placeholder, patch_size, overlap,
+                                          radius, device)
+        # Images without FP32 detections have no reference points and are left out
+        annotations = detections[['images', 'x', 'y', 'labels']].astype({'labels': int})
+        reference = 'fp32 detections'
+
+    fp32, _ = _evaluate_herdnet(fp32_model, bundle, image_dir, annotations, patch_size, overlap, radius, device)
+    int8, _ = _evaluate_herdnet(int8_model, bundle, image_dir, annotations, patch_size, overlap, radius, CPU)
+    return reference, fp32, int8
+
+
+def _pseudo_labeled_dataset(model, image_paths, img_size, dataset_dir, classes):
+    """Write a YOLO dataset labeled with the FP32 detections and return its data.yaml."""
+    import yaml
+
+    images_dir, labels_dir = Path(dataset_dir) / 'images', Path(dataset_dir) / 'labels'
+    images_dir.mkdir(parents=True)
+    labels_dir.mkdir()
+    for path in image_paths:
+        os.symlink(path.resolve(), images_dir / path.name)
+        boxes = model.predict(source=str(path), imgsz=img_size, verbose=False)[0].boxes
+        with open(labels_dir / f"{path.stem}.txt", 'w') as f:
+            for cls, box in zip(boxes.cls.cpu().numpy(), boxes.xywhn.cpu().numpy()):
+                f.write(f"{int(cls)} {' '.join(f'{v:.6f}' for v in box)}\n")
+
+    data_path = Path(dataset_dir) / 'data.yaml'
+    with open(data_path, 'w') as f:
+        yaml.safe_dump({'path': str(Path(dataset_dir).resolve()), 'train': 'images', 'val': 'images',
+                        'names': dict(classes)}, f)
+    return data_path
+
+
+def evaluate_yolo(bundle, int8_path, image_dir, data_yaml, img_size):
+    """
+    Compare the FP32 and INT8 YOLOv11 models by mAP.
+
+    Without a ground truth dataset (data.yaml), the FP32 detections are used as reference.
+    """
+    from ultralytics import YOLO
+
+    from model_registry import device
+
+    def evaluate(model, data, model_device):
+        results = model.val(data=str(data), imgsz=img_size, batch=1, plots=False, verbose=False,
+                            device='cpu' if model_device.type == 'cpu' else model_device.index or 0)
+        return {
+            'map50': round(float(results.box.map50), 4),
+            'map50_95': round(float(results.box.map), 4),
+            'seconds_per_image': round(results.speed['inference'] / 1000, 4)
+        }
+
+    fp32_model = bundle['eager_model']
+    with tempfile.TemporaryDirectory() as dataset_dir:
+        if data_yaml:
+            data, reference = data_yaml, 'ground truth'
+        else:
+            data = _pseudo_labeled_dataset(fp32_model, _image_paths(image_dir), img_size, dataset_dir,
+                                           bundle['classes'])
+            reference = 'fp32 detections'
+        fp32 = evaluate(fp32_model, data, device)
+        int8 = evaluate(YOLO(str(int8_path), task='detect'), data, CPU)
+    return reference, fp32, int8
+
+
+def _report(name, int8_path, reference, fp32, int8, calibration):
+    """Print the accuracy delta and save it next to the INT8 model."""
+    delta = {key: round(int8[key] - fp32[key], 4) for key in fp32 if key != 'seconds_per_image'}
+    speedup = round(fp32['seconds_per_image'] / int8['seconds_per_image'], 2) if int8['seconds_per_image'] else None
+    report = {
+        'model': name,
+        'int8_model': int8_path.name,
+        'reference': reference,
+        'calibration': calibration,
+        'fp32': fp32,
+        'int8': int8,
+        'delta': delta,
+        'speedup': speedup
+    }
+    with open(int8_path.with_suffix('.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{name}: FP32 vs INT8 (reference: {reference})")
+    for key in fp32:
+        change = f"  ({delta[key]:+.4f})" if key in delta else ''
+        print(f"  {key:<18} {fp32[key]:>10} {int8[key]:>10}{change}")
+    if speedup:
+        print(f"  INT8 speed-up: x{speedup}")
+    return report
+
+
+def main():
+    import argparse
+
+    from model_registry import load_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('models', nargs='*', default=['herdnet', 'yolo'], help="Models to quantize (default: both)")
+    parser.add_argument('--tiles', required=True, help="Folder of representative tiles for calibration")
+    parser.add_argument('--max-samples', type=int, default=64, help="Calibration inputs per model")
+    parser.add_argument('--method', default='minmax', help="Calibration method: minmax, entropy or percentile")
+    parser.add_argument('--eval-images', help="Folder of images for the accuracy report (default: --tiles)")
+    parser.add_argument('--herdnet-annotations', help="Ground truth CSV (images, x, y, labels) for HerdNet")
+    parser.add_argument('--yolo-data', help="Ground truth dataset (data.yaml) for YOLOv11")
+    parser.add_argument('--patch-size', type=int, default=WARMUP_PATCH_SIZE, help="HerdNet patch_size")
+    parser.add_argument('--overlap', type=int, default=160, help="HerdNet overlap")
+    parser.add_argument('--radius', type=int, default=5, help="PointsMetrics matching radius (pixels)")
+    parser.add_argument('--img-size', type=int, default=WARMUP_IMG_SIZE, help="YOLOv11 img_size")
+    parser.add_argument('--skip-report', action='store_true', help="Only write the quantized models")
+    args = parser.parse_args()
+
+    if ort is None:
+        raise SystemExit("❌ onnxruntime is not installed (pip install onnxruntime)")
+    if args.method not in ('minmax', 'entropy', 'percentile'):
+        raise SystemExit(f"❌ Unknown calibration method: {args.method}")
+    tiles = _image_paths(args.tiles)
+    if not tiles:
+        raise SystemExit(f"❌ No images found in {args.tiles}")
+    eval_images = args.eval_images or args.tiles
+    if not args.skip_report and not args.eval_images:
+        print("⚠️  Evaluating on the calibration tiles; use --eval-images for a held-out set")
+
+    rng = np.random.default_rng(0)
+    calibration = {'tiles': str(args.tiles), 'images': len(tiles), 'max_samples': args.max_samples,
+                   'method': args.method}
+    ONNX_DIR.mkdir(parents=True, exist_ok=True)
+
+    for name in args.models:
+        bundle, weights_path = load_model(name)
+        int8_path = quantized_path(name, weights_path)
+        shuffled = [tiles[i] for i in rng.permutation(len(tiles))]
+        print(f"\n⏳ Quantizing {name} with {args.method} calibration on {args.tiles}...")
+
+        if name == 'herdnet':
+            fp32_path = herdnet_onnx_path(weights_path, CPU)
+            if not fp32_path.exists():
+                export_herdnet(bundle['model'].model, fp32_path)
+            samples = _herdnet_patches(shuffled, bundle['mean'], bundle['std'], args.patch_size)
+        else:
+            use_onnx_yolo(bundle, weights_path, CPU)
+            fp32_path = Path(bundle['onnx_path'])
+            samples = _yolo_frames(shuffled, args.img_size)
+
+        quantize_model(fp32_path, int8_path, samples, args.max_samples, args.method)
+        print(f"✓ {int8_path} ({fp32_path.stat().st_size / 1024 / 1024:.1f} MB -> "
+              f"{int8_path.stat().st_size / 1024 / 1024:.1f} MB)")
+
+        if args.skip_report:
+            continue
+        if name == 'herdnet':
+            reference, fp32, int8 = evaluate_herdnet(bundle, weights_path, int8_path, eval_images,
+                                                     args.herdnet_annotations, args.patch_size, args.overlap,
+                                                     args.radius)
+        else:
+            reference, fp32, int8 = evaluate_yolo(bundle, int8_path, eval_images, args.yolo_data, args.img_size)
+        _report(name, int8_path, reference, fp32, int8, calibration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Result Store - Content-addressed, zstd-compressed sidecar storage for large task result blobs
+
+Complete analysis responses (with every base64 image) are kept out of SQLite: the database only
+stores the blob reference (SHA-256 of the uncompressed JSON) and its sizes.
+"""
+
+import hashlib
+import os
+import uuid
+from pathlib import Path
+
+import zstandard
+
+# Blob storage configuration (from environment variables or defaults)
+RESULT_STORE_DIR = Path(os.environ.get('RESULT_STORE_DIR', Path(__file__).parent / 'results' / 'blobs'))
+RESULT_COMPRESSION_LEVEL = int(os.environ.get('RESULT_COMPRESSION_LEVEL', 3))
+
+BLOB_EXTENSION = '.json.zst'
+
+
+def blob_path(ref):
+    """Path of a blob (sharded by the first two hex digits of its reference)."""
+    return RESULT_STORE_DIR / ref[:2] / f"{ref}{BLOB_EXTENSION}"
+
+
+def put_blob(data):
+    """
+    Compress and store a blob. Storing the same content twice is a no-op.
+
+    Blobs are written to a temporary file and renamed into place, so readers never
+    see a partially written blob.
+
+    Args:
+        data: Uncompressed bytes (UTF-8 JSON)
+
+    Returns:
+        Tuple (reference, stored size in bytes)
+    """
+    ref = hashlib.sha256(data).hexdigest()
+    path = blob_path(ref)
+    if path.exists():
+        return ref, path.stat().st_size
+
+    compressed = zstandard.ZstdCompressor(level=RESULT_COMPRESSION_LEVEL).compress(data)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    return ref, len(compressed)
+
+
+def get_blob(ref):
+    """Read and decompress a blob. Raises FileNotFoundError if it does not exist."""
+    with open(blob_path(ref), 'rb') as f:
+        return zstandard.ZstdDecompressor().decompress(f.read())
+
+
+def delete_blob(ref):
+    """Delete a blob. Returns the number of bytes freed (0 if it did not exist)."""
+    path = blob_path(ref)
+    try:
+        size = path.stat().st_size
+        path.unlink()
+    except FileNotFoundError:
+        return 0
+    return size
+
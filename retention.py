@@ -0,0 +1,272 @@
+"""
+Retention - Archives and prunes old tasks so the database stays within an age and size budget,
+then returns the freed space to the filesystem with incremental vacuum
+
+Usage:
+    python retention.py [--days 180] [--max-db-mb 2048] [--statuses completed,failed] [--no-archive]
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import zstandard
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: each process runs its own passes (single-process development setup)
+    fcntl = None
+
+import database
+from database import (get_task_by_id, iter_task_detections, find_expired_tasks, delete_tasks,
+                      get_database_size, incremental_vacuum)
+from result_store import delete_blob
+from tiles import delete_task_pyramids
+
+# Retention policy (from environment variables or defaults)
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 0))  # 0 = no age limit
+RETENTION_MAX_DB_MB = int(os.environ.get('RETENTION_MAX_DB_MB', 0))  # 0 = no size budget
+RETENTION_STATUSES = tuple(
+    s.strip() for s in os.environ.get('RETENTION_STATUSES', 'completed,failed').split(',') if s.strip()
+)
+RETENTION_ARCHIVE = os.environ.get('RETENTION_ARCHIVE', 'true').lower() in ('true', '1', 'yes', 'on')
+RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE', 50))
+# Hours between background retention runs in the API process (0 = disabled)
+RETENTION_INTERVAL_HOURS = float(os.environ.get('RETENTION_INTERVAL_HOURS', 0))
+
+ARCHIVE_DIR = Path(os.environ.get('ARCHIVE_DIR', Path(__file__).parent / 'archive'))
+ARCHIVE_COMPRESSION_LEVEL = int(os.environ.get('ARCHIVE_COMPRESSION_LEVEL', 9))
+
+
+def archive_path(task):
+    """Archive file of a task: ARCHIVE_DIR/<YYYY-MM>/<task_id>.json.zst"""
+    return ARCHIVE_DIR / task['created_at'][:7] / f"{task['task_id']}.json.zst"
+
+
+def archive_task(task_id):
+    """
+    Write a task, its complete result and its detections to a compressed archive file.
+
+    Returns:
+        Bytes written (0 if the task does not exist)
+    """
+    try:
+        task = get_task_by_id(task_id)
+    except FileNotFoundError:
+        # Result blob already missing from the store: archive what is left
+        task = get_task_by_id(task_id, include_result=False)
+    if task is None:
+        return 0
+
+    task['detections'] = list(iter_task_detections(task_id, limit=-1))
+    data = zstandard.ZstdCompressor(level=ARCHIVE_COMPRESSION_LEVEL).compress(json.dumps(task).encode('utf-8'))
+
+    path = archive_path(task)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    return len(data)
+
+
+def read_archive(path):
+    """Read an archived task (task fields, result_data and detections)."""
+    with open(path, 'rb') as f:
+        return json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+
+
+def _prune(task_ids, archive):
+    """Archive (optionally) and delete a batch of tasks with their blobs and tiles."""
+    archived_bytes = sum(archive_task(task_id) for task_id in task_ids) if archive else 0
+    deleted = delete_tasks(task_ids)
+
+    # Files are removed only after the rows are gone, so a failed delete loses nothing
+    files_bytes = sum(delete_blob(ref) for ref in deleted['unreferenced_result_refs'])
+    files_bytes += sum(delete_task_pyramids(task_id) for task_id in task_ids)
+
+    return deleted['tasks'], deleted['detections'], archived_bytes, files_bytes
+
+
+def apply_retention(days=None, max_db_mb=None, statuses=None, archive=None, batch_size=None):
+    """
+    Apply the retention policy and reclaim the freed space.
+
+    Tasks older than `days` are pruned, then the oldest remaining tasks are pruned until
+    the database uses at most `max_db_mb`. Only tasks with one of `statuses` are eligible.
+    Tasks are deleted in small batches (one short transaction each) and the space is
+    released with incremental vacuum, so the API keeps serving throughout.
+
+    Args:
+        days: Maximum task age in days (0 = no age limit)
+        max_db_mb: Database size budget in MB (0 = no budget)
+        statuses: Statuses eligible for pruning
+        archive: Archive each task to ARCHIVE_DIR before deleting it
+        batch_size: Tasks per delete transaction
+
+    Returns:
+        Report dictionary with pruned tasks/detections and archived/reclaimed bytes
+    """
+    days = RETENTION_DAYS if days is None else days
+    max_db_mb = RETENTION_MAX_DB_MB if max_db_mb is None else max_db_mb
+    statuses = RETENTION_STATUSES if statuses is None else tuple(statuses)
+    archive = RETENTION_ARCHIVE if archive is None else archive
+    batch_size = batch_size or RETENTION_BATCH_SIZE
+
+    start_time = time.perf_counter()
+    report = {'tasks_pruned': 0, 'detections_pruned': 0, 'archived_bytes': 0, 'files_bytes_freed': 0}
+
+    def prune(task_ids):
+        tasks, detections, archived_bytes, files_bytes = _prune(task_ids, archive)
+        report['tasks_pruned'] += tasks
+        report['detections_pruned'] += detections
+        report['archived_bytes'] += archived_bytes
+        report['files_bytes_freed'] += files_bytes
+
+    # Age limit
+    if days > 0:
+        created_before = datetime.now() - timedelta(days=days)
+        while True:
+            task_ids = find_expired_tasks(created_before, statuses, limit=batch_size)
+            if not task_ids:
+                break
+            prune(task_ids)
+
+    # Size budget (free pages do not count: they are reused or released by the vacuum below)
+    if max_db_mb > 0:
+        budget = max_db_mb * 1024 * 1024
+        while get_database_size()['used_bytes'] > budget:
+            task_ids = find_expired_tasks(None, statuses, limit=batch_size)
+            if not task_ids:
+                print(f"⚠️  Database still above {max_db_mb} MB but no more tasks are eligible for retention")
+                break
+            prune(task_ids)
+
+    report['db_bytes_reclaimed'] = incremental_vacuum()
+    report['db_size_bytes'] = get_database_size()['total_bytes']
+    report['elapsed_seconds'] = round(time.perf_counter() - start_time, 2)
+
+    print(f"✓ Retention: pruned {report['tasks_pruned']} tasks ({report['detections_pruned']} detections), "
+          f"archived {report['archived_bytes'] / 1024 / 1024:.1f} MB, "
+          f"reclaimed {(report['db_bytes_reclaimed'] + report['files_bytes_freed']) / 1024 / 1024:.1f} MB "
+          f"in {report['elapsed_seconds']}s")
+    return report
+
+
+@contextmanager
+def _retention_lock(blocking=True):
+    """
+    Exclusive lock of the database's retention passes, shared by every process using it.
+
+    The lock file also records when the last pass started (see _last_pass / _mark_pass).
+    Without fcntl (Windows) the file is not locked.
+
+    Yields:
+        The open lock file, or None if blocking is False and another process holds the lock
+    """
+    path = database.DB_PATH.with_name(f".{database.DB_PATH.name}.retention.lock")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a+') as lock_file:
+        if fcntl is None:
+            yield lock_file
+            return
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield None
+            return
+        try:
+            yield lock_file
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _last_pass(lock_file):
+    """Start time of the last retention pass (0 if none was recorded)."""
+    lock_file.seek(0)
+    try:
+        return float(lock_file.read().strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def _mark_pass(lock_file):
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(time.time()))
+    lock_file.flush()
+
+
+def start_retention_worker(interval_hours=None):
+    """
+    Run apply_retention() periodically in a daemon thread.
+
+    Every API worker process starts this thread, but the passes are coordinated through
+    _retention_lock: a process only runs a pass when no other one is running and the last
+    pass of any process started at least interval_hours ago, so the database gets one pass
+    per interval whatever the number of workers.
+
+    Returns:
+        The thread, or None if the interval is 0 or no retention limit is configured
+    """
+    interval_hours = RETENTION_INTERVAL_HOURS if interval_hours is None else interval_hours
+    if interval_hours <= 0 or (RETENTION_DAYS <= 0 and RETENTION_MAX_DB_MB <= 0):
+        return None
+    interval = interval_hours * 3600
+
+    def run():
+        while True:
+            try:
+                with _retention_lock(blocking=False) as lock_file:
+                    if lock_file is not None and time.time() - _last_pass(lock_file) >= interval:
+                        _mark_pass(lock_file)
+                        apply_retention()
+            except Exception as e:
+                print(f"❌ Retention run failed: {e}")
+            # Checked more often than the interval so another process takes over if the last one stops
+            time.sleep(interval / 4)
+
+    thread = threading.Thread(target=run, name='retention-worker', daemon=True)
+    thread.start()
+    print(f"✓ Retention worker started (every {interval_hours:g}h, "
+          f"days={RETENTION_DAYS}, max_db_mb={RETENTION_MAX_DB_MB})")
+    return thread
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help="Maximum task age in days (0 = no limit)")
+    parser.add_argument('--max-db-mb', type=int, default=RETENTION_MAX_DB_MB,
+                        help="Database size budget in MB (0 = no budget)")
+    parser.add_argument('--statuses', default=','.join(RETENTION_STATUSES),
+                        help="Comma-separated statuses eligible for pruning")
+    parser.add_argument('--no-archive', action='store_true', help="Delete without archiving")
+    args = parser.parse_args()
+
+    # Waits for a pass of the API's retention worker to finish
+    with _retention_lock() as lock_file:
+        _mark_pass(lock_file)
+        report = apply_retention(
+            days=args.days,
+            max_db_mb=args.max_db_mb,
+            statuses=[s.strip() for s in args.statuses.split(',') if s.strip()],
+            archive=RETENTION_ARCHIVE and not args.no_archive
+        )
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,578 @@
+"""
+HerdNet Stitching - Runs HerdNet over whole frames, with a memory-bounded streaming stitcher for large images
+
+animaloc's HerdNetStitcher(up=True, reduction='mean') builds the heatmap and class maps of the whole
+frame at full resolution (1 + num_classes float32 channels) before LMDS, so memory grows with the
+image area and 20k x 20k orthomosaics cannot be processed. The streaming stitcher reads and runs one
+row of patches at a time and keeps only the rows that later patches still overlap:
+
+    - Patch outputs are upsampled like in HerdNetStitcher and averaged where patches overlap (over the
+      patches that were run: those skipped by the empty-tile filter are left out).
+    - Once the next row of patches no longer touches a band of rows, the band is final: LMDS local
+      maxima are searched in it, using the last rows of the previous band as context, so a point on
+      a band seam is found exactly once.
+    - Only candidate points are kept. LMDS's adaptive threshold (adapt_ts x maximum of the heatmap)
+      is applied with the running maximum while streaming and with the final one at the end.
+
+The float32 maps are bounded by one band (patch_size rows x image width) whatever the image height;
+ImageSource still decodes the uint8 frame (3 bytes per pixel, against 4 x (1 + num_classes) for
+the full-resolution maps), while GeoTIFFs are read window by window (geotiff.RasterSource).
+
+Stitcher modes (HERDNET_STITCHER, or 'stitcher' per request):
+    full:           animaloc HerdNetStitcher + HerdNetEvaluator (same as infer.py)
+    streaming:      streaming stitcher for every image
+    auto:           streaming stitcher for images above STREAMING_MIN_PIXELS, full otherwise
+    coarse_to_fine: two passes (see CoarseToFineStitcher): HerdNet first runs on the frame reduced
+                    COARSE_SCALE times, and the streaming stitcher then runs only the full-resolution
+                    patches where the coarse heatmap reaches COARSE_THRESHOLD
+GeoTIFFs always use the streaming stitcher (or coarse_to_fine when requested).
+
+YOLOv11 resizes a whole image to img_size; GeoTIFFs instead go through predict_yolo_tiled, which
+runs native-resolution tiles read from the same frame sources.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn.functional as F
+from PIL import Image
+
+from geotiff import RasterSource, is_geotiff
+from preprocessing import herdnet_dataset, herdnet_input_model
+from tile_filter import (EMPTY_TILE_THRESHOLD, EmptyTileFilter, KeptShare, kept_patches, texture_scores,
+                         tile_counts)
+
+STITCHER_MODES = ('auto', 'full', 'streaming', 'coarse_to_fine')
+
+# Stitcher configuration (from environment variables or defaults): auto, full, streaming or coarse_to_fine
+HERDNET_STITCHER = os.environ.get('HERDNET_STITCHER', 'auto').lower()
+if HERDNET_STITCHER not in STITCHER_MODES:
+    print(f"⚠️  Unknown HERDNET_STITCHER={HERDNET_STITCHER} (expected {', '.join(STITCHER_MODES)}), using auto")
+    HERDNET_STITCHER = 'auto'
+# Images above this many pixels use the streaming stitcher in auto mode
+STREAMING_MIN_PIXELS = int(os.environ.get('STREAMING_MIN_PIXELS', 40_000_000))
+# Patches per forward pass of the streaming stitcher (and tiles per prediction of sliced YOLO)
+STREAMING_BATCH_SIZE = int(os.environ.get('STREAMING_BATCH_SIZE', 4))
+# Downsampling factor of the coarse pass of coarse_to_fine
+COARSE_SCALE = int(os.environ.get('COARSE_SCALE', 4))
+# Coarse heatmap value from which the full-resolution patches are run (lower = safer recall, more patches)
+COARSE_THRESHOLD = float(os.environ.get('COARSE_THRESHOLD', 0.05))
+# Overlap between the tiles of sliced YOLO (GeoTIFF inputs)
+YOLO_TILE_OVERLAP = int(os.environ.get('YOLO_TILE_OVERLAP', 64))
+
+LMDS_KWARGS = dict(kernel_size=(3, 3), adapt_ts=0.2, neg_ts=0.1)
+DETECTION_COLUMNS = ['images', 'x', 'y', 'labels', 'scores', 'dscores']
+
+
+def parse_stitcher_mode(value):
+    """Stitcher mode of a request (None = HERDNET_STITCHER)."""
+    mode = (value or HERDNET_STITCHER).lower()
+    if mode not in STITCHER_MODES:
+        raise ValueError(f"Unknown stitcher '{mode}' (expected {', '.join(STITCHER_MODES)})")
+    return mode
+
+
+class ImageSource:
+    """Frame of an image file (or of a PIL image) read band by band as uint8 CHW tensors."""
+
+    def __init__(self, path, rotation=0):
+        image = path if isinstance(path, Image.Image) else Image.open(path)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        if rotation % 4:
+            # Same orientation as the plots of the API
+            image = image.rotate(90 * rotation, expand=True)
+        self.image = image
+        self.width, self.height = image.size
+
+    def read(self, x0, y0, x1, y1):
+        """Window of the frame; areas outside the image are black."""
+        window = self.image.crop((x0, y0, x1, y1))
+        return torch.from_numpy(np.array(window)).permute(2, 0, 1)
+
+    def crop(self, box):
+        """PIL image of a window of the frame."""
+        return self.image.crop(box)
+
+    def preview(self, max_size=None):
+        """The frame itself, at scale 1 (see geotiff.RasterSource.preview)."""
+        return self.image, 1.0
+
+    def downsample(self, factor):
+        """PIL image of the frame reduced by an integer factor (block average)."""
+        return self.image.reduce(factor)
+
+    def geo_coordinates(self, xs, ys):
+        """Image files are not georeferenced."""
+        return None
+
+    def close(self):
+        self.image.close()
+
+
+def open_source(path, rotation=0):
+    """Frame source of an image file (windowed RasterSource for GeoTIFFs when rasterio is installed)."""
+    if is_geotiff(path):
+        return RasterSource(path, rotation)
+    return ImageSource(path, rotation)
+
+
+def _origins(length, size, stride):
+    """Patch origins along one axis (the last patch may extend past the image)."""
+    origins = [0]
+    while origins[-1] + size < length:
+        origins.append(origins[-1] + stride)
+    return origins
+
+
+class StreamingStitcher:
+    """
+    Memory-bounded HerdNet stitcher with LMDS per band (see module docstring).
+
+    Args:
+        model: HerdNet model (LossWrapper, or herdnet_input_model for uint8 frames)
+        size: Patch size
+        overlap: Overlap between patches
+        batch_size: Patches per forward pass
+        down_ratio: Down-sampling ratio of the heatmap
+        device: Device of the model
+        lmds_kwargs: kernel_size, adapt_ts and neg_ts of LMDS
+    """
+
+    def __init__(self, model, size, overlap, batch_size=STREAMING_BATCH_SIZE, down_ratio=2, device='cpu',
+                 lmds_kwargs=None):
+        if not 0 <= overlap < size:
+            raise ValueError(f"overlap must be between 0 and the patch size ({size})")
+        lmds_kwargs = dict(LMDS_KWARGS, **(lmds_kwargs or {}))
+        self.model = model
+        self.size = size
+        self.stride = size - overlap
+        self.batch_size = batch_size
+        self.down_ratio = down_ratio
+        self.device = torch.device(device)
+        self.kernel_size = tuple(lmds_kwargs['kernel_size'])
+        self.adapt_ts = lmds_kwargs['adapt_ts']
+        self.neg_ts = lmds_kwargs['neg_ts']
+
+    def _patch_maps(self, patches):
+        """Heatmap and class maps of a patch batch at patch resolution (B, 1 + num_classes, size, size)."""
+        with torch.no_grad():
+            heatmap, clsmap = self.model(patches.to(self.device))[0]
+        heatmap = F.interpolate(heatmap.float(), scale_factor=self.down_ratio, mode='bilinear', align_corners=True)
+        clsmap = F.interpolate(clsmap.float(), size=heatmap.shape[-2:], mode='nearest')
+        return torch.cat([heatmap, clsmap], dim=1).cpu()
+
+    def _peaks(self, buffer, start, end):
+        """
+        LMDS local maxima of a band of final maps.
+
+        Returns:
+            Tensor (N, 5) of row, column, label, score and heatmap value, with rows relative to the buffer
+        """
+        heat = buffer[0]
+        pad = (self.kernel_size[0] // 2, self.kernel_size[1] // 2)
+        pooled = F.max_pool2d(heat[None, None], self.kernel_size, stride=1, padding=pad)[0, 0]
+        peaks = (pooled == heat) & (heat > 0)
+        peaks[:start] = False
+        peaks[end:] = False
+        rows, cols = peaks.nonzero(as_tuple=True)
+
+        logits = buffer[1:, rows, cols]
+        cls_idx = logits[1:].argmax(dim=0)
+        scores = torch.softmax(logits, dim=0)[1:][cls_idx, torch.arange(len(cls_idx))]
+        return torch.stack([rows.float(), cols.float(), (cls_idx + 1).float(), scores, heat[rows, cols]], dim=1)
+
+    def grid(self, width, height):
+        """Patch origins (xs, ys) over a frame."""
+        return _origins(width, self.size, self.stride), _origins(height, self.size, self.stride)
+
+    def __call__(self, source, active=None):
+        """
+        Detect points in a frame.
+
+        Args:
+            source: Frame with width, height and read(x0, y0, x1, y1) returning uint8 CHW tensors
+            active: Boolean array (rows, columns of grid()) of the patches to run (None = all);
+                    the other patches are not read and leave empty maps
+
+        Returns:
+            List of (x, y, label, score, dscore) in frame pixels
+        """
+        size, stride = self.size, self.stride
+        width, height = source.width, source.height
+        xs, ys = self.grid(width, height)
+        padded_width = xs[-1] + size
+        context = self.kernel_size[0] // 2
+
+        sums = None
+        counts = torch.zeros(size, padded_width)
+        tail = None
+        candidates = []
+        heat_max = 0.0
+
+        for row, y0 in enumerate(ys):
+            row_xs = xs if active is None else [x for x, run in zip(xs, active[row]) if run]
+            band = source.read(0, y0, padded_width, y0 + size) if row_xs else None
+            for i in range(0, len(row_xs), self.batch_size):
+                batch_xs = row_xs[i:i + self.batch_size]
+                maps = self._patch_maps(torch.stack([band[:, :, x:x + size] for x in batch_xs]))
+                if sums is None:
+                    sums = torch.zeros(maps.shape[1], size, padded_width)
+                for x, patch_maps, run in zip(batch_xs, maps, kept_patches(self.model, len(batch_xs))):
+                    if run:
+                        sums[:, :, x:x + size] += patch_maps
+                        counts[:, x:x + size] += 1
+            del band
+            if sums is None:
+                # No patch run yet: the rows above hold no point
+                continue
+
+            # Rows that no later patch overlaps are final
+            last = row == len(ys) - 1
+            final_rows = height - y0 if last else stride
+            strip = sums[:, :final_rows, :width] / counts[:final_rows, :width].clamp(min=1)
+            if not last:
+                sums = torch.cat([sums[:, stride:], torch.zeros_like(sums[:, :stride])], dim=1)
+                counts = torch.cat([counts[stride:], torch.zeros_like(counts[:stride])], dim=0)
+
+            heat_max = max(heat_max, strip[0].max().item())
+
+            # LMDS on the band, with the last rows of the previous band as context above it
+            buffer = strip if tail is None else torch.cat([tail, strip], dim=1)
+            offset = y0 - (0 if tail is None else tail.shape[1])
+            start = 0 if tail is None else context
+            end = buffer.shape[1] if last else buffer.shape[1] - context
+            peaks = self._peaks(buffer, start, end)
+            peaks[:, 0] += offset
+            candidates.append(peaks)
+            tail = buffer[:, buffer.shape[1] - 2 * context:]
+
+            # Candidates below the running adaptive threshold can never pass the final one
+            candidates = [c[c[:, 4] >= self.adapt_ts * heat_max] for c in candidates]
+
+        if heat_max < self.neg_ts or not candidates:
+            return []
+        points = torch.cat(candidates)
+        points = points[points[:, 4] >= self.adapt_ts * heat_max]
+        return [(float(c), float(r), int(label), float(score), float(dscore))
+                for r, c, label, score, dscore in points.tolist()]
+
+
+class CoarseToFineStitcher(StreamingStitcher):
+    """
+    Two-pass HerdNet stitcher for large frames with clustered animals.
+
+    The coarse pass runs HerdNet over the frame reduced scale times (block average) and keeps its
+    heatmap; the fine pass is the streaming stitcher restricted to the full-resolution patches whose
+    area reaches threshold in the coarse heatmap. Points, labels and scores come from the fine pass
+    only, so the output is the same as the streaming stitcher's wherever the patches are run.
+
+    Args:
+        scale: Downsampling factor of the coarse pass
+        threshold: Coarse heatmap value from which a full-resolution patch is run
+        coarse_model: Model of the coarse pass (None = model); reduced patches are not full-resolution
+            patches, so it should not be wrapped by the empty-tile filter
+        Other arguments: see StreamingStitcher
+
+    total and skipped count the full-resolution patches of all frames and those not run.
+    """
+
+    def __init__(self, model, size, overlap, scale=COARSE_SCALE, threshold=COARSE_THRESHOLD, coarse_model=None,
+                 **kwargs):
+        super().__init__(model, size, overlap, **kwargs)
+        if scale < 1:
+            raise ValueError("scale must be at least 1")
+        self.coarse_model = model if coarse_model is None else coarse_model
+        self.scale = scale
+        self.threshold = threshold
+        self.total = 0
+        self.skipped = 0
+
+    def coarse_heatmap(self, source):
+        """
+        Heatmap of the reduced frame, averaged where patches overlap.
+
+        Returns:
+            Tensor (H, W) where each cell covers scale x down_ratio frame pixels per side
+        """
+        frame = ImageSource(source.downsample(self.scale))
+        size, ratio = self.size, self.down_ratio
+        xs, ys = self.grid(frame.width, frame.height)
+        sums = torch.zeros(-(-(ys[-1] + size) // ratio), -(-(xs[-1] + size) // ratio))
+        counts = torch.zeros_like(sums)
+        for y0 in ys:
+            band = frame.read(0, y0, xs[-1] + size, y0 + size)
+            for i in range(0, len(xs), self.batch_size):
+                batch_xs = xs[i:i + self.batch_size]
+                patches = torch.stack([band[:, :, x:x + size] for x in batch_xs])
+                with torch.no_grad():
+                    heatmap = self.coarse_model(patches.to(self.device))[0][0]
+                for x, patch_heat in zip(batch_xs, heatmap[:, 0].float().cpu()):
+                    rows, cols = patch_heat.shape
+                    sums[y0 // ratio:y0 // ratio + rows, x // ratio:x // ratio + cols] += patch_heat
+                    counts[y0 // ratio:y0 // ratio + rows, x // ratio:x // ratio + cols] += 1
+        frame.close()
+        return sums / counts.clamp(min=1)
+
+    def active_patches(self, source):
+        """Boolean array (rows, columns of grid()) of the full-resolution patches to run."""
+        heat = self.coarse_heatmap(source)
+        cell = self.scale * self.down_ratio
+        xs, ys = self.grid(source.width, source.height)
+        active = np.zeros((len(ys), len(xs)), dtype=bool)
+        for r, y0 in enumerate(ys):
+            rows = heat[y0 // cell:-(-(y0 + self.size) // cell)]
+            for c, x0 in enumerate(xs):
+                area = rows[:, x0 // cell:-(-(x0 + self.size) // cell)]
+                active[r, c] = area.numel() > 0 and area.max().item() >= self.threshold
+        return active
+
+    def __call__(self, source):
+        active = self.active_patches(source)
+        self.total += active.size
+        self.skipped += int(active.size - active.sum())
+        if not active.any():
+            return []
+        return super().__call__(source, active)
+
+
+def _use_streaming(path, mode):
+    # GeoTIFFs are never decoded whole
+    if mode in ('streaming', 'coarse_to_fine') or is_geotiff(path):
+        return True
+    if mode == 'full':
+        return False
+    with Image.open(path) as image:
+        return image.width * image.height > STREAMING_MIN_PIXELS
+
+
+def _kept_mean_stitcher(base):
+    """
+    Subclass of an animaloc stitcher (mean reduction) whose model is an EmptyTileFilter, averaging
+    overlapping patches over the patches that were run.
+
+    The frame is stitched a second time with KeptShare, which replays the filter's decisions; its
+    heatmap is the share of run patches over each pixel, by which the maps are divided.
+    """
+    class KeptMeanStitcher(base):
+        def __call__(self, image):
+            tile_filter = self.model
+            tile_filter.history = []
+            try:
+                maps = super().__call__(image)
+                share_model = KeptShare(tile_filter)
+            finally:
+                tile_filter.history = None
+            if all(bool(kept.all()) for _, kept in share_model.batches):
+                return maps
+
+            self.model = share_model
+            try:
+                share = super().__call__(image)[..., :1, :, :]
+            finally:
+                self.model = tile_filter
+            return torch.where(share > 0, maps / share.clamp(min=1e-6), maps)
+
+    return KeptMeanStitcher
+
+
+def _evaluate_full(model, herdnet, image_dir, img_names, patch_size, overlap, rotation, work_dir, header, device):
+    """Detections of animaloc's HerdNetStitcher and HerdNetEvaluator (same as infer.py)."""
+    from animaloc.eval import HerdNetEvaluator, HerdNetStitcher
+    from animaloc.eval.metrics import PointsMetrics
+    from torch.utils.data import DataLoader, SequentialSampler
+
+    dataset = herdnet_dataset(image_dir, img_names, herdnet['mean'], herdnet['std'], rotation)
+    dataloader = DataLoader(dataset, batch_size=1, shuffle=False, sampler=SequentialSampler(dataset))
+
+    stitcher_class = HerdNetStitcher
+    if isinstance(model, EmptyTileFilter) and model.threshold > 0:
+        stitcher_class = _kept_mean_stitcher(HerdNetStitcher)
+    stitcher = stitcher_class(
+        model=model,
+        size=(patch_size, patch_size),
+        overlap=overlap,
+        down_ratio=2,
+        up=True,
+        reduction='mean',
+        device_name=device
+    )
+    evaluator = HerdNetEvaluator(
+        model=model,
+        dataloader=dataloader,
+        metrics=PointsMetrics(5, num_classes=herdnet['num_classes']),
+        lmds_kwargs=LMDS_KWARGS,
+        device_name=device,
+        print_freq=1,
+        stitcher=stitcher,
+        work_dir=work_dir,
+        header=header
+    )
+    evaluator.evaluate(wandb_flag=False, viz=False, log_meters=False)
+    return evaluator.detections.dropna()
+
+
+def run_herdnet(herdnet, image_dir, img_names, patch_size=512, overlap=160, rotation=0, work_dir=None,
+                mode=None, header='[INFERENCE]', empty_tile_threshold=EMPTY_TILE_THRESHOLD, tile_stats=None):
+    """
+    Detect animals with HerdNet in images of a folder.
+
+    Args:
+        herdnet: Model dictionary (see model_registry.model_variant)
+        image_dir: Folder of the images
+        img_names: Image file names
+        patch_size, overlap: Stitching patch size and overlap
+        rotation: Number of 90-degree rotations
+        work_dir: Working directory of HerdNetEvaluator
+        mode: Stitcher mode (auto, full, streaming or coarse_to_fine; None = HERDNET_STITCHER)
+        empty_tile_threshold: Texture score below which patches are skipped (see tile_filter.py)
+        tile_stats: Dict where total_tiles and skipped_tiles are added (optional)
+
+    Returns:
+        DataFrame of detections (images, x, y, labels, scores, dscores) in image pixels
+    """
+    from model_registry import device
+
+    mode = parse_stitcher_mode(mode)
+    network = herdnet_input_model(herdnet)
+    model = EmptyTileFilter(network, empty_tile_threshold, herdnet['mean'], herdnet['std'])
+    streamed = [name for name in img_names if _use_streaming(os.path.join(image_dir, name), mode)]
+    regular = [name for name in img_names if name not in streamed]
+
+    frames = []
+    if regular:
+        frames.append(_evaluate_full(model, herdnet, image_dir, regular, patch_size, overlap, rotation, work_dir,
+                                     header, device))
+    if streamed:
+        if mode == 'coarse_to_fine':
+            stitcher = CoarseToFineStitcher(model, patch_size, overlap, coarse_model=network, device=device)
+        else:
+            stitcher = StreamingStitcher(model, patch_size, overlap, device=device)
+        for name in streamed:
+            print(f"{header} Streaming {name}...")
+            source = open_source(os.path.join(image_dir, name), rotation)
+            try:
+                points = stitcher(source)
+                frame = pd.DataFrame(points, columns=DETECTION_COLUMNS[1:])
+                geo = source.geo_coordinates(frame['x'], frame['y'])
+            finally:
+                source.close()
+            frame.insert(0, 'images', name)
+            if geo is not None:
+                frame['geo'] = geo
+            frames.append(frame)
+
+    counts = model.counts()
+    if streamed and mode == 'coarse_to_fine':
+        print(f"{header} Coarse pass selected {stitcher.total - stitcher.skipped}/{stitcher.total} "
+              f"full-resolution patches")
+        # The filter only sees the full-resolution patches run by the fine pass: add those left out
+        # by the coarse pass so total_tiles is the number of full-resolution patches
+        counts['total_tiles'] += stitcher.skipped
+        counts['skipped_tiles'] += stitcher.skipped
+    if tile_stats is not None:
+        for key, value in counts.items():
+            tile_stats[key] = tile_stats.get(key, 0) + value
+    if empty_tile_threshold > 0:
+        print(f"{header} Skipped {model.skipped}/{model.total} empty patches")
+
+    if not frames:
+        return pd.DataFrame(columns=DETECTION_COLUMNS)
+    detections = pd.concat(frames, ignore_index=True)
+    if 'geo' in detections:
+        detections['geo'] = detections['geo'].astype(object).where(detections['geo'].notna(), None)
+    return detections
+
+
+def _tile_edge_boxes(data, x0, y0, tile_size, width, height, margin=2):
+    """Whether each box (in frame pixels) touches an edge of its tile that is not a frame edge."""
+    return (((data[:, 0] <= x0 + margin) & (x0 > 0))
+            | ((data[:, 1] <= y0 + margin) & (y0 > 0))
+            | ((data[:, 2] >= x0 + tile_size - margin) & (x0 + tile_size < width))
+            | ((data[:, 3] >= y0 + tile_size - margin) & (y0 + tile_size < height)))
+
+
+def _merge_tile_boxes(data, edge, iou, min_coverage=0.5):
+    """
+    Merge the boxes of overlapping tiles.
+
+    Class-wise NMS ranks boxes cut by a tile edge after complete ones, then cut boxes mostly
+    covered by a kept complete box of the same class (the same animal seen whole in the
+    neighbouring tile) are dropped.
+    """
+    from torchvision.ops import batched_nms
+
+    keep = batched_nms(data[:, :4], data[:, 4] - edge.float(), data[:, 5].long(), iou)
+    data, edge = data[keep], edge[keep]
+    cut, whole = data[edge], data[~edge]
+    if len(cut) and len(whole):
+        lt = torch.max(cut[:, None, :2], whole[None, :, :2])
+        rb = torch.min(cut[:, None, 2:4], whole[None, :, 2:4])
+        inter = (rb - lt).clamp(min=0).prod(dim=2)
+        area = (cut[:, 2:4] - cut[:, :2]).prod(dim=1).clamp(min=1e-6)
+        covered = ((inter / area[:, None] > min_coverage) & (cut[:, None, 5] == whole[None, :, 5])).any(dim=1)
+        data = torch.cat([whole, cut[~covered]])
+    return data
+
+
+def predict_yolo_tiled(predictor, source, tile_size, overlap=YOLO_TILE_OVERLAP, conf=0.25, iou=0.45,
+                       batch_size=STREAMING_BATCH_SIZE, empty_tile_threshold=EMPTY_TILE_THRESHOLD, tile_stats=None):
+    """
+    Sliced YOLOv11 over a frame source, for frames too large to resize to a single input.
+
+    Tiles of tile_size are read one row at a time and predicted at native resolution; the boxes
+    of all tiles are merged with class-wise NMS at the iou threshold (see _merge_tile_boxes).
+
+    Args:
+        predictor: YOLOv11 model (see model_registry.yolo_predictor)
+        source: Frame with width, height and read(x0, y0, x1, y1) returning uint8 CHW tensors
+        tile_size: Tile size (also the inference size)
+        overlap: Overlap between tiles
+        empty_tile_threshold: Texture score below which tiles are not predicted (see tile_filter.py)
+        tile_stats: Dict where total_tiles and skipped_tiles are added (optional)
+
+    Returns:
+        ultralytics Boxes of the frame (xyxy, conf, cls in frame pixels)
+    """
+    from ultralytics.engine.results import Boxes
+
+    stride = max(tile_size - overlap, 1)
+    xs, ys = _origins(source.width, tile_size, stride), _origins(source.height, tile_size, stride)
+    rows, edges = [], []
+    counts = tile_counts()
+    for y0 in ys:
+        band = source.read(0, y0, xs[-1] + tile_size, y0 + tile_size)
+        row_xs = xs
+        counts['total_tiles'] += len(xs)
+        if empty_tile_threshold > 0:
+            scores = texture_scores(torch.stack([band[:, :, x:x + tile_size] for x in xs]))
+            row_xs = [x for x, score in zip(xs, scores.tolist()) if score >= empty_tile_threshold]
+            counts['skipped_tiles'] += len(xs) - len(row_xs)
+        for i in range(0, len(row_xs), batch_size):
+            batch_xs = row_xs[i:i + batch_size]
+            # ultralytics takes numpy frames in BGR order
+            tiles = [np.ascontiguousarray(band[:, :, x:x + tile_size].permute(1, 2, 0).numpy()[..., ::-1])
+                     for x in batch_xs]
+            results = predictor.predict(source=tiles, conf=conf, iou=iou, imgsz=tile_size, verbose=False)
+            for x0, result in zip(batch_xs, results):
+                data = result.boxes.data.float().cpu().clone()
+                data[:, [0, 2]] += x0
+                data[:, [1, 3]] += y0
+                rows.append(data)
+                edges.append(_tile_edge_boxes(data, x0, y0, tile_size, source.width, source.height))
+        del band
+
+    if tile_stats is not None:
+        for key, value in counts.items():
+            tile_stats[key] = tile_stats.get(key, 0) + value
+
+    data = torch.cat(rows) if rows else torch.zeros((0, 6))
+    edge = torch.cat(edges) if edges else torch.zeros(0, dtype=torch.bool)
+    data[:, [0, 2]] = data[:, [0, 2]].clamp(0, source.width)
+    data[:, [1, 3]] = data[:, [1, 3]].clamp(0, source.height)
+    # Boxes predicted on the black padding past the frame are empty once clamped
+    inside = (data[:, 2] > data[:, 0]) & (data[:, 3] > data[:, 1])
+    data = _merge_tile_boxes(data[inside], edge[inside], iou)
+    return Boxes(data[data[:, 4].argsort(descending=True)], (source.height, source.width))
@@ -3,6 +3,7 @@ Interfaz Web Streamlit para API de Detección de Fauna Silvestre
 """
 
 import streamlit as st
+import streamlit.components.v1 as components
 import requests
 import json
 import base64
@@ -104,6 +105,27 @@ HERDNET_THUMBNAIL_STEP = int(os.getenv("HERDNET_THUMBNAIL_STEP", "32"))
 PLOTLY_MAX_DIMENSION = int(os.getenv("PLOTLY_MAX_DIMENSION", "1500"))  # Max width or height for Plotly display
 PLOTLY_FALLBACK_THRESHOLD = int(os.getenv("PLOTLY_FALLBACK_THRESHOLD", "3000"))  # Use st.image for images larger than this
 
+# Deep Zoom Viewer Configuration
+# -------------------------------
+# The API generates DeepZoom tile pyramids; the browser fetches only the tiles in view
+# directly from the API, so full-resolution imagery never goes through the WebSocket
+ENABLE_DEEP_ZOOM = os.getenv("ENABLE_DEEP_ZOOM", "true").lower() in ("true", "1", "yes", "on")
+# API URL as seen from the user's browser (defaults to API_BASE_URL)
+API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", st.secrets.get("API_PUBLIC_URL", API_BASE_URL))
+OPENSEADRAGON_URL = os.getenv("OPENSEADRAGON_URL", "https://cdn.jsdelivr.net/npm/openseadragon@4.1/build/openseadragon")
+
+# Campos de tarea que pide la lista de resultados (proyección de /tasks)
+TASK_LIST_FIELDS = "task_id,model_type,status,filename,num_images,total_detections,processing_time_seconds,created_at"
+
+# Estado de cada modelo según /health
+MODEL_STATUS_LABELS = {
+    'ready': "✓ Cargado",
+    'not_loaded': "⏳ Se carga al primer uso",
+    'loading': "⏳ Cargando",
+    'failed': "✗ Error al cargar",
+    'disabled': "✗ No habilitado"
+}
+
 # Configuración de página
 st.set_page_config(
     page_title="Detección de Fauna Africana",
@@ -300,10 +322,10 @@ def new_analysis_page():
             st.success(f"✓ Estado del servicio: {health['status']}. La herramienta está lista para ser usada.")
         with col2:
             models_info = health.get('models', {})
-            yolo_status = "✓ Cargado" if models_info.get('yolov11', {}).get('loaded') else "✗ No cargado"
+            yolo_status = MODEL_STATUS_LABELS.get(models_info.get('yolov11', {}).get('status'), "✗ No cargado")
             
             if ENABLE_HERDNET:
-                herdnet_status = "✓ Cargado" if models_info.get('herdnet', {}).get('loaded') else "✗ No cargado"
+                herdnet_status = MODEL_STATUS_LABELS.get(models_info.get('herdnet', {}).get('status'), "✗ No cargado")
                 st.info(f"YOLOv11: {yolo_status} | HerdNet: {herdnet_status}")
             else:
                 st.info(f"YOLOv11: {yolo_status}")
@@ -464,7 +486,8 @@ def new_analysis_page():
                         'conf_threshold': conf_threshold,
                         'iou_threshold': iou_threshold,
                         'img_size': img_size,
-                        'include_annotated_images': str(include_annotated).lower()
+                        'include_annotated_images': str(include_annotated).lower(),
+                        'include_tiles': str(ENABLE_DEEP_ZOOM).lower()
                     }
                 else:  # HerdNet
                     if file_type == 'zip':
@@ -478,11 +501,14 @@ def new_analysis_page():
                         'rotation': rotation,
                         'thumbnail_size': thumbnail_size,
                         'include_thumbnails': str(include_thumbnails).lower(),
-                        'include_plots': str(include_plots).lower()
+                        'include_plots': str(include_plots).lower(),
+                        'include_tiles': str(ENABLE_DEEP_ZOOM).lower()
                     }
                 
                 # Hacer solicitud
                 response = requests.post(endpoint, files={'file': uploaded_file}, data=data)
+                # La lista de "Ver Resultados" se vuelve a cargar para incluir la nueva tarea
+                st.session_state.tasks_loaded = None
                 
                 if response.status_code == 200:
                     result = response.json()
@@ -601,11 +627,43 @@ def should_use_plotly(img):
     return max_dim < PLOTLY_FALLBACK_THRESHOLD
 
 
+def render_deep_zoom_viewer(tiles, height=400):
+    """
+    Renderiza un visor DeepZoom (OpenSeadragon) para una pirámide de tiles generada por la API.
+    El navegador descarga solo los tiles visibles, a resolución completa.
+    
+    Args:
+        tiles: Diccionario con 'dzi_url', 'width' y 'height' de la pirámide
+        height: Altura del visor en píxeles
+    """
+    dzi_url = f"{API_PUBLIC_URL}{tiles['dzi_url']}"
+    components.html(f"""
+    <div id="viewer" style="width: 100%; height: {height}px; background: #111;"></div>
+    <script src="{OPENSEADRAGON_URL}/openseadragon.min.js"></script>
+    <script>
+        OpenSeadragon({{
+            id: "viewer",
+            prefixUrl: "{OPENSEADRAGON_URL}/images/",
+            tileSources: "{dzi_url}",
+            showNavigator: true,
+            maxZoomPixelRatio: 4,
+            visibilityRatio: 1.0
+        }});
+    </script>
+    """, height=height + 10)
+    st.caption(f"📐 Dimensiones: {tiles.get('width', '?')} × {tiles.get('height', '?')} px (zoom a resolución completa)")
+
+
 @st.dialog("Visor de Imagen con Zoom", width="large")
 def show_image_modal(img_data, img_name, model_type):
     """Mostrar imagen en un modal con capacidades de zoom interactivo usando Plotly."""
     st.subheader(f"📷 {img_name}")
     
+    # Visor DeepZoom si la API generó la pirámide de tiles
+    if img_data.get('tiles'):
+        render_deep_zoom_viewer(img_data['tiles']['annotated'], height=600)
+        return
+    
     # Decodificar imagen
     if model_type == "yolo":
         img_bytes = base64.b64decode(img_data['annotated_image_base64'])
@@ -711,7 +769,9 @@ def render_yolo_image_card(img_data, all_detections, img_idx):
         # Columna izquierda: Imagen Original
         with col1:
             st.markdown("**🖼️ Imagen Cargada**")
-            if 'original_image_base64' in img_data:
+            if img_data.get('tiles'):
+                render_deep_zoom_viewer(img_data['tiles']['original'], height=400)
+            elif 'original_image_base64' in img_data:
                 original_bytes = base64.b64decode(img_data['original_image_base64'])
                 original_img = Image.open(BytesIO(original_bytes))
                 
@@ -770,58 +830,62 @@ def render_yolo_image_card(img_data, all_detections, img_idx):
         # Columna derecha: Imagen Anotada
         with col2:
             st.markdown("**🎯 Imagen Con Detecciones**")
-            img_bytes = base64.b64decode(img_data['annotated_image_base64'])
-            img = Image.open(BytesIO(img_bytes))
+            if img_data.get('tiles'):
+                # Visor DeepZoom: solo se descargan los tiles visibles a resolución completa
+                render_deep_zoom_viewer(img_data['tiles']['annotated'], height=400)
+            else:
+                img_bytes = base64.b64decode(img_data['annotated_image_base64'])
+                img = Image.open(BytesIO(img_bytes))
             
-            # Verificar si usar Plotly o fallback
-            if should_use_plotly(img):
-                # Preparar imagen para Plotly (downsample si es necesario)
-                img_display, was_resized, orig_size, display_size = prepare_image_for_plotly(img)
+                # Verificar si usar Plotly o fallback
+                if should_use_plotly(img):
+                    # Preparar imagen para Plotly (downsample si es necesario)
+                    img_display, was_resized, orig_size, display_size = prepare_image_for_plotly(img)
                 
-                # Convertir a array numpy para Plotly
-                img_array = np.array(img_display)
+                    # Convertir a array numpy para Plotly
+                    img_array = np.array(img_display)
                 
-                # Crear figura Plotly con zoom interactivo
-                fig = go.Figure()
-                fig.add_trace(go.Image(z=img_array))
+                    # Crear figura Plotly con zoom interactivo
+                    fig = go.Figure()
+                    fig.add_trace(go.Image(z=img_array))
                 
-                # Configurar layout para zoom interactivo
-                fig.update_layout(
-                    margin=dict(l=0, r=0, t=0, b=0),
-                    xaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
-                    yaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
-                    dragmode='pan',
-                    hovermode=False,
-                    height=400
-                )
+                    # Configurar layout para zoom interactivo
+                    fig.update_layout(
+                        margin=dict(l=0, r=0, t=0, b=0),
+                        xaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+                        yaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+                        dragmode='pan',
+                        hovermode=False,
+                        height=400
+                    )
                 
-                # Configurar para permitir zoom y pan
-                config = {
-                    'scrollZoom': True,
-                    'displayModeBar': True,
-                    'displaylogo': False,
-                    'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
-                    'toImageButtonOptions': {
-                        'format': 'png',
-                        'filename': f'annotated_{img_data["image_name"]}',
-                        'height': display_size[1],
-                        'width': display_size[0],
-                        'scale': 1
+                    # Configurar para permitir zoom y pan
+                    config = {
+                        'scrollZoom': True,
+                        'displayModeBar': True,
+                        'displaylogo': False,
+                        'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
+                        'toImageButtonOptions': {
+                            'format': 'png',
+                            'filename': f'annotated_{img_data["image_name"]}',
+                            'height': display_size[1],
+                            'width': display_size[0],
+                            'scale': 1
+                        }
                     }
-                }
                 
-                st.plotly_chart(fig, use_container_width=True, config=config)
+                    st.plotly_chart(fig, use_container_width=True, config=config)
                 
-                # Mostrar información de dimensiones
-                if was_resized:
-                    st.caption(f"📐 Original: {orig_size[0]}×{orig_size[1]}px | Visualización: {display_size[0]}×{display_size[1]}px")
+                    # Mostrar información de dimensiones
+                    if was_resized:
+                        st.caption(f"📐 Original: {orig_size[0]}×{orig_size[1]}px | Visualización: {display_size[0]}×{display_size[1]}px")
+                    else:
+                        st.caption(f"📐 Dimensiones: {orig_size[0]} × {orig_size[1]} px")
                 else:
-                    st.caption(f"📐 Dimensiones: {orig_size[0]} × {orig_size[1]} px")
-            else:
-                # Imagen muy grande: usar st.image con advertencia
-                st.warning(f"⚠️ Imagen grande ({img.width}×{img.height}px). Usando visor estático.")
-                st.image(img, use_column_width=True)
-                st.caption(f"📐 Dimensiones: {img.width} × {img.height} px")
+                    # Imagen muy grande: usar st.image con advertencia
+                    st.warning(f"⚠️ Imagen grande ({img.width}×{img.height}px). Usando visor estático.")
+                    st.image(img, use_column_width=True)
+                    st.caption(f"📐 Dimensiones: {img.width} × {img.height} px")
         
         # Obtener detecciones para esta imagen
         image_detections = [d for d in all_detections if d.get('image') == img_data['image_name']]
@@ -876,7 +940,9 @@ def render_herdnet_image_card(plot_data, all_detections, plot_idx):
         # Columna izquierda: Imagen Original
         with col1:
             st.markdown("**🖼️ Imagen Cargada**")
-            if 'original_image_base64' in plot_data:
+            if plot_data.get('tiles'):
+                render_deep_zoom_viewer(plot_data['tiles']['original'], height=400)
+            elif 'original_image_base64' in plot_data:
                 original_bytes = base64.b64decode(plot_data['original_image_base64'])
                 original_img = Image.open(BytesIO(original_bytes))
                 
@@ -935,58 +1001,62 @@ def render_herdnet_image_card(plot_data, all_detections, plot_idx):
         # Columna derecha: Gráfico con Detecciones
         with col2:
             st.markdown("**🎯 Imagen Con Detecciones**")
-            img_bytes = base64.b64decode(plot_data['plot_base64'])
-            img = Image.open(BytesIO(img_bytes))
+            if plot_data.get('tiles'):
+                # Visor DeepZoom: solo se descargan los tiles visibles a resolución completa
+                render_deep_zoom_viewer(plot_data['tiles']['annotated'], height=400)
+            else:
+                img_bytes = base64.b64decode(plot_data['plot_base64'])
+                img = Image.open(BytesIO(img_bytes))
             
-            # Verificar si usar Plotly o fallback
-            if should_use_plotly(img):
-                # Preparar imagen para Plotly (downsample si es necesario)
-                img_display, was_resized, orig_size, display_size = prepare_image_for_plotly(img)
+                # Verificar si usar Plotly o fallback
+                if should_use_plotly(img):
+                    # Preparar imagen para Plotly (downsample si es necesario)
+                    img_display, was_resized, orig_size, display_size = prepare_image_for_plotly(img)
                 
-                # Convertir a array numpy para Plotly
-                img_array = np.array(img_display)
+                    # Convertir a array numpy para Plotly
+                    img_array = np.array(img_display)
                 
-                # Crear figura Plotly con zoom interactivo
-                fig = go.Figure()
-                fig.add_trace(go.Image(z=img_array))
+                    # Crear figura Plotly con zoom interactivo
+                    fig = go.Figure()
+                    fig.add_trace(go.Image(z=img_array))
                 
-                # Configurar layout para zoom interactivo
-                fig.update_layout(
-                    margin=dict(l=0, r=0, t=0, b=0),
-                    xaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
-                    yaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
-                    dragmode='pan',
-                    hovermode=False,
-                    height=400
-                )
+                    # Configurar layout para zoom interactivo
+                    fig.update_layout(
+                        margin=dict(l=0, r=0, t=0, b=0),
+                        xaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+                        yaxis=dict(showticklabels=False, showgrid=False, zeroline=False),
+                        dragmode='pan',
+                        hovermode=False,
+                        height=400
+                    )
                 
-                # Configurar para permitir zoom y pan
-                config = {
-                    'scrollZoom': True,
-                    'displayModeBar': True,
-                    'displaylogo': False,
-                    'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
-                    'toImageButtonOptions': {
-                        'format': 'png',
-                        'filename': f'annotated_{plot_data["image_name"]}',
-                        'height': display_size[1],
-                        'width': display_size[0],
-                        'scale': 1
+                    # Configurar para permitir zoom y pan
+                    config = {
+                        'scrollZoom': True,
+                        'displayModeBar': True,
+                        'displaylogo': False,
+                        'modeBarButtonsToRemove': ['lasso2d', 'select2d'],
+                        'toImageButtonOptions': {
+                            'format': 'png',
+                            'filename': f'annotated_{plot_data["image_name"]}',
+                            'height': display_size[1],
+                            'width': display_size[0],
+                            'scale': 1
+                        }
                     }
-                }
                 
-                st.plotly_chart(fig, use_container_width=True, config=config)
+                    st.plotly_chart(fig, use_container_width=True, config=config)
                 
-                # Mostrar información de dimensiones
-                if was_resized:
-                    st.caption(f"📐 Original: {orig_size[0]}×{orig_size[1]}px | Visualización: {display_size[0]}×{display_size[1]}px")
+                    # Mostrar información de dimensiones
+                    if was_resized:
+                        st.caption(f"📐 Original: {orig_size[0]}×{orig_size[1]}px | Visualización: {display_size[0]}×{display_size[1]}px")
+                    else:
+                        st.caption(f"📐 Dimensiones: {orig_size[0]} × {orig_size[1]} px")
                 else:
-                    st.caption(f"📐 Dimensiones: {orig_size[0]} × {orig_size[1]} px")
-            else:
-                # Imagen muy grande: usar st.image con advertencia
-                st.warning(f"⚠️ Imagen grande ({img.width}×{img.height}px). Usando visor estático.")
-                st.image(img, use_column_width=True)
-                st.caption(f"📐 Dimensiones: {img.width} × {img.height} px")
+                    # Imagen muy grande: usar st.image con advertencia
+                    st.warning(f"⚠️ Imagen grande ({img.width}×{img.height}px). Usando visor estático.")
+                    st.image(img, use_column_width=True)
+                    st.caption(f"📐 Dimensiones: {img.width} × {img.height} px")
         
         # Obtener detecciones para esta imagen
         image_detections = [d for d in all_detections if d.get('images') == plot_data['image_name']]
@@ -1139,48 +1209,77 @@ def view_results_page():
     with col3:
         limit = st.number_input("Límite", 1, 100, 20)
     
-    # Obtener tareas
+    # Volver a cargar la lista desde la primera página (tareas enviadas desde otras sesiones)
+    if st.button("🔄 Actualizar"):
+        st.session_state.tasks_loaded = None
+    
+    # Obtener tareas (paginación por cursor: solo se piden los campos que muestra la lista)
     try:
-        params = {'limit': limit}
+        params = {'limit': limit, 'fields': TASK_LIST_FIELDS}
         if model_filter != "Todos":
             params['model_type'] = model_filter
         if status_filter != "Todos":
             params['status'] = status_filter
         
-        response = requests.get(f"{API_BASE_URL}/tasks", params=params)
-        if response.status_code == 200:
-            data = response.json()
-            tasks = data.get('tasks', [])
-            
-            if not tasks:
-                st.info("No se encontraron tareas")
+        # Reiniciar la lista acumulada si cambian los filtros
+        filters = (model_filter, status_filter, limit)
+        if st.session_state.get('tasks_filters') != filters:
+            st.session_state.tasks_filters = filters
+            st.session_state.tasks_loaded = None
+            st.session_state.tasks_next_cursor = None
+        
+        if st.session_state.get('tasks_loaded') is None:
+            response = requests.get(f"{API_BASE_URL}/tasks", params=params)
+            if response.status_code != 200:
+                st.error(f"Error al obtener tareas: {response.status_code}")
                 return
-            
-            st.success(f"Se encontraron {len(tasks)} tareas")
-            
-            # Mostrar tareas
-            for task in tasks:
-                status_emoji = {"completed": "✅", "processing": "⏳", "failed": "❌"}.get(task['status'], "❓")
-                with st.expander(f"{status_emoji} Tarea {task['task_id'][:8]}... - {task.get('filename', 'N/A')} ({task['status']})"):
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.write(f"**Modelo:** {task['model_type']}")
-                        st.write(f"**Estado:** {task['status']}")
-                        st.write(f"**Creado:** {task['created_at']}")
-                    with col2:
-                        st.write(f"**Imágenes:** {task.get('num_images', 0)}")
-                        st.write(f"**Detecciones:** {task.get('total_detections', 0)}")
-                        st.write(f"**Tiempo:** {task.get('processing_time_seconds', 0):.1f}s")
-                    
-                    # Botón para ver resultados completos
-                    if st.button(f"Ver Resultados Completos", key=task['task_id']):
-                        # Obtener tarea completa
-                        task_response = requests.get(f"{API_BASE_URL}/tasks/{task['task_id']}")
-                        if task_response.status_code == 200:
-                            full_task = task_response.json()['task']
-                            st.json(full_task.get('result_data', {}))
-        else:
-            st.error(f"Error al obtener tareas: {response.status_code}")
+            data = response.json()
+            st.session_state.tasks_loaded = data.get('tasks', [])
+            st.session_state.tasks_next_cursor = data.get('next_cursor')
+        
+        tasks = st.session_state.tasks_loaded
+        if not tasks:
+            st.info("No se encontraron tareas")
+            return
+        
+        st.success(f"Se muestran {len(tasks)} tareas")
+        
+        # Mostrar tareas
+        for task in tasks:
+            status_emoji = {"completed": "✅", "processing": "⏳", "failed": "❌"}.get(task['status'], "❓")
+            with st.expander(f"{status_emoji} Tarea {task['task_id'][:8]}... - {task.get('filename', 'N/A')} ({task['status']})"):
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.write(f"**Modelo:** {task['model_type']}")
+                    st.write(f"**Estado:** {task['status']}")
+                    st.write(f"**Creado:** {task['created_at']}")
+                with col2:
+                    st.write(f"**Imágenes:** {task.get('num_images', 0)}")
+                    st.write(f"**Detecciones:** {task.get('total_detections', 0)}")
+                    st.write(f"**Tiempo:** {task.get('processing_time_seconds', 0):.1f}s")
+                
+                # Botón para ver resultados completos
+                if st.button(f"Ver Resultados Completos", key=task['task_id']):
+                    # Obtener tarea completa
+                    task_response = requests.get(f"{API_BASE_URL}/tasks/{task['task_id']}")
+                    if task_response.status_code == 200:
+                        full_task = task_response.json()['task']
+                        st.json(full_task.get('result_data', {}))
+        
+        # Cargar la siguiente página a partir del cursor
+        if st.session_state.tasks_next_cursor:
+            if st.button("Cargar más"):
+                response = requests.get(
+                    f"{API_BASE_URL}/tasks",
+                    params={**params, 'cursor': st.session_state.tasks_next_cursor}
+                )
+                if response.status_code == 200:
+                    data = response.json()
+                    st.session_state.tasks_loaded = tasks + data.get('tasks', [])
+                    st.session_state.tasks_next_cursor = data.get('next_cursor')
+                    st.rerun()
+                else:
+                    st.error(f"Error al obtener tareas: {response.status_code}")
     except Exception as e:
         st.error(f"Error: {str(e)}")
 
@@ -1208,6 +1307,15 @@ def statistics_page():
                 fig.update_layout(showlegend=False)
                 st.plotly_chart(fig, use_container_width=True)
             
+            # Actividad diaria
+            if stats.get('daily_activity'):
+                st.subheader("Actividad Diaria")
+                daily_df = pd.DataFrame(stats['daily_activity']).rename(
+                    columns={'day': 'Día', 'tasks': 'Tareas', 'detections': 'Detecciones'}
+                )
+                fig = px.line(daily_df, x='Día', y=['Tareas', 'Detecciones'], markers=True)
+                st.plotly_chart(fig, use_container_width=True)
+            
             # Distribución de especies
             if stats.get('species_distribution'):
                 st.subheader("Distribución de Especies (Histórico)")
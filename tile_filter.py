@@ -0,0 +1,274 @@
+"""
+Empty-Tile Filter - Skips featureless patches before the network
+
+Most patches of an aerial survey frame are featureless savanna, water, sky or the nodata border of
+an orthomosaic, yet every patch pays a full forward pass. The texture score of a patch is the
+largest standard deviation of its grey level over block x block cells (0-255 scale): uniform
+ground and nodata borders score close to 0, while an animal raises the score of the cells it falls
+in, whatever the rest of the patch looks like. Patches scoring below the threshold are not run:
+
+    HerdNet: EmptyTileFilter wraps the model given to the stitchers and returns zero heatmaps and
+             class maps for skipped patches, so LMDS finds no point there. The stitchers average
+             overlapping patches over the patches that were run only (see kept_patches), so a
+             skipped neighbour does not dilute the heat of an animal in the overlap.
+    YOLOv11: stitching.predict_yolo_tiled does not predict skipped tiles.
+
+The threshold is the recall-safety knob: 0 disables the filter, and the higher it is, the more
+patches are skipped and the more low-contrast animals risk being lost. Calibrate it on annotated
+frames for a target recall of animal-containing patches:
+    python tile_filter.py --images DIR --annotations points.csv [--recall 0.999]
+"""
+
+import argparse
+import os
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+# Empty-tile filter configuration (from environment variables or defaults)
+# Texture score below which patches are skipped (0 = disabled; requests override it with 'empty_tile_threshold')
+EMPTY_TILE_THRESHOLD = float(os.environ.get('EMPTY_TILE_THRESHOLD', 0))
+# Cell size in pixels of the texture score
+EMPTY_TILE_BLOCK = int(os.environ.get('EMPTY_TILE_BLOCK', 32))
+
+
+def parse_empty_tile_threshold(form):
+    """Empty-tile threshold of a request (EMPTY_TILE_THRESHOLD if not given)."""
+    value = form.get('empty_tile_threshold')
+    if value is None or value == '':
+        return EMPTY_TILE_THRESHOLD
+    try:
+        threshold = float(value)
+    except ValueError:
+        raise ValueError(f"Invalid empty_tile_threshold '{value}' (expected a number >= 0)")
+    if threshold < 0:
+        raise ValueError(f"Invalid empty_tile_threshold '{value}' (expected a number >= 0)")
+    return threshold
+
+
+def texture_scores(patches, block=EMPTY_TILE_BLOCK):
+    """
+    Texture score of each patch.
+
+    Args:
+        patches: Tensor (B, C, H, W) of pixel values in the 0-255 range
+        block: Cell size in pixels
+
+    Returns:
+        Tensor (B,) with the largest standard deviation of the grey level over the cells of each patch
+
+    Pure black pixels (the padding past the frame and the nodata of orthomosaics) are left out of the
+    statistics, so the edge between the frame and the padding does not count as texture.
+    """
+    patches = patches.float()
+    grey = patches.mean(dim=1, keepdim=True)
+    valid = (patches.amax(dim=1, keepdim=True) > 0.5).float()
+    block = min(block, grey.shape[-2], grey.shape[-1])
+    count = F.avg_pool2d(valid, block).clamp(min=1e-6)
+    mean = F.avg_pool2d(grey * valid, block) / count
+    mean_sq = F.avg_pool2d(grey * grey * valid, block) / count
+    std = (mean_sq - mean * mean).clamp(min=0).sqrt()
+    return std.flatten(1).amax(dim=1)
+
+
+def tile_counts(total=0, skipped=0):
+    """Counter of the tiles of a request, as reported in the responses."""
+    return {'total_tiles': total, 'skipped_tiles': skipped}
+
+
+def _zeros(template, batch_size):
+    """Zero model outputs for a batch, shaped like the outputs of one patch."""
+    if isinstance(template, torch.Tensor):
+        return template.new_zeros((batch_size,) + template.shape[1:])
+    if isinstance(template, (tuple, list)):
+        return type(template)(_zeros(item, batch_size) for item in template)
+    return template
+
+
+def _filled(template, kept):
+    """Model outputs of a batch holding 1 for the patches in kept and 0 for the others."""
+    if isinstance(template, torch.Tensor):
+        values = kept.to(template.device, template.dtype).view((-1,) + (1,) * (template.dim() - 1))
+        return values.expand((len(kept),) + template.shape[1:]).clone()
+    if isinstance(template, (tuple, list)):
+        return type(template)(_filled(item, kept) for item in template)
+    return template
+
+
+def _scatter(outputs, keep, batch_size):
+    """Outputs of the kept patches placed in a zero batch (skipped patches get zeros)."""
+    if isinstance(outputs, torch.Tensor) and outputs.dim() > 0 and outputs.shape[0] == int(keep.sum()):
+        full = outputs.new_zeros((batch_size,) + outputs.shape[1:])
+        full[keep.to(outputs.device)] = outputs
+        return full
+    if isinstance(outputs, (tuple, list)):
+        return type(outputs)(_scatter(item, keep, batch_size) for item in outputs)
+    return outputs
+
+
+class EmptyTileFilter(torch.nn.Module):
+    """
+    Runs a HerdNet model only on the patches of a batch whose texture score reaches the threshold.
+
+    Skipped patches get zero outputs. The outputs of the first patch run at each size are kept
+    as a template, so batches with no patch left do not call the model at all.
+
+    last_kept tells which patches of the last batch were run; while history is a list, the
+    (size, kept) of every batch is appended to it (see KeptShare).
+
+    Args:
+        model: HerdNet model (see preprocessing.herdnet_input_model)
+        threshold: Texture score below which patches are skipped (0 = run every patch)
+        mean, std: Normalization of float inputs (uint8 inputs are used as they are)
+    """
+
+    def __init__(self, model, threshold=EMPTY_TILE_THRESHOLD, mean=None, std=None):
+        super().__init__()
+        self.model = model
+        self.threshold = threshold
+        self.mean = None if mean is None else torch.tensor(mean, dtype=torch.float32).view(1, -1, 1, 1)
+        self.std = None if std is None else torch.tensor(std, dtype=torch.float32).view(1, -1, 1, 1)
+        self.total = 0
+        self.skipped = 0
+        self.last_kept = None
+        self.history = None
+        self._templates = {}
+
+    def _pixels(self, x):
+        """Patches in the 0-255 range."""
+        if x.dtype == torch.uint8 or self.mean is None:
+            return x
+        return (x.float().cpu() * self.std + self.mean) * 255.0
+
+    def counts(self):
+        return tile_counts(self.total, self.skipped)
+
+    def _record(self, size, kept):
+        self.last_kept = kept
+        if self.history is not None:
+            self.history.append((size, kept))
+
+    def forward(self, x):
+        batch_size = len(x)
+        self.total += batch_size
+        size = tuple(x.shape[-2:])
+        if self.threshold <= 0:
+            self._record(size, torch.ones(batch_size, dtype=torch.bool))
+            return self.model(x)
+
+        keep = texture_scores(self._pixels(x)).cpu() >= self.threshold
+        if bool(keep.all()) or size not in self._templates:
+            outputs = self.model(x)
+            self._templates.setdefault(size, _zeros(outputs, 1))
+            self._record(size, torch.ones(batch_size, dtype=torch.bool))
+            return outputs
+
+        self.skipped += int((~keep).sum())
+        self._record(size, keep)
+        if not bool(keep.any()):
+            return _zeros(self._templates[size], batch_size)
+        return _scatter(self.model(x[keep.to(x.device)]), keep, batch_size)
+
+
+class KeptShare(torch.nn.Module):
+    """
+    Replays the batches recorded in EmptyTileFilter.history, with outputs of 1 for the patches
+    that were run and 0 for the skipped ones.
+
+    Stitched with the same mean reduction, its heatmap is the share of the patches overlapping
+    each pixel that were run: dividing the filtered maps by it averages over those patches only.
+    """
+
+    def __init__(self, tile_filter):
+        super().__init__()
+        self.templates = tile_filter._templates
+        self.batches = list(tile_filter.history)
+
+    def forward(self, x):
+        size, kept = self.batches.pop(0)
+        return _filled(self.templates[size], kept)
+
+
+def kept_patches(model, batch_size):
+    """Which patches of the last batch run by model got real outputs (all of them without the filter)."""
+    kept = getattr(model, 'last_kept', None)
+    if kept is None or len(kept) != batch_size:
+        return [True] * batch_size
+    return kept.tolist()
+
+
+def calibrate(image_dir, annotations, patch_size=512, overlap=160, recall=0.999, block=EMPTY_TILE_BLOCK):
+    """
+    Texture threshold that keeps a target share of annotated animals.
+
+    A point is kept if any stitcher patch containing it is run, so its score is the highest score
+    of those patches; the threshold is the (1 - recall) quantile of the point scores.
+
+    Args:
+        image_dir: Folder of the frames
+        annotations: DataFrame with images, x and y columns
+        recall: Share of annotated points that must stay in a run patch
+
+    Returns:
+        Dict with the threshold, the number of points and the share of patches it skips
+    """
+    from stitching import _origins, open_source
+
+    stride = patch_size - overlap
+    point_scores = []
+    patch_scores = []
+    for name, points in annotations.groupby('images'):
+        source = open_source(os.path.join(image_dir, name))
+        try:
+            xs, ys = _origins(source.width, patch_size, stride), _origins(source.height, patch_size, stride)
+            scores = np.zeros((len(ys), len(xs)))
+            for r, y0 in enumerate(ys):
+                band = source.read(0, y0, xs[-1] + patch_size, y0 + patch_size)
+                patches = torch.stack([band[:, :, x:x + patch_size] for x in xs])
+                scores[r] = texture_scores(patches, block).numpy()
+        finally:
+            source.close()
+        patch_scores.extend(scores.ravel().tolist())
+
+        origins_x, origins_y = np.array(xs), np.array(ys)
+        for x, y in points[['x', 'y']].itertuples(index=False):
+            cols = np.nonzero((origins_x <= x) & (x < origins_x + patch_size))[0]
+            rows = np.nonzero((origins_y <= y) & (y < origins_y + patch_size))[0]
+            if len(cols) and len(rows):
+                point_scores.append(scores[np.ix_(rows, cols)].max())
+
+    if not point_scores:
+        raise ValueError("No annotated point falls inside the frames")
+    threshold = float(np.quantile(point_scores, 1 - recall, method='lower'))
+    return {
+        'threshold': threshold,
+        'recall': float(np.mean(np.array(point_scores) >= threshold)),
+        'points': len(point_scores),
+        'patches': len(patch_scores),
+        'skipped_share': float(np.mean(np.array(patch_scores) < threshold))
+    }
+
+
+def main():
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Calibrate the empty-tile threshold on annotated frames")
+    parser.add_argument('--images', required=True, help="Folder of the frames")
+    parser.add_argument('--annotations', required=True, help="CSV with images, x and y columns")
+    parser.add_argument('--patch-size', type=int, default=512)
+    parser.add_argument('--overlap', type=int, default=160)
+    parser.add_argument('--recall', type=float, default=0.999, help="Share of annotated points to keep")
+    parser.add_argument('--block', type=int, default=EMPTY_TILE_BLOCK)
+    args = parser.parse_args()
+
+    result = calibrate(args.images, pd.read_csv(args.annotations), args.patch_size, args.overlap,
+                       args.recall, args.block)
+    print(f"✓ {result['points']} points in {result['patches']} patches")
+    print(f"  Threshold: {result['threshold']:.2f} (keeps {result['recall']:.2%} of the points, "
+          f"skips {result['skipped_share']:.1%} of the patches)")
+    print(f"  EMPTY_TILE_THRESHOLD={result['threshold']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Deep Zoom Tiles - Builds DeepZoom (DZI) tile pyramids for analyzed frames so viewers only fetch the tiles in view
+"""
+
+import io
+import math
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image
+from werkzeug.utils import secure_filename
+
+# Tile storage and pyramid configuration (from environment variables or defaults)
+TILES_DIR = Path(os.environ.get('TILES_DIR', Path(__file__).parent / 'tiles'))
+TILE_SIZE = int(os.environ.get('TILE_SIZE', 254))
+TILE_OVERLAP = int(os.environ.get('TILE_OVERLAP', 1))
+TILE_FORMAT = os.environ.get('TILE_FORMAT', 'jpeg').strip().lower()
+TILE_QUALITY = int(os.environ.get('TILE_QUALITY', 85))
+TILE_WORKERS = int(os.environ.get('TILE_WORKERS', 4))
+TILE_CACHE_MAX_AGE = int(os.environ.get('TILE_CACHE_MAX_AGE', 7 * 24 * 3600))
+
+# Pyramid variants generated for each analyzed frame
+TILE_VARIANTS = ('original', 'annotated')
+
+_PIL_FORMATS = {'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+_FILE_EXTENSIONS = {'jpeg': 'jpg', 'png': 'png', 'webp': 'webp'}
+
+DZI_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="{format}" Overlap="{overlap}" TileSize="{tile_size}">
+  <Size Width="{width}" Height="{height}"/>
+</Image>
+"""
+
+
+def image_key(image_name):
+    """URL/filesystem safe key for an image name."""
+    return secure_filename(image_name) or 'image'
+
+
+def pyramid_dir(task_id, image_name):
+    """Directory holding all tile pyramids of one image of a task."""
+    return TILES_DIR / secure_filename(task_id) / image_key(image_name)
+
+
+def dzi_url(task_id, image_name, variant):
+    """Relative URL of the DZI descriptor served by the API."""
+    return f"/tiles/{secure_filename(task_id)}/{image_key(image_name)}/{variant}.dzi"
+
+
+def _tile_boxes(width, height):
+    """Yield (col, row, box) for every DeepZoom tile of a level."""
+    cols = math.ceil(width / TILE_SIZE)
+    rows = math.ceil(height / TILE_SIZE)
+    for col in range(cols):
+        for row in range(rows):
+            x1 = col * TILE_SIZE - (TILE_OVERLAP if col > 0 else 0)
+            y1 = row * TILE_SIZE - (TILE_OVERLAP if row > 0 else 0)
+            x2 = min(width, (col + 1) * TILE_SIZE + TILE_OVERLAP)
+            y2 = min(height, (row + 1) * TILE_SIZE + TILE_OVERLAP)
+            yield col, row, (x1, y1, x2, y2)
+
+
+def _save_tile(level_img, box, path):
+    """Crop and encode a single tile."""
+    tile = level_img.crop(box)
+    pil_format = _PIL_FORMATS[TILE_FORMAT]
+    buffered = io.BytesIO()
+    if pil_format == 'PNG':
+        tile.save(buffered, format='PNG', compress_level=1)
+    elif pil_format == 'WEBP':
+        tile.save(buffered, format='WEBP', quality=TILE_QUALITY, method=0)
+    else:
+        tile.save(buffered, format='JPEG', quality=TILE_QUALITY)
+    with open(path, 'wb') as f:
+        f.write(buffered.getvalue())
+
+
+def generate_pyramid(img, task_id, image_name, variant):
+    """
+    Generate a DeepZoom tile pyramid for an image.
+
+    Tiles are written to a temporary directory and moved into place once complete,
+    so a pyramid is never served half-written.
+
+    Args:
+        img: PIL Image or HxWxC uint8 numpy array (RGB)
+        task_id: Task the image belongs to
+        image_name: Original image name
+        variant: Pyramid variant ('original' or 'annotated')
+
+    Returns:
+        Dictionary with the DZI url and full-resolution size
+    """
+    if variant not in TILE_VARIANTS:
+        raise ValueError(f"variant must be one of {TILE_VARIANTS}")
+
+    if not isinstance(img, Image.Image):
+        img = Image.fromarray(img)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    width, height = img.size
+    max_level = math.ceil(math.log2(max(width, height, 1)))
+    extension = _FILE_EXTENSIONS[TILE_FORMAT]
+
+    base_dir = pyramid_dir(task_id, image_name)
+    base_dir.mkdir(parents=True, exist_ok=True)
+    files_dir = base_dir / f"{variant}_files"
+    staging_dir = base_dir / f".{variant}_files.{uuid.uuid4().hex}"
+
+    try:
+        with ThreadPoolExecutor(max_workers=TILE_WORKERS) as executor:
+            futures = []
+            level_img = img
+            for level in range(max_level, -1, -1):
+                level_dir = staging_dir / str(level)
+                level_dir.mkdir(parents=True)
+                for col, row, box in _tile_boxes(*level_img.size):
+                    futures.append(executor.submit(
+                        _save_tile, level_img, box, level_dir / f"{col}_{row}.{extension}"
+                    ))
+                if level > 0:
+                    # Each level is half the size of the next one (rounded up, as DeepZoom expects)
+                    level_img = level_img.reduce(2)
+            for future in futures:
+                future.result()
+
+        if files_dir.exists():
+            shutil.rmtree(files_dir)
+        os.replace(staging_dir, files_dir)
+    finally:
+        if staging_dir.exists():
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    (base_dir / f"{variant}.dzi").write_text(DZI_TEMPLATE.format(
+        format=extension, overlap=TILE_OVERLAP, tile_size=TILE_SIZE, width=width, height=height
+    ))
+
+    return {
+        'dzi_url': dzi_url(task_id, image_name, variant),
+        'width': width,
+        'height': height,
+        'levels': max_level + 1
+    }
+
+
+def generate_image_pyramids(task_id, image_name, original_img, annotated_img):
+    """Generate the original and annotated pyramids of an analyzed frame."""
+    return {
+        'original': generate_pyramid(original_img, task_id, image_name, 'original'),
+        'annotated': generate_pyramid(annotated_img, task_id, image_name, 'annotated')
+    }
+
+
+def list_task_pyramids(task_id):
+    """List the tile pyramids available for a task."""
+    task_dir = TILES_DIR / secure_filename(task_id)
+    if not task_dir.is_dir():
+        return []
+
+    pyramids = []
+    for image_dir in sorted(p for p in task_dir.iterdir() if p.is_dir()):
+        for variant in TILE_VARIANTS:
+            if (image_dir / f"{variant}.dzi").exists():
+                pyramids.append({
+                    'image_key': image_dir.name,
+                    'variant': variant,
+                    'dzi_url': f"/tiles/{task_dir.name}/{image_dir.name}/{variant}.dzi"
+                })
+    return pyramids
+
+
+def delete_task_pyramids(task_id):
+    """Delete all tile pyramids of a task. Returns the number of bytes freed."""
+    task_dir = TILES_DIR / secure_filename(task_id)
+    if not task_dir.is_dir():
+        return 0
+
+    freed = sum(path.stat().st_size for path in task_dir.rglob('*') if path.is_file())
+    shutil.rmtree(task_dir, ignore_errors=True)
+    return freed